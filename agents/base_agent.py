@@ -1,22 +1,41 @@
 from abc import ABC, abstractmethod
+import logging
 from utils.openai_api import OpenAIAPI
-import re
-import pickle
-from gui.browser import Browser
-from gui.code_editor import CodeEditor
-from gui.terminal import Terminal
-from gui.task_list import TaskList
+from utils.action_parser import find_url, find_argument
+from utils.knowledge_store import KnowledgeStore
+from utils.state_journal import StateJournal
+from utils.conversation_memory import ConversationMemory
+from utils.http_fetcher import HttpFetcher
+from utils.page_cache import PageCache
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
 
 class BaseAgent(ABC):
-    def __init__(self):
-        self.api = OpenAIAPI()
+    def __init__(self, browser=None, terminal=None, task_list=None, code_editor=None, api=None, fetcher=None, page_cache=None):
+        # Tools are passed in by whoever owns them (the main window or the runtime), so each
+        # is built once; the fetcher and page cache may be shared between agents
+        self.api = api or OpenAIAPI()
         self.conversation_history = []
         self.current_task = None
         self.knowledge_base = {}
-        self.browser = Browser()
-        self.code_editor = CodeEditor()
-        self.terminal = Terminal()
-        self.task_list = TaskList()
+        self.knowledge_store = KnowledgeStore()
+        self.knowledge_token_budget = 2000
+        self.journal = None
+        self.journal_history_ref = None
+        self.journal_knowledge_ref = None
+        self.history_saved = 0
+        self.history_offset = 0
+        self.dirty_knowledge = set()
+        self.knowledge_pending = False
+        self.history_paged = 0
+        self.memory = ConversationMemory(self.summarize_turns, self.api.token_budget.count_text)
+        self.fetcher = fetcher or HttpFetcher()
+        self.page_cache = page_cache or PageCache()
+        self.browser = browser
+        self.code_editor = code_editor
+        self.terminal = terminal
+        self.task_list = task_list
 
     @abstractmethod
     def process_input(self, user_input):
@@ -25,6 +44,9 @@ class BaseAgent(ABC):
 
         Args:
             user_input (str): The user input string.
+
+        Returns:
+            list: The responses generated for it.
         """
         pass
 
@@ -55,7 +77,10 @@ class BaseAgent(ABC):
         self.conversation_history = []
         self.current_task = None
         self.knowledge_base = {}
-        print("Agent's internal state has been reset.")
+        self.knowledge_store.clear()
+        self.knowledge_pending = False
+        self.memory.clear()
+        logger.info("Agent's internal state has been reset.")
 
     def load_knowledge_base(self, knowledge_base):
         """
@@ -68,76 +93,239 @@ class BaseAgent(ABC):
             raise ValueError("The knowledge base must be a dictionary.")
 
         self.knowledge_base = knowledge_base
+        self.knowledge_pending = False
+        self.rebuild_knowledge_store()
 
         knowledge_base_context = "\n".join([f"{key}: {value}" for key, value in knowledge_base.items()])
         self.conversation_history.append(f"Assistant: Loaded knowledge base:\n{knowledge_base_context}")
-        print(f"Loaded knowledge base:\n{knowledge_base_context}")
+        logger.info("Loaded knowledge base with %d documents", len(knowledge_base))
+        logger.debug("Loaded knowledge base:\n%s", knowledge_base_context)
 
+    @tracer.traced("db.save_state")
     def save_state(self, file_path):
         """
-        Save the agent's current state to a file.
+        Save the agent's current state to a journal file.
+
+        Only changes since the previous save to the same file are written: new history
+        entries are appended and only knowledge base documents added since are
+        rewritten. If the history or knowledge base was replaced in the meantime (for
+        example by a clear), that part of the journal is rewritten as a checkpoint.
+
+        Args:
+            file_path (str): The path to the journal file where the state will be saved.
+        """
+        journal = self._open_journal(file_path)
+
+        if self.conversation_history is not self.journal_history_ref or len(self.conversation_history) < self.history_saved:
+            journal.replace_history(self.conversation_history)
+            self.history_offset = 0
+        else:
+            journal.append_history(self.conversation_history[self.history_saved:])
+        self.journal_history_ref = self.conversation_history
+        self.history_saved = len(self.conversation_history)
+
+        if self.knowledge_base is not self.journal_knowledge_ref:
+            journal.clear_knowledge()
+            journal.put_knowledge(self.knowledge_base)
+            self.knowledge_pending = False
+        else:
+            journal.put_knowledge({source: self.knowledge_base[source] for source in self.dirty_knowledge if source in self.knowledge_base})
+        self.journal_knowledge_ref = self.knowledge_base
+        self.dirty_knowledge.clear()
+
+        journal.set_meta("current_task", self.current_task)
+        summary, pending = self.memory.snapshot()
+        journal.set_meta("summary", summary)
+        journal.set_meta("summary_pending", pending)
+        journal.commit()
+        logger.info("Agent's state saved to %s", file_path)
+
+    def _open_journal(self, file_path):
+        if self.journal is not None and self.journal.path == file_path:
+            return self.journal
+        if self.journal is not None:
+            # Everything still only in the old journal has to be carried over in full
+            self.load_older_history(self.history_offset)
+            self.ensure_knowledge_loaded()
+            self.journal.close()
+        self.journal = StateJournal(file_path)
+        self.journal_history_ref = None
+        self.journal_knowledge_ref = None
+        return self.journal
+
+    @tracer.traced("db.load_state")
+    def load_state(self, file_path, recent_history=None):
+        """
+        Load the agent's state from a journal file.
+
+        Only the most recent history entries are read; older ones can be paged in with
+        load_older_history. Knowledge base documents are read on first use.
+
+        Args:
+            file_path (str): The path to the journal file containing the agent's state.
+            recent_history (int): The number of most recent history entries to load. Defaults to the
+                memory's recent window; older entries are covered by the saved summary.
+        """
+        if recent_history is None:
+            recent_history = self.memory.recent_turns
+        journal = StateJournal(file_path)
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = journal
+
+        self.history_offset = max(0, journal.history_count() - recent_history)
+        self.conversation_history = journal.load_history(self.history_offset, recent_history)
+        self.current_task = journal.get_meta("current_task")
+        self.memory.clear()
+        self.memory.restore(journal.get_meta("summary", ""), journal.get_meta("summary_pending", []))
+        self.history_paged = 0
+        self.knowledge_base = {}
+        self.knowledge_store.clear()
+        self.knowledge_pending = True
+
+        self.journal_history_ref = self.conversation_history
+        self.journal_knowledge_ref = self.knowledge_base
+        self.history_saved = len(self.conversation_history)
+        self.dirty_knowledge.clear()
+        logger.info("Agent's state loaded from %s", file_path)
+
+    def load_older_history(self, limit=200):
+        """
+        Page older history entries from the journal into the front of the conversation history.
+
+        Args:
+            limit (int): The maximum number of entries to load.
+
+        Returns:
+            list: The entries loaded, oldest first.
+        """
+        if self.journal is None or self.history_offset == 0 or limit <= 0:
+            return []
+        start = max(0, self.history_offset - limit)
+        entries = self.journal.load_history(start, self.history_offset - start)
+        self.conversation_history[:0] = entries
+        self.history_saved += len(entries)
+        self.history_paged += len(entries)
+        self.history_offset = start
+        return entries
+
+    def ensure_knowledge_loaded(self):
+        if not self.knowledge_pending:
+            return
+        self.knowledge_pending = False
+        loaded = self.journal.load_knowledge()
+        # Documents added since the load are newer than the journal's copies
+        loaded.update(self.knowledge_base)
+        self.knowledge_base.clear()
+        self.knowledge_base.update(loaded)
+        self.rebuild_knowledge_store()
+
+    def compact_state(self, keep_history=None):
+        """
+        Compact the journal, optionally dropping all but the most recent history entries.
 
         Args:
-            file_path (str): The path to the file where the state will be saved.
+            keep_history (int): The number of history entries to keep, or None to keep all of them.
+        """
+        if self.journal is None:
+            return
+        if keep_history is not None:
+            dropped = self.journal.truncate_history(keep_history)
+            if dropped > self.history_offset:
+                removed = dropped - self.history_offset
+                del self.conversation_history[:removed]
+                self.history_saved -= removed
+                self.history_paged = max(0, self.history_paged - removed)
+            self.history_offset = max(0, self.history_offset - dropped)
+        self.journal.compact()
+        logger.info("Agent's state journal %s compacted.", self.journal.path)
+
+    def trim_history(self):
         """
-        state = {
-            "conversation_history": self.conversation_history,
-            "current_task": self.current_task,
-            "knowledge_base": self.knowledge_base
-        }
+        Move history entries older than the memory's recent window into the rolling summary.
 
-        with open(file_path, "wb") as f:
-            pickle.dump(state, f)
-        print(f"Agent's state saved to {file_path}")
+        Evicted entries stay in the state journal; entries that were never saved are
+        appended to it first. Entries paged back in with load_older_history are
+        already covered by the summary and are dropped without being summarized again.
+        """
+        overflow = self.memory.overflow(self.conversation_history)
+        if not overflow:
+            return
+        tracked = self.journal is not None and self.journal_history_ref is self.conversation_history
+        if tracked and overflow > self.history_saved:
+            self.journal.append_history(self.conversation_history[self.history_saved:overflow])
+            self.history_saved = overflow
+        paged = min(overflow, self.history_paged)
+        evicted = self.conversation_history[paged:overflow]
+        del self.conversation_history[:overflow]
+        self.history_paged -= paged
+        if tracked:
+            self.history_saved -= overflow
+            self.history_offset += overflow
+        self.memory.evict(evicted)
 
-    def load_state(self, file_path):
+    def summarize_turns(self, summary, turns, max_tokens):
         """
-        Load the agent's state from a file.
+        Fold conversation turns into a running summary with the model.
 
         Args:
-            file_path (str): The path to the file containing the agent's state.
+            summary (str): The summary so far.
+            turns (list): The turns to merge into it.
+            max_tokens (int): Token budget for the new summary.
+
+        Returns:
+            str: The updated summary.
         """
-        with open(file_path, "rb") as f:
-            state = pickle.load(f)
+        system_message = f"You maintain a running summary of a conversation between a user and an AI agent. Merge the new turns into the existing summary, keeping facts, decisions, file names, commands and open tasks and dropping small talk. Reply with the updated summary only, in at most {max_tokens * 3 // 4} words."
+        return self.api.api_calls(system_message, summary or "No summary yet.", "\n".join(turns), record=False)
 
-        self.conversation_history = state["conversation_history"]
-        self.current_task = state["current_task"]
-        self.knowledge_base = state["knowledge_base"]
-        print(f"Agent's state loaded from {file_path}")
+    def add_knowledge(self, source, text):
+        """
+        Add a document to the knowledge base and index it for retrieval.
+
+        Args:
+            source (str): The document's source, such as a URL.
+            text (str): The document text.
+        """
+        self.knowledge_base[source] = text
+        self.dirty_knowledge.add(source)
+        self.knowledge_store.add_document(source, str(text))
+
+    def rebuild_knowledge_store(self):
+        self.knowledge_store.clear()
+        for source, text in self.knowledge_base.items():
+            self.knowledge_store.add_document(source, str(text))
+
+    def get_knowledge_context(self, query):
+        """
+        Retrieve the knowledge base chunks most relevant to a query within the knowledge token budget.
+
+        Args:
+            query (str): The text to retrieve knowledge for.
+
+        Returns:
+            list: The selected chunks, each prefixed with its source.
+        """
+        with tracer.span("prompt.knowledge"):
+            self.ensure_knowledge_loaded()
+            return self.knowledge_store.select(query, self.knowledge_token_budget, self.api.token_budget.count_text)
 
     def get_task_list(self):
         tasks = self.task_list.get_tasks()
-        print(f"Current task list: {tasks}")
+        logger.debug("Current task list: %s", tasks)
         return tasks
 
     def extract_url_from_action(self, action):
-        url_pattern = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
-        urls = url_pattern.findall(action)
-        if urls:
-            return urls[0]
-        else:
-            return None
+        return find_url(action)
+
+    def extract_search_query_from_action(self, action):
+        return find_argument(action, "search")
 
     def extract_command_from_action(self, action):
-        command_pattern = re.compile(r'run command:\s*(.+)', re.IGNORECASE)
-        match = command_pattern.search(action)
-        if match:
-            return match.group(1)
-        else:
-            return None
+        return find_argument(action, "run_command")
 
     def extract_task_from_action(self, action):
-        task_pattern = re.compile(r'add task:\s*(.+)', re.IGNORECASE)
-        match = task_pattern.search(action)
-        if match:
-            return match.group(1)
-        else:
-            return None
+        return find_argument(action, "add_task")
 
     def extract_code_from_action(self, action):
-        code_pattern = re.compile(r'write code:\s*(.+)', re.IGNORECASE)
-        match = code_pattern.search(action)
-        if match:
-            return match.group(1)
-        else:
-            return None
\ No newline at end of file
+        return find_argument(action, "write_code")
@@ -1,280 +1,734 @@
 from agents.base_agent import BaseAgent
+from agents.tools import CompletionSignal
 from utils.openai_api import OpenAIAPI
-import re
+from utils.task_scheduler import DagScheduler, TaskGraph
+from utils.action_parser import parse_actions
+from utils.html_extraction import extract_page
+from utils.page_cache import normalize_url
+from utils.prompt_builder import ContextBlock
+from utils.tracing import tracer
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import quote_plus
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# The commands and fetches started while a response is applied are collected here (see collect_work). A
+# context variable rather than an attribute, because a nested Qt event loop can apply another
+# subtask's response in the middle of this one; set and reset keep each collection separate.
+STARTED_WORK = ContextVar("started_work", default=None)
+
+SEARCH_URL = "https://www.google.com/search?q="
+# Follow-up completions a single user message may trigger before the turn ends
+MAX_FOLLOW_UPS = 3
+
+class BackgroundFetch:
+    """
+    Handle for pages fetched off the caller's thread, with the done flag and finished
+    signal of a command result so both kinds of work can be waited on alike.
+    """
+
+    def __init__(self, urls):
+        self.urls = urls
+        self.pages = None
+        self.done = False
+        self.finished = CompletionSignal()
+
+# The system prompts and tool descriptions never vary, so every request starts with the
+# same bytes and the provider can serve that prefix from its prompt cache
+CONVERSATION_SYSTEM_MESSAGE = "You are an AI agent designed to assist users with tasks and queries using various tools such as a web browser, terminal, task list, and code editor. Your goal is to provide detailed and accurate responses while breaking down complex tasks into manageable subtasks. Utilize the available tools effectively to gather information, perform actions, and provide step-by-step explanations to the user."
+CONVERSATION_ASSISTANT_MESSAGE = (
+    "I'm here to help you with your tasks and queries. I have access to the following tools:\n\n"
+    "- Web Browser: Allows me to navigate websites, perform searches, and scrape information.\n"
+    "- Terminal: Enables me to execute commands and interact with the system.\n"
+    "- Task List: Helps me manage and keep track of tasks and subtasks.\n"
+    "- Code Editor: Provides a way to write, edit, and save code files.\n\n"
+    "Please provide me with a specific task or query, and I'll do my best to assist you. I'll break down complex tasks into smaller, manageable subtasks and provide detailed explanations and updates along the way. Feel free to ask for clarification or provide additional instructions at any point.\n\n"
+    "The results of my actions are added to the conversation. When I need them before I can finish, I end my reply with a line containing only \"continue\"; to work on the next queued task I end it with \"next task\". Otherwise my reply completes the turn."
+)
+TASK_SYSTEM_MESSAGE = "You are an AI agent tasked with performing the current task from the task list. Use your available tools (web browser, terminal, task list, code editor) to complete the task efficiently. Provide a detailed response explaining your actions and the outcome of the task."
+TASK_ASSISTANT_MESSAGE = (
+    "I have the following tools at my disposal:\n"
+    "- Web Browser: To navigate websites, perform searches, and scrape information.\n"
+    "- Terminal: To execute commands and interact with the system.\n"
+    "- Task List: To manage and update the list of tasks.\n"
+    "- Code Editor: To write, edit, and save code files.\n\n"
+    "I will use these tools as necessary to complete the task efficiently. Please standby for my detailed response and updates on the task progress."
+)
 
 class OpenAIAgent(BaseAgent):
-    def __init__(self, browser, terminal, task_list, code_editor):
-        super().__init__()
-        self.browser = browser
-        self.terminal = terminal
-        self.task_list = task_list
-        self.code_editor = code_editor
+    def __init__(self, browser, terminal, task_list, code_editor, api=None, fetcher=None, page_cache=None):
+        super().__init__(browser, terminal, task_list, code_editor, api, fetcher, page_cache)
+        self.browser.page_cache = self.page_cache
+        self.task_graph = None
+        self.scheduler = None
+        self.turn_input = None
+        self.follow_up = None
+        self.follow_ups = 0
+        # Commands and fetches started by the last response of the turn (see after_actions)
+        self.turn_work = []
+        # Set by a GUI to keep page fetches off its thread (see fetch_in_background)
+        self.fetch_runner = None
         self.action_handlers = {
             "clear": self.action_clear,
             "exit": self.action_exit,
-            "open website": self.action_open_website,
-            "run command": self.action_run_command,
-            "add task": self.action_add_task,
-            "write code": self.action_write_code,
-            "check browser": self.action_check_browser,
+            "run_command": self.action_run_command,
+            "add_task": self.action_add_task,
+            "write_code": self.action_write_code,
+            "check_browser": self.action_check_browser,
             "navigate": self.action_navigate,
             "search": self.action_search,
-            "scrape": self.action_scrape
+            "scrape": self.action_scrape,
+            "continue": self.action_continue,
+            "next_task": self.action_next_task
         }
 
-    def process_input(self, user_input):
+    def process_input(self, user_input, invoke=None):
+        """
+        Run a whole turn without a GUI: the completion for the input, then any follow-ups
+        it asks for. For "task:" input the generated subtasks are run with run_task_graph.
+
+        Args:
+            user_input (str): The user input string.
+            invoke (callable): Passed on to run_task_graph.
+
+        Returns:
+            list: The responses in order; for task input, the plan followed by each subtask's response (or exception).
+        """
+        request = self.prepare_input(user_input)
+        response = self.api.api_calls(**request)
+        responses = [response]
+        task_ids = self.complete_input(user_input, response)
+        if task_ids:
+            results = self.run_task_graph(self.task_graph, task_ids, invoke)
+            return responses + [results[key] for key in sorted(results)]
+        while True:
+            claimed, request = self.next_step()
+            if request is None:
+                return responses
+            try:
+                response = self.api.api_calls(**request)
+            except Exception:
+                self.abort_response(claimed)
+                raise
+            responses.append(self.complete_step(claimed, response))
+
+    @tracer.traced("prompt.assemble")
+    def prepare_input(self, user_input):
+        """
+        Record the user input and build the API request for it without sending it.
+
+        Args:
+            user_input (str): The user input string.
+
+        Returns:
+            dict: Keyword arguments for OpenAIAPI.api_calls.
+        """
         self.conversation_history.append(f"User: {user_input}")
-        print(f"User input: {user_input}")
+        self.trim_history()
+        self.turn_input = user_input
+        self.follow_up = None
+        self.follow_ups = 0
+        self.turn_work = []
+        logger.debug("User input: %s", user_input)
         
         if user_input.lower().startswith("task:"):
             self.current_task = user_input[5:].strip()
             self.conversation_history.append(f"Assistant: Understood. The current task is: {self.current_task}. I'll break it into smaller manageable tasks and start working on them.")
-            print(f"Current task set to: {self.current_task}")
-            
-            subtasks = self.generate_subtasks(self.current_task)
-            print(f"Generated subtasks: {subtasks}")
-            
-            for subtask in subtasks:
-                self.task_list.add_task(subtask)
-                print(f"Added subtask to task list: {subtask}")
-        else:
-            context = f"Current Task: {self.current_task}\n\n" if self.current_task else ""
-            print(f"Current context: {context}")
-            
-            if self.knowledge_base:
-                knowledge_base_context = "\n".join([f"{key}: {value}" for key, value in self.knowledge_base.items()])
-                context += f"Knowledge Base:\n{knowledge_base_context}\n\n"
-                print(f"Knowledge base context added to context: {knowledge_base_context}")
-            
-            task_list_context = "\n".join([f"Task {i+1}: {task}" for i, task in enumerate(self.get_task_list())])
-            context += f"Task List:\n{task_list_context}\n\n"
-            print(f"Task list context added to context: {task_list_context}")
-            
-            context += "\n".join(self.conversation_history[-5:])
-            print(f"Conversation history added to context: {self.conversation_history[-5:]}")
-            
-            system_message = "You are an AI agent designed to assist users with tasks and queries using various tools such as a web browser, terminal, task list, and code editor. Your goal is to provide detailed and accurate responses while breaking down complex tasks into manageable subtasks. Utilize the available tools effectively to gather information, perform actions, and provide step-by-step explanations to the user."
-            
-            user_message = user_input
-            
-            assistant_message = "I'm here to help you with your tasks and queries. I have access to the following tools:\n\n"
-            assistant_message += "- Web Browser: Allows me to navigate websites, perform searches, and scrape information.\n"
-            assistant_message += "- Terminal: Enables me to execute commands and interact with the system.\n"
-            assistant_message += "- Task List: Helps me manage and keep track of tasks and subtasks.\n"
-            assistant_message += "- Code Editor: Provides a way to write, edit, and save code files.\n\n"
-            assistant_message += "Please provide me with a specific task or query, and I'll do my best to assist you. I'll break down complex tasks into smaller, manageable subtasks and provide detailed explanations and updates along the way. Feel free to ask for clarification or provide additional instructions at any point."
-            
-            response = self.api.api_calls(system_message, assistant_message, user_message, context)
-            self.conversation_history.append(f"Assistant: {response}")
-            print(f"Generated response: {response}")
+            logger.info("Current task set to: %s", self.current_task)
+            return self.subtasks_request(self.current_task)
+
+        return self.conversation_request(user_input, user_input)
+
+    def conversation_request(self, query, user_message):
+        """
+        Build a request carrying the current task, knowledge relevant to query, the task list and recent history.
+
+        Args:
+            query (str): The text knowledge base context is retrieved for.
+            user_message (str): The message the model answers.
+
+        Returns:
+            dict: Keyword arguments for OpenAIAPI.api_calls.
+        """
+        # Ordered from the blocks that change least between turns to those that change every turn
+        context = []
+        if self.current_task:
+            context.append(ContextBlock("Current Task", [self.current_task]))
+        
+        summary = self.memory.context()
+        if summary:
+            context.append(ContextBlock("Earlier Conversation Summary", [summary]))
+        
+        task_list_context = [f"Task {i+1}: {task}" for i, task in enumerate(self.get_task_list())]
+        context.append(ContextBlock("Task List", task_list_context))
+        logger.debug("Task list context added to context: %s", task_list_context)
+        
+        knowledge_base_context = self.get_knowledge_context(query)
+        if knowledge_base_context:
+            context.append(ContextBlock("Knowledge Base", knowledge_base_context, "\n\n"))
+            logger.debug("Knowledge base context added to context: %d chunks", len(knowledge_base_context))
+        
+        context.append(ContextBlock("Recent Conversation", self.conversation_history[-5:]))
+        logger.debug("Conversation history added to context: %s", self.conversation_history[-5:])
+        
+        return {
+            "system_message": CONVERSATION_SYSTEM_MESSAGE,
+            "assistant_message": CONVERSATION_ASSISTANT_MESSAGE,
+            "user_message": user_message,
+            "context": context
+        }
+
+    @tracer.traced("agent.complete_input")
+    def complete_input(self, user_input, response):
+        """
+        Apply the API response for a request built by prepare_input.
+
+        Args:
+            user_input (str): The user input string the request was built from.
+            response (str): The completed API response.
+
+        Returns:
+            dict: For task input, the generated subtasks' task ids keyed by subtask number; otherwise None.
+        """
+        if user_input.lower().startswith("task:"):
+            graph = TaskGraph.from_lines(self.parse_subtasks(response))
+            logger.debug("Generated subtasks: %s", list(graph.contents.values()))
             
-            self.execute_action(response)
-            print(f"Action execution completed for response: {response}")
+            keys = list(graph.contents)
+            task_ids = dict(zip(keys, self.task_list.add_tasks([graph.contents[key] for key in keys])))
+            self.task_list.add_dependencies([(task_ids[key], task_ids[dependency]) for key in keys for dependency in graph.dependencies[key]])
+            self.task_graph = graph
+            logger.info("Added %d subtasks to task list.", len(keys))
+            return task_ids
+
+        with self.collect_work() as self.turn_work:
+            self.apply_response(response)
+
+    def apply_response(self, response):
+        # Record the response, then run its actions once; their results follow it in the history
+        self.conversation_history.append(f"Assistant: {response}")
+        logger.debug("Generated response: %s", response)
+        
+        self.execute_action(response)
+        logger.debug("Action execution completed for response")
+
+    @tracer.traced("agent.next_step")
+    def next_step(self):
+        """
+        Build the follow-up request the last response asked for, if any.
+
+        A turn makes one completion unless the response ends with "continue", which asks
+        for another look at the conversation now that its action results are in it, or
+        "next task", which claims the next queued task. At most MAX_FOLLOW_UPS follow-ups
+        run per turn.
+
+        Returns:
+            tuple: The claimed (task_id, content) or None, and the api_calls keyword arguments, or (None, None) when the turn is over.
+        """
+        follow_up, self.follow_up = self.follow_up, None
+        if follow_up is None:
+            return None, None
+        if self.follow_ups >= MAX_FOLLOW_UPS:
+            logger.info("Follow-up limit of %d reached; ending the turn.", MAX_FOLLOW_UPS)
+            return None, None
+        self.follow_ups += 1
+        tracer.increment("follow_ups", kind=follow_up)
+
+        if follow_up == "next_task":
+            claimed, request = self.prepare_response()
+            if request is None:
+                logger.info("No runnable task in the queue.")
+            return claimed, request
+        return None, self.follow_up_request()
+
+    def follow_up_request(self):
+        user_message = f"Continue with my request: {self.turn_input}\nThe results of your actions so far are in the conversation above."
+        return self.conversation_request(self.turn_input or "", user_message)
+
+    @tracer.traced("agent.complete_step")
+    def complete_step(self, claimed, response):
+        """
+        Apply the API response for a request built by next_step.
+
+        Args:
+            claimed (tuple): The (task_id, content) the request was built for, or None for a "continue" step.
+            response (str): The completed API response.
+
+        Returns:
+            str: The response.
+        """
+        with self.collect_work() as self.turn_work:
+            if claimed is not None:
+                return self.complete_response(claimed, response)
+            self.apply_response(response)
+            return response
+
+    def after_actions(self, callback):
+        """
+        Call callback once the commands and fetches started by the turn's last response
+        have finished, so a follow-up built then sees their results. Called straight away
+        when there are none; otherwise from the thread that finishes the last of them (in
+        the GUI, its own thread).
+        """
+        work = [item for item in self.turn_work if not item.done]
+        if not work:
+            callback()
+            return
+        remaining = [len(work)]
+
+        def finished(item):
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                callback()
+
+        logger.info("Waiting for %d started actions before following up.", len(work))
+        for item in work:
+            item.finished.connect(finished)
 
     def generate_response(self):
-        if self.task_list.get_tasks():
-            next_task = self.task_list.get_tasks()[0]
-            print(f"Next task to perform: {next_task}")
-            
-            system_message = "You are an AI agent tasked with performing the current task from the task list. Use your available tools (web browser, terminal, task list, code editor) to complete the task efficiently. Provide a detailed response explaining your actions and the outcome of the task."
-            
-            user_message = f"Perform the following task: {next_task}"
-            
-            assistant_message = f"I will now perform the task: {next_task}\n\n"
-            assistant_message += "I have the following tools at my disposal:\n"
-            assistant_message += "- Web Browser: To navigate websites, perform searches, and scrape information.\n"
-            assistant_message += "- Terminal: To execute commands and interact with the system.\n"
-            assistant_message += "- Task List: To manage and update the list of tasks.\n"
-            assistant_message += "- Code Editor: To write, edit, and save code files.\n\n"
-            assistant_message += "I will use these tools as necessary to complete the task efficiently. Please standby for my detailed response and updates on the task progress."
-            
-            response = self.api.api_calls(system_message, assistant_message, user_message)
-            print(f"Generated task response: {response}")
-            
-            self.execute_action(response)
-            print(f"Action execution completed for task response: {response}")
-            
-            if isinstance(next_task, str):
-                self.task_list.remove_task(next_task)
-                print(f"Removed task from task list: {next_task}")
+        claimed, request = self.prepare_response()
+        if request is None:
+            return self.complete_response(None, None)
+        try:
+            response = self.api.api_calls(**request)
+        except Exception:
+            self.abort_response(claimed)
+            raise
+        return self.complete_response(claimed, response)
+
+    def abort_response(self, claimed):
+        # Put a claimed task back in the queue when its completion failed
+        if claimed is not None:
+            self.task_list.requeue_task(claimed[0])
+
+    @tracer.traced("agent.prepare_response")
+    def prepare_response(self):
+        """
+        Claim the next task from the task queue and build the API request for it.
+
+        Returns:
+            tuple: The claimed (task_id, content) and the api_calls keyword arguments, or (None, None) if no task is runnable.
+        """
+        claimed = self.task_list.dequeue_next()
+        if claimed is None:
+            return None, None
+
+        next_task = claimed[1]
+        logger.info("Next task to perform: %s", next_task)
+        return claimed, self.task_request(next_task)
+
+    def task_request(self, next_task, prerequisites=()):
+        """
+        Build the request for one task. The task goes in the user message and what it
+        builds on in a context block, so the prefix is the same for every task.
+
+        Args:
+            next_task (str): The task.
+            prerequisites (list): (task, response) pairs for the finished tasks it depends on.
+        """
+        context = []
+        if prerequisites:
+            # Long responses keep their start, where the plan and results usually are
+            context.append(ContextBlock("Completed Prerequisite Tasks", [f"Task: {task}\nResult: {response[:2000]}" for task, response in prerequisites], "\n\n"))
+        return {
+            "system_message": TASK_SYSTEM_MESSAGE,
+            "assistant_message": TASK_ASSISTANT_MESSAGE,
+            "user_message": f"Perform the following task: {next_task}",
+            "context": context
+        }
+
+    def run_task_graph(self, graph, task_ids, invoke=None, on_progress=None, max_workers=4, tool_limits=None):
+        """
+        Run generated subtasks concurrently in dependency order.
+
+        Completions run on a bounded worker pool, each with the responses of the subtasks
+        it depends on in its context; each response is applied through
+        complete_response while holding a slot for the tool the subtask needs. The slot
+        is held until the commands and fetches the response started have finished, since
+        they run in the background.
+
+        Args:
+            graph (TaskGraph): The subtasks to run.
+            task_ids (dict): Task list ids keyed by subtask number, as returned by complete_input.
+            invoke (callable): Runs a callable on the thread that owns the widgets and task database. Defaults to calling it directly.
+            on_progress (callable): Called on that thread as on_progress(task_id, content, status, result).
+            max_workers (int): Maximum number of subtasks in flight.
+            tool_limits (dict): Maximum concurrent subtasks per tool.
+
+        Returns:
+            dict: Responses (or exceptions) keyed by subtask number.
+        """
+        invoke = invoke or (lambda function: function())
+        self.scheduler = DagScheduler(max_workers, tool_limits)
+        results = {}
+        # Subtasks run on scheduler threads; their spans are attributed to the caller's turn
+        parent = tracer.current()
+
+        def plan(key, content):
+            # A subtask only starts once its dependencies are done, so their responses are in results
+            prerequisites = [(graph.contents[dependency], results[dependency]) for dependency in sorted(graph.dependencies[key])]
+            with tracer.activate(parent), tracer.span("subtask.plan", subtask=key):
+                return self.api.api_calls(**self.task_request(content, prerequisites))
+
+        def apply(key, content, response):
+            with self.collect_work() as started, tracer.activate(parent):
+                return self.complete_response((task_ids[key], content), response), started
+
+        def finished(work):
+            # Called through invoke, on the thread that emits finished, so work cannot finish unseen in between
+            event = threading.Event()
+            if work.done:
+                event.set()
             else:
-                print(f"Invalid task type. Expected str, but got {type(next_task)}.")
-            
-            print(f"Completed task: {next_task}")
-            print(f"Generated response: {response}")
-            return response
-        else:
-            print("All tasks completed. Waiting for new tasks or queries.")
+                work.finished.connect(lambda work: event.set())
+            return event
+
+        def act(key, content, response):
+            results[key], started = invoke(lambda: apply(key, content, response))
+            for work in started:
+                invoke(lambda: finished(work)).wait()
+            return results[key]
+
+        def progress(key, status):
+            task_id = task_ids[key]
+            if status == "running":
+                invoke(lambda: self.task_list.start_task(task_id))
+            elif status == "failed":
+                invoke(lambda: self.task_list.requeue_task(task_id))
+            if on_progress is not None:
+                invoke(lambda: on_progress(task_id, graph.contents[key], status, results.get(key)))
+
+        return self.scheduler.run(graph, plan, act, progress)
+
+    @contextmanager
+    def collect_work(self):
+        """
+        Collect the commands and background fetches started by the actions run inside the block.
+
+        Yields:
+            list: Their CommandResults and BackgroundFetches, filled in as they start.
+        """
+        started = []
+        token = STARTED_WORK.set(started)
+        try:
+            yield started
+        finally:
+            STARTED_WORK.reset(token)
+
+    def track_work(self, work):
+        started = STARTED_WORK.get()
+        if started is not None:
+            started.append(work)
+
+    @tracer.traced("agent.complete_response")
+    def complete_response(self, claimed, response):
+        """
+        Apply the API response for the task claimed by prepare_response.
+
+        Args:
+            claimed (tuple): The (task_id, content) the response was generated for, or None if no task was runnable.
+            response (str): The completed API response.
+
+        Returns:
+            str: The generated response.
+        """
+        if claimed is None:
+            logger.info("All tasks completed. Waiting for new tasks or queries.")
             return "All tasks have been completed. I'm ready to assist you with new tasks or queries. Please let me know how else I can help you."
-    def execute_action(self, action):
-        print(f"Executing action: {action}")
+
+        task_id, next_task = claimed
+        logger.debug("Generated task response: %s", response)
+        
+        self.execute_action(response)
+        logger.debug("Action execution completed for task response")
         
-        for keyword, handler in self.action_handlers.items():
-            if keyword in action.lower():
-                print(f"Found matching action handler: {keyword}")
-                handler(action)
-                return
+        self.task_list.remove_task_by_id(task_id)
+        logger.debug("Removed task from task list: %s", next_task)
         
-        print(f"No valid action found for: {action}")
+        logger.info("Completed task: %s", next_task)
+        return response
+
+    def execute_action(self, action):
+        """
+        Parse every action in a response and dispatch them in order.
 
-    def action_clear(self, action):
+        Args:
+            action (str): The response text.
+
+        Handlers may return a one-line summary of what they did; the summaries are added
+        to the conversation history as a single entry, so the next step sees them.
+
+        Returns:
+            list: The parsed Action tuples that were dispatched.
+        """
+        with tracer.span("actions.dispatch") as span:
+            actions = parse_actions(action)
+            span.set(actions=len(actions))
+            if not actions:
+                logger.info("No valid action found in response.")
+                return actions
+            
+            results = []
+            for parsed in actions:
+                logger.debug("Dispatching action: %s", parsed.kind)
+                tracer.increment("actions", kind=parsed.kind)
+                with tracer.span(f"tool.{parsed.kind}"):
+                    result = self.action_handlers[parsed.kind](parsed.argument)
+                if result:
+                    results.append(result)
+            if results:
+                self.conversation_history.append("Action results:\n" + "\n".join(f"- {result}" for result in results))
+            return actions
+
+    def action_clear(self, argument=None):
         self.conversation_history = []
         self.current_task = None
-        print("Conversation history and current task cleared.")
+        self.memory.clear()
+        logger.info("Conversation history and current task cleared.")
 
-    def action_exit(self, action):
-        print("Exiting the program...")
+    def action_exit(self, argument=None):
+        logger.info("Exiting the program...")
         exit()
 
-    def action_open_website(self, action):
-        url = self.extract_url_from_action(action)
-        if url:
-            self.browser.navigate_to(url)
-            print(f"Navigated to URL: {url}")
-        else:
-            print(f"No valid URL found in action: {action}")
-            self.conversation_history.append(f"Assistant: I couldn't find a valid URL in the given action: {action}. Please provide a valid URL or a specific website you want me to navigate to.")
-
-    def action_navigate(self, action):
-        url = self.extract_url_from_action(action)
-        if url:
-            self.browser.navigate_to(url)
-            print(f"Navigated to URL: {url}")
-        else:
-            print(f"No valid URL found in action: {action}")
-
-    def action_search(self, action):
-        query = self.extract_search_query_from_action(action)
-        if query:
-            search_url = f"https://www.google.com/search?q={query}"
-            self.browser.navigate_to(search_url)
-            print(f"Performed web search for: {query}")
-        else:
-            print(f"No valid search query found in action: {action}")
+    def action_continue(self, argument=None):
+        self.follow_up = "continue"
+
+    def action_next_task(self, argument=None):
+        self.follow_up = "next_task"
+
+    def action_navigate(self, url):
+        self.open_in_browser(url)
+        logger.info("Navigated to URL: %s", url)
+        return f"Opened {url} in the browser"
 
-    def action_scrape(self, action):
+    def action_search(self, query):
+        url = SEARCH_URL + quote_plus(query)
+
+        def searched(pages):
+            logger.info("Performed web search for: %s", query)
+            if not pages:
+                return f"Search for {query!r} failed"
+            return f"Searched for {query!r}; the results are in the knowledge base"
+
+        summary = self.fetch_in_background([url], searched)
+        # The agent reads the results from the knowledge base; the browser only shows them to
+        # the user, so nothing waits for the view to load
+        self.open_in_browser(url, wait=False)
+        return summary or f"Started a search for {query!r} (the results are added to the knowledge base when they arrive)"
+
+    def action_scrape(self, argument=None):
+        url = self.browser.get_current_url()
+        if not url:
+            logger.info("No page is open to scrape.")
+            return "No page is open to scrape"
+
+        def scraped(pages):
+            if pages:
+                return f"Scraped {url} into the knowledge base"
+            if self.browser.get_current_url() != url:
+                return f"Could not fetch {url}, and the browser has since left it"
+            # Pages the headless fetcher cannot reach (logins, script-rendered content) come from the view
+            page = self.browser.scrape_text(self.api.token_budget.count_text)
+            self.add_knowledge(page.url, page.text)
+            logger.info("Scraped page from: %s", page.url)
+            logger.debug("Extracted %d characters (%d tokens) from %d characters of HTML", len(page.text), page.token_count, page.html_length)
+            return f"Scraped {page.url} into the knowledge base"
+
+        return self.fetch_in_background([url], scraped) or f"Started scraping {url} (the page is added to the knowledge base when it arrives)"
+
+    def open_in_browser(self, url, wait=True):
+        # Re-navigating to the page already open would only download and render it again
         current_url = self.browser.get_current_url()
-        self.browser.get_page_source()
-        page_source = self.browser.page_source
-        self.knowledge_base[current_url] = page_source
-        print(f"Scraped page source from: {current_url}")
-        print(f"Page source length: {len(page_source)}")
-
-    def action_run_command(self, action):
-        command = self.extract_command_from_action(action)
-        if command:
-            self.terminal.execute_command(command)
-            print(f"Executed command: {command}")
-        else:
-            print(f"No valid command found in action: {action}")
-
-    def action_add_task(self, action):
-        task = self.extract_task_from_action(action)
-        if task:
-            self.task_list.add_task(task)
-            self.conversation_history.append(f"Assistant: Added task: {task}")
-            print(f"Added task: {task}")
-        else:
-            print(f"No valid task found in action: {action}")
+        if current_url and normalize_url(url) == normalize_url(current_url):
+            return
+        self.browser.navigate_to(url, wait)
 
-    def action_write_code(self, action):
-        code = self.extract_code_from_action(action)
-        if code:
-            self.code_editor.set_code(code)
-            print("Code written to editor.")
-        else:
-            print(f"No valid code found in action: {action}")
+    def fetch_in_background(self, urls, describe):
+        """
+        Fetch pages into the knowledge base without blocking the caller's thread when a
+        fetch_runner is set.
+
+        fetch_runner(urls, on_fetched) must download the pages with download_pages on
+        another thread and call on_fetched(pages) back on the caller's thread. Without
+        one the pages are fetched straight away.
+
+        Args:
+            urls (list): The URLs to fetch.
+            describe (callable): Called with the fetched pages once they are in the knowledge base; returns a summary of the outcome.
+
+        Returns:
+            str: The summary if the fetch has finished, or None if it runs in the background;
+            its summary is then added to the conversation when it finishes.
+        """
+        if self.fetch_runner is None:
+            return describe(self.fetch_pages(urls))
+
+        fetch = BackgroundFetch(urls)
+
+        def fetched(pages):
+            self.store_pages(pages)
+            self.conversation_history.append(f"Assistant: {describe(pages)}")
+            fetch.pages, fetch.done = pages, True
+            fetch.finished.emit(fetch)
+
+        self.track_work(fetch)
+        self.fetch_runner(urls, fetched)
+        return None
+
+    def fetch_pages(self, urls):
+        """
+        Fetch pages with download_pages and add their extracted text to the knowledge base.
+
+        Returns:
+            list: The pages that were fetched or served from the cache.
+        """
+        pages = self.download_pages(urls)
+        self.store_pages(pages)
+        return pages
+
+    @tracer.traced("tool.fetch_pages")
+    def download_pages(self, urls):
+        """
+        Fetch pages headlessly without touching the knowledge base, so it is safe to call
+        from any thread.
+
+        Pages still fresh in the page cache are served without a request, and stale ones
+        are revalidated with a conditional request. The visible browser is left alone,
+        so retrieval neither waits on rendering nor takes the page the user is looking
+        at away from them.
+
+        Args:
+            urls (list): The URLs to fetch concurrently.
+
+        Returns:
+            list: Pages (ExtractedPage or CachedPage) that were fetched or served from the cache.
+        """
+        pages = [None] * len(urls)
+        stale = {}
+        for index, url in enumerate(urls):
+            cached = self.page_cache.get(url)
+            if cached is not None and self.page_cache.is_fresh(cached):
+                tracer.increment("page_cache_lookups", result="fresh")
+                pages[index] = cached
+                logger.debug("Served %s from the page cache", cached.url)
+            else:
+                stale[index] = cached
+
+        indexes = list(stale)
+        headers = [self.page_cache.validators(stale[index]) if stale[index] else None for index in indexes]
+        for index, result in zip(indexes, self.fetcher.fetch_many([urls[index] for index in indexes], headers=headers)):
+            if result.status == 304 and stale[index] is not None:
+                tracer.increment("page_cache_lookups", result="revalidated")
+                pages[index] = self.page_cache.touch(urls[index]) or stale[index]
+                logger.debug("Revalidated %s in %.2fs", result.url, result.elapsed)
+                continue
+            tracer.increment("page_cache_lookups", result="miss")
+            if result.error or result.status >= 400:
+                logger.warning("Failed to fetch %s: %s", result.url, result.error or result.status)
+                continue
+            page = extract_page(result.text, result.url, self.api.token_budget.count_text)
+            pages[index] = self.page_cache.put(urls[index], page, result.headers.get("etag"), result.headers.get("last-modified"))
+            logger.info("Fetched %s in %.2fs: %d characters (%d tokens) from %d characters of HTML", page.url, result.elapsed, len(page.text), page.token_count, page.html_length)
+
+        return [page for page in pages if page is not None]
+
+    def store_pages(self, pages):
+        for page in pages:
+            # Re-indexing an unchanged page would only rebuild the same chunks
+            if self.knowledge_base.get(page.url) != page.text:
+                self.add_knowledge(page.url, page.text)
 
-    def action_check_browser(self, action):
+    def action_run_command(self, command):
+        result = self.terminal.execute_command(command)
+        result.finished.connect(self.record_command_result)
+        self.track_work(result)
+        logger.info("Started command: %s", command)
+        if result.done:
+            # Headless terminals run the command to completion; its output is already recorded
+            return f"Ran command: {command}"
+        return f"Started command: {command} (its output is recorded when it finishes)"
+
+    def action_add_task(self, task):
+        self.task_list.add_task(task)
+        logger.debug("Added task: %s", task)
+        return f"Added task: {task}"
+
+    def action_write_code(self, code):
+        self.code_editor.set_code(code)
+        logger.info("Code written to editor.")
+        return f"Wrote {len(code.splitlines())} lines to the code editor"
+
+    def action_check_browser(self, argument=None):
         current_url = self.browser.get_current_url()
-        self.browser.get_page_source()
-        page_source = self.browser.page_source
-        print(f"Current URL: {current_url}")
-        print(f"Page source length: {len(page_source)}")
+        page_source = self.browser.get_page_source()
+        logger.info("Current URL: %s", current_url)
+        logger.info("Page source length: %d", len(page_source))
+        return f"The browser is at {current_url or 'no page'} ({len(page_source)} characters of page source)"
 
     def remove_task(self, task_text):
         if isinstance(task_text, str):
             self.task_list.remove_task(task_text)
             self.conversation_history.append(f"Assistant: Removed task: {task_text}")
-            print(f"Removed task: {task_text}")
+            logger.debug("Removed task: %s", task_text)
         else:
-            print(f"Invalid task_text type. Expected str, but got {type(task_text)}.")
+            logger.warning("Invalid task_text type. Expected str, but got %s.", type(task_text))
 
     def research(self, topic):
-        search_query = f"{topic}"
-        self.browser.navigate_to(f"https://www.google.com/search?q={search_query}")
+        self.fetch_pages([SEARCH_URL + quote_plus(topic)])
         self.conversation_history.append(f"Assistant: Researching '{topic}' on the web.")
-        print(f"Researching '{topic}' on the web.")
+        logger.info("Researching '%s' on the web.", topic)
 
-    def interact_with_terminal(self, command):
-        self.terminal.execute_command(command)
+    def interact_with_terminal(self, command, timeout=None, session="default"):
+        result = self.terminal.execute_command(command, timeout, session)
+        result.finished.connect(self.record_command_result)
         self.conversation_history.append(f"Assistant: Executed command: {command}")
-        print(f"Executed command: {command}")
+        logger.info("Executed command: %s", command)
+        return result
+
+    def record_command_result(self, result):
+        if result.timed_out:
+            status = "timed out"
+        elif result.cancelled:
+            status = "was cancelled"
+        else:
+            status = f"exited with code {result.exit_code}"
+        self.conversation_history.append(f"Assistant: Command '{result.command}' {status}. Output:\n{result.output[-2000:]}")
+        logger.info("Command '%s' %s.", result.command, status)
 
     def create_file(self, filename, content):
         self.code_editor.set_code(content)
         self.code_editor.save_file(filename)
         self.conversation_history.append(f"Assistant: Created file '{filename}'.")
-        print(f"Created file '{filename}'.")
+        logger.info("Created file '%s'.", filename)
 
     def edit_file(self, filename, content):
-        self.code_editor.open_file(filename)
+        self.code_editor.load_file(filename)
         self.code_editor.set_code(content)
         self.code_editor.save_file(filename)
         self.conversation_history.append(f"Assistant: Edited file '{filename}'.")
-        print(f"Edited file '{filename}'.")
+        logger.info("Edited file '%s'.", filename)
 
     def open_file(self, filename):
-        self.code_editor.open_file(filename)
+        self.code_editor.load_file(filename)
         self.conversation_history.append(f"Assistant: Opened file '{filename}'.")
-        print(f"Opened file '{filename}'.")
+        logger.info("Opened file '%s'.", filename)
 
     def generate_subtasks(self, task):
-        prompt = f"Break down the following task into smaller subtasks: {task}"
-        response = self.api.api_calls("", "", prompt)
+        response = self.api.api_calls(**self.subtasks_request(task))
+        return self.parse_subtasks(response)
+
+    def subtasks_request(self, task):
+        prompt = f"Break down the following task into smaller subtasks: {task}\n\n"
+        prompt += "Write one numbered subtask per line. If a subtask needs the outcome of earlier subtasks, end its line with (depends on: N, M) listing their numbers; otherwise leave it out so the subtask can run in parallel."
+        return {"system_message": "", "assistant_message": "", "user_message": prompt}
+
+    def parse_subtasks(self, response):
         subtasks = response.split("\n")
         return [subtask.strip() for subtask in subtasks if subtask.strip()]
 
     def generate_task_response(self, task):
         prompt = f"Perform the following task: {task}"
         return self.api.api_calls("", "", prompt)
-
-    def extract_url_from_action(self, action):
-        url_pattern = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
-        urls = url_pattern.findall(action)
-        if urls:
-            return urls[0]
-        else:
-            return None
-
-    def extract_search_query_from_action(self, action):
-        query_pattern = re.compile(r'search:\s*(.+)', re.IGNORECASE)
-        match = query_pattern.search(action)
-        if match:
-            return match.group(1)
-        else:
-            return None
-
-    def extract_command_from_action(self, action):
-        command_pattern = re.compile(r'run command:\s*(.+)', re.IGNORECASE)
-        match = command_pattern.search(action)
-        if match:
-            return match.group(1)
-        else:
-            return None
-
-    def extract_task_from_action(self, action):
-        task_pattern = re.compile(r'add task:\s*(.+)', re.IGNORECASE)
-        match = task_pattern.search(action)
-        if match:
-            return match.group(1)
-        else:
-            return None
-
-    def extract_code_from_action(self, action):
-        code_pattern = re.compile(r'write code:\s*(.+)', re.IGNORECASE)
-        match = code_pattern.search(action)
-        if match:
-            return match.group(1)
-        else:
-            return None
\ No newline at end of file
@@ -0,0 +1,164 @@
+from abc import ABC, abstractmethod
+from collections import namedtuple
+import threading
+
+# Interfaces for the tools an agent drives, implemented by the Qt widgets and by the
+# headless tools in runtime.tools. The widgets cannot inherit these ABCs (Qt's metaclass
+# conflicts with ABCMeta), so each gui module registers its widget as a virtual subclass.
+
+# The four tools an agent drives, as passed to BaseAgent
+ToolSet = namedtuple("ToolSet", ["browser", "terminal", "task_list", "code_editor"])
+
+class CompletionSignal:
+    """
+    Stand-in for a Qt signal that fires once. Callbacks connected after it has fired
+    are called straight away, so work that finished before the caller connected is
+    not missed.
+    """
+
+    def __init__(self):
+        self.callbacks = []
+        self.value = None
+        self.fired = False
+        self._lock = threading.Lock()
+
+    def connect(self, callback):
+        with self._lock:
+            if not self.fired:
+                self.callbacks.append(callback)
+                return
+        callback(self.value)
+
+    def emit(self, value):
+        with self._lock:
+            self.value = value
+            self.fired = True
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback(value)
+
+class BrowserTool(ABC):
+    """
+    What the agent needs from a browser. Implementations set page_cache to the agent's
+    PageCache, or leave it None.
+    """
+    page_cache = None
+
+    @abstractmethod
+    def navigate_to(self, url, wait=True):
+        """
+        Open url. With wait=False the call returns without waiting for the page to load.
+        """
+        pass
+
+    @abstractmethod
+    def get_current_url(self):
+        """
+        Returns:
+            str: The URL of the open page, or an empty string if none is open.
+        """
+        pass
+
+    @abstractmethod
+    def get_page_source(self):
+        """
+        Returns:
+            str: The HTML of the open page, or an empty string if none is open.
+        """
+        pass
+
+    @abstractmethod
+    def scrape_text(self, count_tokens=None):
+        """
+        Returns:
+            ExtractedPage: The open page reduced to text (a CachedPage when the page cache holds a fresh copy).
+        """
+        pass
+
+class TerminalTool(ABC):
+    @abstractmethod
+    def execute_command(self, command, timeout=None, session="default"):
+        """
+        Start a shell command.
+
+        Args:
+            command (str): The command to run.
+            timeout (int): Timeout in milliseconds, or None for the terminal's default; 0 disables it.
+            session (str): Name of the shell session to run in, or None for a one-off process.
+
+        Returns:
+            A result with command, stdout, stderr, output, exit_code, timed_out, cancelled
+            and done attributes and a finished signal whose connect(callback) calls back
+            with the result once the command is done.
+        """
+        pass
+
+class TaskListTool(ABC):
+    @abstractmethod
+    def add_task(self, task):
+        pass
+
+    @abstractmethod
+    def add_tasks(self, tasks):
+        """
+        Returns:
+            list: The new task ids, in order.
+        """
+        pass
+
+    @abstractmethod
+    def add_dependencies(self, dependencies):
+        """
+        Args:
+            dependencies (list): (task_id, depends_on) pairs.
+        """
+        pass
+
+    @abstractmethod
+    def remove_task(self, task_text):
+        pass
+
+    @abstractmethod
+    def remove_task_by_id(self, task_id):
+        pass
+
+    @abstractmethod
+    def dequeue_next(self):
+        """
+        Returns:
+            tuple: (task_id, content) of the claimed task, or None if nothing is runnable.
+        """
+        pass
+
+    @abstractmethod
+    def start_task(self, task_id):
+        pass
+
+    @abstractmethod
+    def requeue_task(self, task_id):
+        pass
+
+    @abstractmethod
+    def get_tasks(self):
+        """
+        Returns:
+            list: The contents of the open tasks, in order.
+        """
+        pass
+
+class CodeEditorTool(ABC):
+    @abstractmethod
+    def get_code(self):
+        pass
+
+    @abstractmethod
+    def set_code(self, code):
+        pass
+
+    @abstractmethod
+    def load_file(self, file_path):
+        pass
+
+    @abstractmethod
+    def save_file(self, file_path):
+        pass
@@ -0,0 +1,59 @@
+"""
+Microbenchmark: compiled single-pass action parser vs. the previous substring dispatcher.
+
+The previous dispatcher scanned action.lower() for every handler keyword, fired only the
+first match, and recompiled the extraction regex on each call. Run from the repo root:
+
+    python -m benchmarks.bench_action_dispatch
+"""
+import re
+import timeit
+
+from utils.action_parser import parse_actions
+
+LEGACY_KEYWORDS = ["clear", "exit", "open website", "run command", "add task", "write code", "check browser", "navigate", "search", "scrape"]
+LEGACY_PATTERNS = {
+    "open website": r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
+    "navigate": r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
+    "run command": r'run command:\s*(.+)',
+    "add task": r'add task:\s*(.+)',
+    "write code": r'write code:\s*(.+)',
+    "search": r'search:\s*(.+)',
+}
+
+def legacy_dispatch(action):
+    for keyword in LEGACY_KEYWORDS:
+        if keyword in action.lower():
+            pattern = LEGACY_PATTERNS.get(keyword)
+            if pattern is None:
+                return [(keyword, None)]
+            # re.compile goes through the module cache, as the old helpers did
+            match = re.compile(pattern, re.IGNORECASE).search(action)
+            return [(keyword, match.group(0) if match else None)]
+    return []
+
+def make_response(paragraphs):
+    filler = "The implementation reads the configuration, validates every field and reports the result back to the user. "
+    sections = []
+    for i in range(paragraphs):
+        sections.append(filler * 8)
+        sections.append(f"run command: pytest tests/test_module_{i}.py -q")
+        sections.append(f"Next, navigate to https://docs.example.com/page/{i} for the reference.")
+        sections.append(f"add task: review module {i}")
+        sections.append(f"write code:\n```python\ndef handler_{i}(event):\n    return event.payload\n```")
+    return "\n".join(sections)
+
+def main():
+    for paragraphs in (1, 10, 100):
+        response = make_response(paragraphs)
+        number = max(1, 2000 // paragraphs)
+        legacy = timeit.timeit(lambda: legacy_dispatch(response), number=number) / number
+        compiled = timeit.timeit(lambda: parse_actions(response), number=number) / number
+        print(
+            f"{len(response):>8} chars | legacy {legacy * 1e6:9.1f} us, {len(legacy_dispatch(response))} action(s) "
+            f"| compiled {compiled * 1e6:9.1f} us, {len(parse_actions(response))} action(s) "
+            f"| {compiled / len(parse_actions(response)) * 1e6:6.2f} us/action"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: full-document highlight time of PythonHighlighter on large generated files.
+
+Highlights generated Python sources of increasing size (functions, classes, comments,
+single- and triple-quoted strings) with the previous per-block QRegularExpression
+rules and with the current highlighter, then times opening each file in CodeEditor
+with the whole document highlighted up front and with progressive highlighting,
+where set_code returns once the visible blocks are done. Needs PyQt5; runs headless
+with the offscreen platform. Run from the repo root:
+
+    python -m benchmarks.bench_highlighter [--lines 5000 20000]
+"""
+import argparse
+import keyword
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QRegularExpression
+from PyQt5.QtGui import QColor, QFont, QSyntaxHighlighter, QTextCharFormat, QTextDocument
+from PyQt5.QtWidgets import QApplication
+
+from gui.code_editor import CodeEditor, PythonHighlighter
+
+class LegacyHighlighter(QSyntaxHighlighter):
+    """The highlighter as it was before: every rule rebuilt for every block."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        keywordFormat = QTextCharFormat()
+        keywordFormat.setForeground(QColor("#008000"))
+        keywordFormat.setFontWeight(QFont.Bold)
+        commentFormat = QTextCharFormat()
+        commentFormat.setForeground(QColor("#808080"))
+        quotationFormat = QTextCharFormat()
+        quotationFormat.setForeground(QColor("#800000"))
+        self.highlightingRules = [
+            (f"\\b({'|'.join(keyword.kwlist)})\\b", keywordFormat),
+            ("#[^\n]*", commentFormat),
+            ("\".*\"", quotationFormat),
+            ("'.*'", quotationFormat),
+        ]
+
+    def highlightBlock(self, text):
+        for pattern, format in self.highlightingRules:
+            expression = QRegularExpression(pattern)
+            match_iterator = expression.globalMatch(text)
+            while match_iterator.hasNext():
+                match = match_iterator.next()
+                self.setFormat(match.capturedStart(), match.capturedLength(), format)
+
+def generated_source(lines):
+    unit = [
+        "class Worker{n}(object):",
+        '    """',
+        "    Processes queued items for shard {n}.",
+        "",
+        "    Items are retried with backoff; see 'retry' below for the \"policy\".",
+        '    """',
+        "",
+        "    def __init__(self, queue, retries=3):  # queue is shared",
+        "        self.queue = queue",
+        "        self.retries = retries",
+        "        self.name = 'worker-{n}' + \"-\" + str(retries)",
+        "",
+        "    def run(self):",
+        "        for item in self.queue:",
+        "            if item is None or not item.ready:",
+        "                continue",
+        "            try:",
+        "                yield self.handle(item, r'raw\\d+', b'bytes')",
+        "            except Exception as error:",
+        "                print(f\"failed {{item}}: {{error}}\")",
+        "",
+    ]
+    out = []
+    n = 0
+    while len(out) < lines:
+        out.extend(line.format(n=n) for line in unit)
+        n += 1
+    return "\n".join(out[:lines])
+
+def highlight_time(highlighter_class, source):
+    document = QTextDocument()
+    document.setPlainText(source)
+    highlighter = highlighter_class(document)
+    start = time.perf_counter()
+    highlighter.rehighlight()
+    return time.perf_counter() - start
+
+def open_time(source, progressive):
+    # Time for CodeEditor.set_code to return with the visible blocks highlighted
+    editor = CodeEditor()
+    editor.resize(800, 600)
+    editor.show()
+    QApplication.processEvents()
+    if not progressive:
+        editor.PROGRESSIVE_HIGHLIGHT_BLOCKS = source.count("\n") + 1
+    start = time.perf_counter()
+    editor.set_code(source)
+    elapsed = time.perf_counter() - start
+    editor.highlighter.cancel_progressive()
+    editor.close()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[5000, 20000])
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    print(f"{'lines':>7}  {'legacy':>9}  {'current':>9}  {'speedup':>7}  {'open, full':>10}  {'open, progressive':>17}")
+    for lines in args.lines:
+        source = generated_source(lines)
+        legacy = highlight_time(LegacyHighlighter, source)
+        current = highlight_time(PythonHighlighter, source)
+        full = open_time(source, progressive=False)
+        progressive = open_time(source, progressive=True)
+        print(f"{lines:>7}  {legacy:>8.3f}s  {current:>8.3f}s  {legacy / current:>6.1f}x  {full * 1000:>8.1f}ms  {progressive * 1000:>15.1f}ms")
+    app.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: size and token reduction of the HTML-to-text extraction stage.
+
+Runs over every *.html file in --corpus (pages saved with the browser's "save page" or
+curl), or over a generated corpus of documentation-style pages with the usual script,
+style and inline SVG payloads when no corpus is given. Run from the repo root:
+
+    python -m benchmarks.bench_html_extraction [--corpus DIR]
+"""
+import argparse
+import glob
+import os
+import time
+
+from utils.html_extraction import extract_page
+
+def token_counter():
+    try:
+        from utils.token_budget import get_encoding
+        encoding = get_encoding("gpt-4-0125-preview")
+        return lambda text: len(encoding.encode(text)), "tiktoken"
+    except Exception:
+        return lambda text: len(text) // 4 + 1, "estimate (4 chars/token)"
+
+def generated_corpus(pages=20):
+    script = "<script>" + "window.dataLayer=window.dataLayer||[];function gtag(){dataLayer.push(arguments)}" * 40 + "</script>"
+    style = "<style>" + ".nav-item>a{color:#333;padding:4px 8px;border-radius:3px}" * 60 + "</style>"
+    svg = "<svg viewBox='0 0 24 24'>" + "<path d='M12 2L2 7l10 5 10-5-10-5zm0 13l-10-5v6l10 5 10-5v-6z'/>" * 30 + "</svg>"
+    nav = "<nav><ul>" + "".join(f"<li class='nav-item'><a href='/docs/section-{i}'>Section {i}</a></li>" for i in range(40)) + "</ul></nav>"
+    for page in range(pages):
+        body = "".join(
+            f"<h2 id='s{i}'>Topic {page}.{i}</h2><div class='content'><p>The <code>configure()</code> call accepts a mapping of "
+            f"options and returns a <a href='/api/{i}'>handle</a> that can be reused across requests.</p>"
+            f"<pre><code>handle = configure({{'retries': {i}}})\nhandle.run()</code></pre></div>"
+            for i in range(12)
+        )
+        yield f"page-{page}.html", f"<!DOCTYPE html><html><head><title>Docs page {page}</title>{style}{script}</head><body>{nav}{svg}<main>{body}</main>{svg}{script}</body></html>"
+
+def saved_corpus(directory):
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield os.path.basename(path), f.read()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="directory of saved .html pages")
+    args = parser.parse_args()
+
+    count_tokens, counter_name = token_counter()
+    pages = list(saved_corpus(args.corpus) if args.corpus else generated_corpus())
+    totals = [0, 0, 0, 0, 0.0]
+    print(f"token counter: {counter_name}")
+    for name, html in pages:
+        start = time.perf_counter()
+        page = extract_page(html, count_tokens=count_tokens)
+        elapsed = time.perf_counter() - start
+        html_tokens = count_tokens(html)
+        totals[0] += len(html)
+        totals[1] += len(page.text)
+        totals[2] += html_tokens
+        totals[3] += page.token_count
+        totals[4] += elapsed
+        print(f"{name:<28} {len(html):>9} -> {len(page.text):>8} chars  {html_tokens:>8} -> {page.token_count:>7} tokens  {elapsed * 1000:7.2f} ms")
+    if pages:
+        print(
+            f"{'total':<28} {totals[0]:>9} -> {totals[1]:>8} chars  {totals[2]:>8} -> {totals[3]:>7} tokens  {totals[4] * 1000:7.2f} ms"
+            f"  ({totals[0] / max(1, totals[1]):.1f}x smaller, {totals[2] / max(1, totals[3]):.1f}x fewer tokens)"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: pages per second of the headless fetcher against a local stand-in server.
+
+Starts a threaded HTTP/1.1 server on localhost that serves generated documentation
+pages (gzip-compressed when the client asks for it, with a configurable per-request
+latency), then fetches the same URLs with a fresh urllib connection per page, with
+the pooled fetcher one page at a time, and with the pooled fetcher concurrently.
+Run from the repo root:
+
+    python -m benchmarks.bench_http_fetch [--pages 200] [--latency-ms 20]
+"""
+import argparse
+import gzip
+import http.server
+import threading
+import time
+import urllib.request
+
+from utils.http_fetcher import HttpFetcher
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment like a production server; unbuffered writes
+    # stall keep-alive connections on Nagle's algorithm and delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    latency = 0.0
+    pages = {}
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = self.pages.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(pages, latency):
+    StandInHandler.latency = latency
+    StandInHandler.pages = {f"/page/{i}": page.encode("utf-8") for i, page in enumerate(pages)}
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def generated_pages(count):
+    for page in range(count):
+        body = "".join(
+            f"<h2>Topic {page}.{i}</h2><p>The <code>configure()</code> call accepts a mapping of options "
+            f"and returns a <a href='/api/{i}'>handle</a> that can be reused across requests.</p>"
+            for i in range(40)
+        )
+        yield f"<!DOCTYPE html><html><head><title>Docs page {page}</title></head><body><main>{body}</main></body></html>"
+
+def timed(label, pages, run):
+    start = time.perf_counter()
+    fetched = run()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {fetched:>5} pages  {elapsed:7.3f}s  {fetched / elapsed:8.1f} pages/s")
+    return fetched / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server = start_server(list(generated_pages(args.pages)), args.latency_ms / 1000.0)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/page/{i}" for i in range(args.pages)]
+    print(f"stand-in server at {base}, {args.latency_ms:.0f} ms latency per request")
+
+    def urllib_sequential():
+        for url in urls:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                response.read()
+        return len(urls)
+
+    fetcher = HttpFetcher(max_workers=args.workers, connections_per_host=args.workers)
+
+    def pooled_sequential():
+        return sum(1 for url in urls if fetcher.fetch(url).status == 200)
+
+    def pooled_concurrent():
+        return sum(1 for result in fetcher.fetch_many(urls) if result.status == 200)
+
+    baseline = timed("urllib, new connection", args.pages, urllib_sequential)
+    timed("fetcher, sequential", args.pages, pooled_sequential)
+    concurrent = timed(f"fetcher, {args.workers} concurrent", args.pages, pooled_concurrent)
+    print(f"speedup over urllib: {concurrent / baseline:.1f}x")
+    fetcher.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
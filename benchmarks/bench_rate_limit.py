@@ -0,0 +1,174 @@
+"""
+Benchmark: OpenAIAPI under a rate-limited endpoint, with and without RequestScheduler retries.
+
+Starts a local stand-in for the chat completions endpoint that admits --server-limit
+requests per --window seconds, answers the rest with 429 and a Retry-After header, and
+fails a fraction of the admitted ones with 503. Several threads then make completions
+through OpenAIAPI pointed at it, first with a scheduler that never retries, then with
+the retrying scheduler, then with retries plus a requests-per-minute limit matching
+the server's. Run from the repo root:
+
+    python -m benchmarks.bench_rate_limit [--requests 60] [--threads 8]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+
+from utils.openai_api import OpenAIAPI
+from utils.request_scheduler import RequestScheduler
+
+class StubCompletionServer(ThreadingHTTPServer):
+    """
+    Chat completions stand-in that allows limit requests per window seconds.
+
+    Requests over the limit get 429 with Retry-After set to the time left in the window;
+    a further error_rate of requests fail with 503. Counts and the peak number of
+    requests in flight are kept for the report.
+    """
+    daemon_threads = True
+
+    def __init__(self, limit, window=1.0, error_rate=0.0, latency=0.02):
+        super().__init__(("127.0.0.1", 0), StubCompletionHandler)
+        self.limit = limit
+        self.window = window
+        self.error_rate = error_rate
+        self.latency = latency
+        self.random = random.Random(7)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.counts = {200: 0, 429: 0, 503: 0}
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def admit(self):
+        # Returns (status, retry_after)
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.window_count = 0
+            if self.window_count >= self.limit:
+                self.counts[429] += 1
+                return 429, self.window - (now - self.window_start)
+            if self.random.random() < self.error_rate:
+                self.counts[503] += 1
+                return 503, None
+            self.window_count += 1
+            self.counts[200] += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return 200, None
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+class StubCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        status, retry_after = self.server.admit()
+        if status != 200:
+            body = json.dumps({"error": {"message": "Rate limit reached" if status == 429 else "Service unavailable", "type": "requests", "code": None}}).encode()
+            self.send_response(status)
+            if retry_after is not None:
+                self.send_header("Retry-After", f"{retry_after:.3f}")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        try:
+            time.sleep(self.server.latency)
+            content = f"Acknowledged: {request['messages'][-1]['content'][:40]}"
+            usage = {"prompt_tokens": 50, "completion_tokens": 10, "total_tokens": 60}
+            if request.get("stream"):
+                self.send_stream(request, content, usage)
+            else:
+                body = json.dumps({
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": request.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": usage,
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        finally:
+            self.server.release()
+
+    def send_stream(self, request, content, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": request.get("model")}
+        for start in range(0, len(content), 8):
+            chunk = dict(base, choices=[{"index": 0, "delta": {"content": content[start:start + 8]}, "finish_reason": None}])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(f"data: {json.dumps(dict(base, choices=[], usage=usage))}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+def run(server, scheduler, requests, threads, stream):
+    api = OpenAIAPI(api_key="stub", cache_path=None, base_url=server.base_url, scheduler=scheduler)
+
+    def call(i):
+        prompt = f"Request {i}: summarize the release notes"
+        try:
+            if stream:
+                "".join(api.stream_api_calls("You are terse.", "", prompt))
+            else:
+                api.api_calls("You are terse.", "", prompt)
+            return True
+        except RuntimeError:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        outcomes = list(pool.map(call, range(requests)))
+    return sum(outcomes), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--server-limit", type=int, default=10, help="Requests the stub admits per window")
+    parser.add_argument("--window", type=float, default=1.0, help="Stub rate-limit window in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Fraction of admitted requests failed with 503")
+    parser.add_argument("--stream", action="store_true", help="Use streaming completions")
+    args = parser.parse_args()
+
+    configurations = [
+        ("no retries", RequestScheduler(max_concurrency=args.threads, max_retries=0)),
+        ("retries", RequestScheduler(max_concurrency=4, max_retries=8, base_delay=0.25, max_delay=5.0)),
+        ("retries + rpm limit", RequestScheduler(requests_per_minute=args.server_limit * 60 / args.window, burst_seconds=args.window, max_concurrency=4, max_retries=8, base_delay=0.25, max_delay=5.0)),
+    ]
+    print(f"{'scheduler':<22} {'ok':>5} {'failed':>6} {'200s':>5} {'429s':>5} {'503s':>5} {'peak in flight':>14} {'elapsed':>8}")
+    for name, scheduler in configurations:
+        server = StubCompletionServer(args.server_limit, args.window, args.error_rate)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            ok, elapsed = run(server, scheduler, args.requests, args.threads, args.stream)
+        finally:
+            server.shutdown()
+            server.server_close()
+        print(f"{name:<22} {ok:>5} {args.requests - ok:>6} {server.counts[200]:>5} {server.counts[429]:>5} {server.counts[503]:>5} {server.peak_in_flight:>14} {elapsed:>7.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark: jobs through AgentRuntime with one session and with several.
+
+Every session's completions go to one FakeCompletionBackend with --latency seconds per
+request, standing in for the model; nothing in the run imports Qt. The responses add a
+task and write code, so each job also exercises the headless task list and editor.
+Run from the repo root:
+
+    python -m benchmarks.bench_runtime [--jobs 48] [--sessions 1 8] [--latency 0.2]
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_llm import FakeCompletionBackend
+from runtime.agent_runtime import AgentRuntime
+from utils.openai_api import OpenAIAPI
+from utils.request_scheduler import RequestScheduler
+
+def respond(messages):
+    return "Adding it to the plan.\nadd task: review the change\nwrite code:\n```\nprint('done')\n```"
+
+def run(jobs, sessions, latency):
+    backend = FakeCompletionBackend(respond=respond, latency=latency)
+    scheduler = RequestScheduler(max_concurrency=sessions)
+
+    def api_factory(session_id):
+        return backend.install(OpenAIAPI(cache_path=None, scheduler=scheduler))
+
+    with tempfile.TemporaryDirectory() as directory:
+        runtime = AgentRuntime(directory, max_sessions=sessions, api_factory=api_factory)
+        start = time.perf_counter()
+        try:
+            results = list(runtime.run_batch((i, f"Plan step {i} of the migration") for i in range(jobs)))
+        finally:
+            runtime.close()
+        elapsed = time.perf_counter() - start
+    failed = sum(1 for result in results if result.error)
+    return elapsed, failed, backend.request_count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=48)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per completion")
+    args = parser.parse_args()
+
+    print(f"{'sessions':>8} {'jobs':>5} {'failed':>6} {'completions':>11} {'elapsed':>8} {'jobs/s':>7}")
+    for sessions in args.sessions:
+        elapsed, failed, completions = run(args.jobs, sessions, args.latency)
+        print(f"{sessions:>8} {args.jobs:>5} {failed:>6} {completions:>11} {elapsed:>7.2f}s {args.jobs / elapsed:>7.1f}")
+    print(f"Qt imported: {'PyQt5' in sys.modules}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Fake completion backend that stands in for the OpenAI client in benchmarks.
+
+FakeCompletionBackend exposes the one call OpenAIAPI makes,
+chat.completions.create(model, messages, temperature, stream), and answers from a
+pluggable respond(messages) function after an optional simulated latency. Install it on
+an OpenAIAPI with install(api) so every completion path runs without network access:
+
+    api = OpenAIAPI(cache_path=None)
+    backend = FakeCompletionBackend(respond=lambda messages: "add task: write the docs")
+    backend.install(api)
+"""
+from types import SimpleNamespace
+import threading
+import time
+
+def echo_response(messages):
+    # Answers with the last user message, so responses vary with the prompt
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return f"Acknowledged: {message['content'][:200]}"
+    return "Acknowledged."
+
+class FakeCompletionBackend:
+    """
+    Drop-in for the OpenAI client's chat completions.
+
+    latency is the delay before the first token; stream_chunk_chars splits streamed
+    responses into fragments of that many characters, each delivered after
+    chunk_interval seconds. Every request is counted and its messages kept in
+    requests, so a benchmark can check how many round trips a code path made.
+    """
+
+    def __init__(self, respond=echo_response, latency=0.0, stream_chunk_chars=16, chunk_interval=0.0):
+        self.respond = respond
+        self.latency = latency
+        self.stream_chunk_chars = stream_chunk_chars
+        self.chunk_interval = chunk_interval
+        self.requests = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def install(self, api):
+        """
+        Route an OpenAIAPI's completions to this backend.
+        """
+        api._openai = self
+        return api
+
+    def reset(self):
+        with self._lock:
+            self.requests = []
+
+    @property
+    def request_count(self):
+        return len(self.requests)
+
+    def create(self, model, messages, temperature=None, stream=False, stream_options=None, **kwargs):
+        with self._lock:
+            self.requests.append(messages)
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.respond(messages)
+        usage = self.usage(messages, content)
+        if stream:
+            return self._stream(content, usage if (stream_options or {}).get("include_usage") else None)
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")], usage=usage)
+
+    def usage(self, messages, content):
+        # Roughly four characters per token, which is close enough for load figures
+        prompt_tokens = sum(len(message.get("content") or "") for message in messages) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+
+    def _stream(self, content, usage=None):
+        size = max(1, self.stream_chunk_chars)
+        for start in range(0, len(content), size):
+            if self.chunk_interval:
+                time.sleep(self.chunk_interval)
+            delta = SimpleNamespace(content=content[start:start + size])
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)], usage=None)
+        yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=None), finish_reason="stop")], usage=None)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
@@ -0,0 +1,408 @@
+"""
+Benchmark suite: the agent's hot paths, headless and without network access.
+
+Completions go to FakeCompletionBackend and Qt runs on the offscreen platform. Each
+benchmark is repeated and the results are written as JSON under the commit they were
+measured on, so two commits can be compared. Everything runs in a scratch directory,
+so tasks.db and the caches in the working tree are left alone. Run from the repo root:
+
+    python -m benchmarks.suite [--only PATTERN] [--repeat 5] [--quick]
+    python -m benchmarks.suite --compare benchmarks/results/<older commit>.json
+
+Benchmarks that count tokens need tiktoken's encoding files; when they cannot be
+loaded (no network and no cache) those benchmarks are recorded as skipped.
+"""
+import argparse
+from collections import namedtuple
+import contextlib
+import fnmatch
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QTextDocument
+from PyQt5.QtWidgets import QApplication
+
+from agents.openai_agent import OpenAIAgent
+from benchmarks.bench_action_dispatch import make_response
+from benchmarks.bench_highlighter import generated_source
+from benchmarks.fake_llm import FakeCompletionBackend
+from gui.code_editor import CodeEditor, PythonHighlighter
+from gui.task_list import TaskList
+from utils import data_handling
+from utils.action_parser import parse_actions
+from utils.openai_api import OpenAIAPI, gpt4, num_tokens_from_messages
+from utils.token_budget import TokenBudget, get_encoding
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# run is timed on every repeat; setup, when given, runs untimed before each one and
+# teardown once at the end; ops is the number of operations one run performs
+Case = namedtuple("Case", ["run", "ops", "setup", "teardown"], defaults=(1, None, None))
+Benchmark = namedtuple("Benchmark", ["name", "function", "requires", "description"])
+
+BENCHMARKS = []
+
+def benchmark(name, requires=()):
+    def register(function):
+        BENCHMARKS.append(Benchmark(name, function, tuple(requires), (function.__doc__ or "").strip()))
+        return function
+    return register
+
+def check_tiktoken():
+    try:
+        get_encoding(gpt4).encode("probe")
+    except Exception as e:
+        return f"tiktoken encoding unavailable: {str(e).splitlines()[0][:200]}"
+    return None
+
+REQUIREMENTS = {
+    "tiktoken": check_tiktoken,
+}
+
+def conversation(turns, words=120):
+    sentence = "The parser reads the configuration file, validates each field and reports errors with line numbers"
+    messages = [{"role": "system", "content": "You are an AI agent that helps with coding tasks. " * 8}]
+    for turn in range(turns):
+        text = " ".join([sentence] * (words // 16 + 1)) + f" (turn {turn})"
+        messages.append({"role": "user" if turn % 2 == 0 else "assistant", "content": text})
+    return messages
+
+class NullBrowser:
+    """Browser double: navigation is recorded, nothing is rendered."""
+
+    def __init__(self):
+        self.page_cache = None
+        self.url = ""
+
+    def navigate_to(self, url, wait=True):
+        self.url = url
+
+    def get_current_url(self):
+        return self.url
+
+    def get_page_source(self):
+        return ""
+
+class NullCommandResult(QObject):
+    finished = pyqtSignal(object)
+    done = False
+
+class NullTerminal:
+    """Terminal double: commands are recorded, no process is started."""
+
+    def __init__(self):
+        self.commands = []
+
+    def execute_command(self, command, timeout=None, session="default"):
+        self.commands.append(command)
+        return NullCommandResult()
+
+def make_agent(backend=None):
+    api = OpenAIAPI(cache_path=None)
+    (backend or FakeCompletionBackend()).install(api)
+    return OpenAIAgent(NullBrowser(), NullTerminal(), TaskList(), CodeEditor(), api)
+
+def close_agent(agent):
+    agent.memory.close()
+    agent.fetcher.close()
+    agent.page_cache.close()
+    agent.task_list.conn.close()
+
+@benchmark("tokens.num_tokens_from_messages", requires=["tiktoken"])
+def bench_num_tokens(scale):
+    """Count the tokens of a 200-turn conversation with num_tokens_from_messages."""
+    messages = conversation(200 * scale)
+    return Case(lambda: num_tokens_from_messages(messages), ops=len(messages))
+
+@benchmark("tokens.ensure_token_limit.cold", requires=["tiktoken"])
+def bench_token_limit_cold(scale):
+    """Trim an over-budget conversation with an empty token count cache."""
+    api = OpenAIAPI(model="gpt-3.5-turbo-16k", cache_path=None)
+    messages = conversation(400 * scale)
+
+    def setup():
+        api.token_budget = TokenBudget(api.model, 16000)
+    return Case(lambda: api._ensure_token_limit(messages, api.model), ops=len(messages), setup=setup)
+
+@benchmark("tokens.ensure_token_limit.warm", requires=["tiktoken"])
+def bench_token_limit_warm(scale):
+    """Trim the same over-budget conversation again with every count cached."""
+    api = OpenAIAPI(model="gpt-3.5-turbo-16k", cache_path=None)
+    messages = conversation(400 * scale)
+    api._ensure_token_limit(messages, api.model)
+    return Case(lambda: api._ensure_token_limit(messages, api.model), ops=len(messages))
+
+@benchmark("history.get_relevant_history")
+def bench_relevant_history(scale):
+    """Look up relevant entries in a full 2000-entry history for 50 queries."""
+    api = OpenAIAPI(cache_path=None)
+    topics = ["parser", "database", "browser", "terminal", "scheduler", "highlighter", "cache", "tokens"]
+    for i in range(api.history_limit):
+        topic = topics[i % len(topics)]
+        api._add_to_history(f"How do I fix the {topic} error number {i} in module {i % 37}?", "", f"Check the {topic} logs.")
+    queries = [f"the {topics[i % len(topics)]} error in module {i}" for i in range(50 * scale)]
+
+    def run():
+        for query in queries:
+            api._get_relevant_history(query)
+    return Case(run, ops=len(queries))
+
+@benchmark("api.api_calls.fake_backend", requires=["tiktoken"])
+def bench_api_calls(scale):
+    """Make 100 uncached completions end to end against the fake backend."""
+    api = OpenAIAPI(cache_path=None)
+    FakeCompletionBackend().install(api)
+    prompts = [f"Explain step {i} of the deployment checklist" for i in range(100 * scale)]
+
+    def run():
+        for prompt in prompts:
+            api.api_calls("You are a helpful assistant.", "", prompt)
+    return Case(run, ops=len(prompts))
+
+@benchmark("agent.execute_action")
+def bench_execute_action(scale):
+    """Parse and dispatch a 20-paragraph response (run, navigate, add task, write code) 10 times."""
+    agent = make_agent()
+    response = make_response(20)
+    repeats = 10 * scale
+
+    def setup():
+        agent.task_list.model.reset_tasks([])
+
+    def run():
+        for _ in range(repeats):
+            agent.execute_action(response)
+    return Case(run, ops=repeats * len(parse_actions(response)), setup=setup, teardown=lambda: close_agent(agent))
+
+@benchmark("agent.process_input.fake_backend", requires=["tiktoken"])
+def bench_process_input(scale):
+    """Run 20 user turns through process_input, one fake completion each."""
+    agent = make_agent()
+    turns = [f"What is the next step for item {i} of the release plan?" for i in range(20 * scale)]
+
+    def run():
+        for turn in turns:
+            agent.process_input(turn)
+    return Case(run, ops=len(turns), setup=agent.reset, teardown=lambda: close_agent(agent))
+
+@benchmark("data.add_tasks")
+def bench_add_tasks(scale):
+    """Insert 5000 tasks in one transaction with add_tasks."""
+    conn = data_handling.connect_to_database("bench_tasks.db")
+    cursor = data_handling.create_cursor(conn)
+    data_handling.create_tasks_table(cursor)
+    contents = [f"Task {i}: update module {i % 50}" for i in range(5000 * scale)]
+
+    def setup():
+        with conn:
+            conn.execute("DELETE FROM task_dependencies")
+            conn.execute("DELETE FROM tasks")
+    return Case(lambda: data_handling.add_tasks(conn, contents), ops=len(contents), setup=setup, teardown=conn.close)
+
+@benchmark("data.dequeue_and_complete")
+def bench_dequeue(scale):
+    """Drain a 1000-task queue with chained dependencies through dequeue_next and mark_tasks_as_done."""
+    conn = data_handling.connect_to_database("bench_queue.db")
+    cursor = data_handling.create_cursor(conn)
+    data_handling.create_tasks_table(cursor)
+    count = 1000 * scale
+
+    def setup():
+        with conn:
+            conn.execute("DELETE FROM task_dependencies")
+            conn.execute("DELETE FROM tasks")
+        task_ids = data_handling.add_tasks(conn, [f"Step {i}" for i in range(count)])
+        # Every tenth task waits on the one before it
+        data_handling.add_dependencies(conn, [(task_ids[i], task_ids[i - 1]) for i in range(10, count, 10)])
+
+    def run():
+        while True:
+            claimed = data_handling.dequeue_next(conn)
+            if claimed is None:
+                break
+            data_handling.mark_tasks_as_done(conn, cursor, claimed[0])
+    return Case(run, ops=count, setup=setup, teardown=conn.close)
+
+@benchmark("data.get_tasks")
+def bench_get_tasks(scale):
+    """Read 10000 open tasks with get_tasks."""
+    conn = data_handling.connect_to_database("bench_read.db")
+    cursor = data_handling.create_cursor(conn)
+    data_handling.create_tasks_table(cursor)
+    data_handling.add_tasks(conn, [f"Task {i}" for i in range(10000 * scale)])
+    return Case(lambda: data_handling.get_tasks(cursor), ops=10000 * scale, teardown=conn.close)
+
+@benchmark("gui.task_list.reload")
+def bench_task_list_reload(scale):
+    """Reload a TaskList holding 10000 open tasks from the database."""
+    task_list = TaskList()
+    with task_list.conn:
+        # Start from an empty queue; the agent benchmarks share this tasks.db
+        task_list.conn.execute("DELETE FROM task_dependencies")
+        task_list.conn.execute("DELETE FROM tasks")
+    data_handling.add_tasks(task_list.conn, [f"Task {i}" for i in range(10000 * scale)])
+    return Case(task_list.load_tasks_from_database, ops=10000 * scale, teardown=task_list.conn.close)
+
+@benchmark("gui.highlighter.full")
+def bench_highlighter(scale):
+    """Highlight a generated 20000-line Python file in full."""
+    source = generated_source(20000 * scale)
+    document = QTextDocument()
+    document.setPlainText(source)
+    highlighter = PythonHighlighter(document)
+
+    def run():
+        # Referencing document here keeps it, and the highlighter it owns, alive
+        highlighter.rehighlight()
+        return document
+    return Case(run, ops=document.blockCount())
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(dirty)
+
+def measure(case, repeat, warmup):
+    timings = []
+    try:
+        for index in range(warmup + repeat):
+            if case.setup is not None:
+                case.setup()
+            start = time.perf_counter()
+            case.run()
+            elapsed = time.perf_counter() - start
+            if index >= warmup:
+                timings.append(elapsed)
+    finally:
+        if case.teardown is not None:
+            case.teardown()
+    median = statistics.median(timings)
+    return {
+        "repeat": repeat,
+        "ops": case.ops,
+        "min_s": min(timings),
+        "median_s": median,
+        "mean_s": statistics.mean(timings),
+        "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "per_op_us": median / case.ops * 1e6,
+    }
+
+def run_suite(selected, repeat, warmup, scale):
+    results = {}
+    unavailable = {}
+    for bench in selected:
+        reason = None
+        for requirement in bench.requires:
+            if requirement not in unavailable:
+                unavailable[requirement] = REQUIREMENTS[requirement]()
+            reason = reason or unavailable[requirement]
+        if reason:
+            results[bench.name] = {"skipped": reason, "description": bench.description}
+            print(f"{bench.name:<36} skipped: {reason}")
+            continue
+        # The code under test prints progress; keep it out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            case = bench.function(scale)
+            result = measure(case, repeat, warmup)
+        result["description"] = bench.description
+        results[bench.name] = result
+        print(f"{bench.name:<36} {result['median_s'] * 1000:10.2f} ms median  {result['per_op_us']:10.2f} us/op  (±{result['stdev_s'] * 1000:.2f} ms)")
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Print the median ratio of each benchmark against a baseline and return the regressions.
+    """
+    regressions = []
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'}:")
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "skipped" in before or "skipped" in result:
+            continue
+        ratio = result["median_s"] / before["median_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  improved"
+        print(f"  {name:<36} {before['median_s'] * 1000:10.2f} ms -> {result['median_s'] * 1000:10.2f} ms  {ratio:6.2f}x{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", action="append", help="Run only benchmarks matching this glob; may be repeated")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--scale", type=int, default=1, help="Multiply every workload size by this factor")
+    parser.add_argument("--quick", action="store_true", help="One warmup and three repeats")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Baseline result file to compare medians against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as a regression")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for bench in BENCHMARKS:
+            print(f"{bench.name:<36} {bench.description}")
+        return 0
+    if args.quick:
+        args.repeat, args.warmup = 3, 1
+
+    selected = [bench for bench in BENCHMARKS if not args.only or any(fnmatch.fnmatch(bench.name, pattern) for pattern in args.only)]
+    commit, dirty = git_revision()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'unversioned'}{'-dirty' if dirty else ''}.json")
+    output = os.path.abspath(output)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    app = QApplication(sys.argv[:1])
+    started = time.time()
+    with tempfile.TemporaryDirectory(prefix="devease-bench-") as scratch:
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        try:
+            results = run_suite(selected, args.repeat, args.warmup, args.scale)
+        finally:
+            os.chdir(cwd)
+    app.quit()
+
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "started_at": started,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "qt_platform": os.environ.get("QT_QPA_PLATFORM"),
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "scale": args.scale,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+    print(f"\nResults written to {output}")
+
+    if baseline is not None and compare(results, baseline, args.threshold):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
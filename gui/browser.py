@@ -1,6 +1,10 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLineEdit
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtCore import QUrl, QEventLoop
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLineEdit, QLabel
+from PyQt5.QtCore import Qt, QUrl, QEventLoop, QTimer
+from utils.html_extraction import extract_page
+import logging
+from agents.tools import BrowserTool
+
+logger = logging.getLogger(__name__)
 
 class Browser(QWidget):
     def __init__(self):
@@ -8,13 +12,32 @@ class Browser(QWidget):
         self.layout = QVBoxLayout(self)
         
         self.address_bar = QLineEdit()
+        self.address_bar.setPlaceholderText("Enter a URL...")
         self.address_bar.returnPressed.connect(self.load_url)
         self.layout.addWidget(self.address_bar)
         
-        self.web_view = QWebEngineView()
-        self.layout.addWidget(self.web_view)
-        
-        self.web_view.load(QUrl("https://www.google.com"))
+        # QtWebEngine starts a Chromium renderer process, so the view is only built on first use
+        self._web_view = None
+        self.placeholder = QLabel("Enter an address to start browsing.")
+        self.placeholder.setAlignment(Qt.AlignCenter)
+        self.layout.addWidget(self.placeholder)
+        self.page_cache = None
+        self.page_source = None
+
+    @property
+    def web_view(self):
+        if self._web_view is None:
+            from PyQt5.QtWebEngineWidgets import QWebEngineView
+            self._web_view = QWebEngineView()
+            self._web_view.loadStarted.connect(self.discard_page_source)
+            self._web_view.urlChanged.connect(self.discard_page_source)
+            self.layout.replaceWidget(self.placeholder, self._web_view)
+            self.placeholder.deleteLater()
+            self.placeholder = None
+        return self._web_view
+
+    def has_web_view(self):
+        return self._web_view is not None
         
     def load_url(self):
         url = QUrl(self.address_bar.text())
@@ -22,36 +45,88 @@ class Browser(QWidget):
             url.setScheme("http")
         self.web_view.load(url)
         
-    def navigate_to(self, url):
+    def navigate_to(self, url, wait=True):
         self.address_bar.setText(url)
         self.load_url()
-        self.wait_for_page_load()
+        if wait:
+            self.wait_for_page_load()
         
     def execute_script(self, script):
         self.web_view.page().runJavaScript(script)
         
     def get_current_url(self):
-        return self.web_view.url().toString()
+        if self._web_view is None:
+            return ""
+        return self._web_view.url().toString()
     
     def get_page_source(self):
-        loop = QEventLoop()
-        self.web_view.page().toHtml(lambda html: (setattr(self, 'page_source', html), loop.quit()))
-        loop.exec_()
+        # The source is kept until the next load, so repeated reads skip the renderer round trip
+        if self._web_view is None:
+            return ""
+        if self.page_source is None:
+            loop = QEventLoop()
+            self.web_view.page().toHtml(lambda html: (setattr(self, 'page_source', html), loop.quit()))
+            loop.exec_()
         return self.page_source
+
+    def discard_page_source(self, *args):
+        self.page_source = None
     
     def search_text(self, text):
         self.web_view.page().findText(text)
         
     def scrape_page(self):
         return self.get_page_source()
+
+    def scrape_text(self, count_tokens=None):
+        """
+        Scrape the current page and reduce it to compact text for the agent.
+
+        Args:
+            count_tokens (callable): Counts tokens in a string, used for the reported token count.
+
+        Returns:
+            ExtractedPage: The URL, title, extracted text, original HTML length and text token count
+            (a CachedPage when the page cache still holds a fresh copy).
+        """
+        url = self.get_current_url()
+        if self.page_cache is not None:
+            cached = self.page_cache.get(url)
+            if cached is not None and self.page_cache.is_fresh(cached):
+                return cached
+        page = extract_page(self.scrape_page(), url, count_tokens)
+        if self.page_cache is not None:
+            self.page_cache.put(url, page)
+        return page
     
     def wait_for_page_load(self, timeout=10000):
+        """
+        Wait until the current page finishes loading or timeout milliseconds pass.
+
+        Returns:
+            bool: True if the page loaded successfully before the timeout.
+        """
         loop = QEventLoop()
-        self.web_view.loadFinished.connect(loop.quit)
+        outcome = {"ok": False}
+        def finished(ok):
+            outcome["ok"] = ok
+            loop.quit()
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(loop.quit)
+        self.web_view.loadFinished.connect(finished)
+        timer.start(timeout)
         loop.exec_()
+        timer.stop()
+        self.web_view.loadFinished.disconnect(finished)
+        if not outcome["ok"]:
+            self.log_message(f"Page did not finish loading within {timeout} ms")
+        return outcome["ok"]
         
     def log_message(self, message):
-        print(f"Browser: {message}")
+        logger.info("Browser: %s", message)
         
     def handle_error(self, error_message):
-        self.log_message(f"Error: {error_message}")
\ No newline at end of file
+        self.log_message(f"Error: {error_message}")
+
+BrowserTool.register(Browser)
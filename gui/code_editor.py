@@ -1,38 +1,171 @@
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPlainTextEdit, QToolBar, QAction, QFileDialog
-from PyQt5.QtGui import QFont, QTextCharFormat, QColor, QSyntaxHighlighter, QTextDocument
+from PyQt5.QtGui import QFont, QTextCharFormat, QColor, QSyntaxHighlighter, QTextDocument, QTextCursor
+from PyQt5.QtCore import QTimer
 import keyword
-from PyQt5.QtCore import QRegularExpression
+import logging
+import os
+import re
+import time
+from gui.file_loader import FileLoader
+from utils.file_io import atomic_write, read_text_chunks
+from agents.tools import CodeEditorTool
+
+logger = logging.getLogger(__name__)
+
+# One pattern for every rule, compiled once. Strings stop at their closing quote (honouring
+# escapes) or at the end of the line, so two strings on a line no longer swallow the code
+# between them.
+TOKEN_PATTERN = re.compile(
+    r"(?P<comment>#.*)"
+    r"|(?P<triple>(?<!\w)[rRbBuUfF]{0,2}(?:'''|\"\"\"))"
+    r"|(?P<string>(?<!\w)[rRbBuUfF]{0,2}(?:\"[^\"\\]*(?:\\.[^\"\\]*)*\"?|'[^'\\]*(?:\\.[^'\\]*)*'?))"
+    r"|(?P<keyword>\b(?:" + "|".join(keyword.kwlist) + r")\b)"
+)
+TRIPLE_END_PATTERNS = {
+    "'''": re.compile(r"(?:[^'\\]|\\.|'(?!''))*'''"),
+    '"""': re.compile(r'(?:[^"\\]|\\.|"(?!""))*"""'),
+}
+ASTRAL_PATTERN = re.compile("[\U00010000-\U0010FFFF]")
+PENDING_STATE = -1
+NORMAL_STATE = 0
+TRIPLE_STATES = {"'''": 1, '"""': 2}
+TRIPLE_DELIMITERS = {state: delimiter for delimiter, state in TRIPLE_STATES.items()}
 
 class PythonHighlighter(QSyntaxHighlighter):
-    def __init__(self, parent=None):
+    """
+    Python syntax highlighter driven by a single precompiled pattern.
+
+    Triple-quoted strings are carried across lines in the block state, so editing a
+    line only re-highlights the blocks whose state actually changes. Large documents
+    can be highlighted progressively: after begin_progressive, blocks past ready_blocks
+    are skipped until highlight_until reaches them, which an idle timer does a chunk
+    at a time while the editor asks for the visible blocks first.
+    """
+
+    CHUNK_SECONDS = 0.01
+
+    def __init__(self, parent=None, chunk_blocks=1000):
         super().__init__(parent)
-        self.highlightingRules = []
+        self.chunk_blocks = chunk_blocks
+        self.ready_blocks = None
+        self.chunk_timer = QTimer(self)
+        self.chunk_timer.setInterval(0)
+        self.chunk_timer.timeout.connect(self.highlight_next_chunk)
 
         keywordFormat = QTextCharFormat()
         keywordFormat.setForeground(QColor("#008000"))
         keywordFormat.setFontWeight(QFont.Bold)
-        self.highlightingRules.append((f"\\b({'|'.join(keyword.kwlist)})\\b", keywordFormat))
 
         singleLineCommentFormat = QTextCharFormat()
         singleLineCommentFormat.setForeground(QColor("#808080"))
-        self.highlightingRules.append(("#[^\n]*", singleLineCommentFormat))
 
         quotationFormat = QTextCharFormat()
         quotationFormat.setForeground(QColor("#800000"))
-        self.highlightingRules.append(("\".*\"", quotationFormat))
-        self.highlightingRules.append(("'.*'", quotationFormat))
+
+        self.formats = {
+            "keyword": keywordFormat,
+            "comment": singleLineCommentFormat,
+            "string": quotationFormat,
+            "triple": quotationFormat,
+        }
+
+    def begin_progressive(self, start_block=0):
+        """
+        Skip highlighting from start_block on until highlight_until or the idle timer reaches each block.
+
+        Call before loading a large document so loading does not wait on highlighting.
+        """
+        self.ready_blocks = start_block
+        self.chunk_timer.start()
+
+    def cancel_progressive(self):
+        self.chunk_timer.stop()
+        self.ready_blocks = None
+
+    def highlight_until(self, block_number):
+        """
+        Highlight every block up to and including block_number that has not been highlighted yet.
+        """
+        if self.ready_blocks is None or block_number < self.ready_blocks:
+            return
+        document = self.document()
+        block = document.findBlockByNumber(self.ready_blocks)
+        self.ready_blocks = min(block_number + 1, document.blockCount())
+        if block.isValid():
+            # Skipped blocks hold PENDING_STATE, so the state change carries the re-highlight
+            # through every newly ready block in one pass
+            self.rehighlightBlock(block)
+        if self.ready_blocks >= document.blockCount():
+            self.ready_blocks = None
+            self.chunk_timer.stop()
+        elif not self.chunk_timer.isActive():
+            self.chunk_timer.start()
+
+    def highlight_next_chunk(self):
+        if self.ready_blocks is None:
+            self.chunk_timer.stop()
+            return
+        start = time.perf_counter()
+        self.highlight_until(self.ready_blocks + self.chunk_blocks - 1)
+        # Size the next chunk so each idle step stays near the frame budget
+        elapsed = max(time.perf_counter() - start, 1e-4)
+        self.chunk_blocks = int(min(max(self.chunk_blocks * self.CHUNK_SECONDS / elapsed, 100), self.chunk_blocks * 2))
 
     def highlightBlock(self, text):
-        for pattern, format in self.highlightingRules:
-            expression = QRegularExpression(pattern)
-            match_iterator = expression.globalMatch(text)
-            while match_iterator.hasNext():
-                match = match_iterator.next()
-                index = match.capturedStart()
-                length = match.capturedLength()
-                self.setFormat(index, length, format)
+        if self.ready_blocks is not None and self.currentBlock().blockNumber() >= self.ready_blocks:
+            self.setCurrentBlockState(PENDING_STATE)
+            return
+
+        # Qt positions count UTF-16 code units, which differ from str indexes only past the BMP
+        units = None
+        if not text.isascii() and ASTRAL_PATTERN.search(text):
+            units = [0]
+            for character in text:
+                units.append(units[-1] + (2 if ord(character) > 0xFFFF else 1))
+
+        position = 0
+        state = self.previousBlockState()
+        if state in TRIPLE_DELIMITERS:
+            end = TRIPLE_END_PATTERNS[TRIPLE_DELIMITERS[state]].match(text)
+            if end is None:
+                self._format(0, len(text), "triple", units)
+                self.setCurrentBlockState(state)
+                return
+            position = end.end()
+            self._format(0, position, "triple", units)
+
+        self.setCurrentBlockState(NORMAL_STATE)
+        search = TOKEN_PATTERN.search
+        match = search(text, position)
+        while match is not None:
+            kind = match.lastgroup
+            start = match.start()
+            if kind == "triple":
+                delimiter = text[match.end() - 3:match.end()]
+                end = TRIPLE_END_PATTERNS[delimiter].match(text, match.end())
+                if end is None:
+                    self._format(start, len(text), "triple", units)
+                    self.setCurrentBlockState(TRIPLE_STATES[delimiter])
+                    return
+                position = end.end()
+            else:
+                position = match.end()
+            self._format(start, position, kind, units)
+            match = search(text, position)
+
+    def _format(self, start, end, kind, units):
+        if units is not None:
+            start, end = units[start], units[end]
+        self.setFormat(start, end - start, self.formats[kind])
 
 class CodeEditor(QWidget):
+    # Documents with more blocks than this are highlighted progressively, visible blocks first
+    PROGRESSIVE_HIGHLIGHT_BLOCKS = 2000
+    # Files at least this large are loaded on a background thread and appended in chunks
+    BACKGROUND_LOAD_BYTES = 1024 * 1024
+    # Each chunk is appended in one GUI-thread step, so this bounds how long the editor stalls
+    LOAD_CHUNK_BYTES = 128 * 1024
+
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout(self)
@@ -46,6 +179,10 @@ class CodeEditor(QWidget):
         self.layout.addWidget(self.editor)
         
         self.highlighter = PythonHighlighter(self.editor.document())
+        self.editor.verticalScrollBar().valueChanged.connect(self.highlight_visible_blocks)
+        self.loader = None
+        self.loading = False
+        self.file_path = None
         
         self.new_action = QAction("New", self)
         self.new_action.triggered.connect(self.new_file)
@@ -60,6 +197,8 @@ class CodeEditor(QWidget):
         self.toolbar.addAction(self.save_action)
         
     def new_file(self):
+        self.cancel_load()
+        self.file_path = None
         self.editor.clear()
         
     def open_file(self):
@@ -67,8 +206,71 @@ class CodeEditor(QWidget):
         file_dialog.setNameFilter("Python Files (*.py)")
         if file_dialog.exec_():
             file_path = file_dialog.selectedFiles()[0]
-            with open(file_path, "r") as file:
-                self.editor.setPlainText(file.read())
+            self.load_file(file_path)
+
+    def load_file(self, file_path):
+        """
+        Open a file in the editor.
+
+        Small files are read directly. Larger ones are read on a background thread and
+        appended in chunks, with the editor read-only until the whole file is in, so
+        the window stays responsive while a multi-megabyte file loads.
+        """
+        self.cancel_load()
+        self.file_path = file_path
+        if os.path.getsize(file_path) < self.BACKGROUND_LOAD_BYTES:
+            self.set_code("".join(read_text_chunks(file_path)))
+            return
+
+        self.editor.clear()
+        self.editor.setReadOnly(True)
+        self.editor.setUndoRedoEnabled(False)
+        self.highlighter.begin_progressive()
+        self.loading = True
+        self.loader = FileLoader(file_path, self.LOAD_CHUNK_BYTES)
+        self.loader.chunk_loaded.connect(self.append_chunk)
+        self.loader.finished.connect(self.on_load_finished)
+        self.loader.failed.connect(self.on_load_failed)
+        self.loader.start()
+
+    def append_chunk(self, chunk):
+        if self.loader is None or self.sender() is not self.loader:
+            # Chunks still queued from a cancelled load
+            return
+        if self.highlighter.ready_blocks is None:
+            # Keep appended text out of the synchronous highlight; the last block is still growing
+            self.highlighter.begin_progressive(self.editor.document().blockCount() - 1)
+        cursor = QTextCursor(self.editor.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(chunk)
+        self.highlight_visible_blocks()
+        self.loader.chunk_consumed()
+
+    def on_load_finished(self, file_path):
+        self.loading = False
+        self.editor.setReadOnly(False)
+        self.editor.setUndoRedoEnabled(True)
+        logger.info("Loaded %s (%d lines)", file_path, self.editor.document().blockCount())
+
+    def on_load_failed(self, error):
+        self.loading = False
+        self.editor.setReadOnly(False)
+        self.editor.setUndoRedoEnabled(True)
+        logger.error("Error loading file: %s", error)
+
+    def is_loading(self):
+        return self.loading
+
+    def cancel_load(self):
+        if self.loader is None:
+            return
+        self.loader.cancel()
+        self.loader.thread.quit()
+        self.loader.thread.wait()
+        self.loader = None
+        self.loading = False
+        self.editor.setReadOnly(False)
+        self.editor.setUndoRedoEnabled(True)
                 
     def save_file(self, file_path=None):
         if not file_path:
@@ -78,12 +280,34 @@ class CodeEditor(QWidget):
                 file_path = file_dialog.selectedFiles()[0]
             else:
                 return
+        if self.is_loading():
+            logger.warning("Cannot save while the file is still loading.")
+            return
         
-        with open(file_path, "w") as file:
-            file.write(self.editor.toPlainText())
+        atomic_write(file_path, self.editor.toPlainText())
+        self.file_path = file_path
                 
     def get_code(self):
         return self.editor.toPlainText()
     
     def set_code(self, code):
-        self.editor.setPlainText(code)
\ No newline at end of file
+        self.cancel_load()
+        if code.count("\n") >= self.PROGRESSIVE_HIGHLIGHT_BLOCKS:
+            self.highlighter.begin_progressive()
+        else:
+            self.highlighter.cancel_progressive()
+        self.editor.setPlainText(code)
+        self.highlight_visible_blocks()
+
+    def highlight_visible_blocks(self, *args):
+        if self.highlighter.ready_blocks is None:
+            return
+        first = self.editor.firstVisibleBlock().blockNumber()
+        line_height = max(1, self.editor.fontMetrics().lineSpacing())
+        self.highlighter.highlight_until(first + self.editor.viewport().height() // line_height + 1)
+
+    def closeEvent(self, event):
+        self.cancel_load()
+        super().closeEvent(event)
+
+CodeEditorTool.register(CodeEditor)
@@ -0,0 +1,69 @@
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal
+from utils.tracing import tracer
+
+class CompletionWorker(QObject):
+    """
+    Runs a streaming OpenAIAPI completion off the GUI thread.
+
+    Tokens are delivered through token_received as they arrive; completed carries the
+    full response and failed carries the error message. Signals are queued back to the
+    GUI thread, so connected slots may touch widgets directly.
+    """
+    token_received = pyqtSignal(str)
+    completed = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, api, request):
+        super().__init__()
+        self.api = api
+        self.request = request
+        # Spans opened on the worker thread belong to the turn that started the completion
+        self.parent_span = tracer.current()
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self.run)
+        self.completed.connect(self.thread.quit)
+        self.failed.connect(self.thread.quit)
+
+    def start(self):
+        self.thread.start()
+
+    def is_running(self):
+        return self.thread.isRunning()
+
+    def run(self):
+        try:
+            with tracer.activate(self.parent_span):
+                response = self.api.api_calls(**self.request, on_token=self.token_received.emit)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.completed.emit(response)
+
+class GuiInvoker(QObject):
+    """
+    Runs callables on the thread that owns the invoker (the GUI thread) and returns their result.
+
+    Worker threads block until the call completes; calls made from the owning thread run directly.
+    """
+    invoke_requested = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.invoke_requested.connect(self._invoke, Qt.BlockingQueuedConnection)
+
+    def __call__(self, function):
+        if QThread.currentThread() == self.thread():
+            return function()
+        outcome = {}
+        self.invoke_requested.emit((function, outcome))
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome.get("result")
+
+    def _invoke(self, payload):
+        function, outcome = payload
+        try:
+            outcome["result"] = function()
+        except Exception as e:
+            outcome["error"] = e
@@ -0,0 +1,54 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+import threading
+from utils.file_io import read_text_chunks
+
+class FileLoader(QObject):
+    """
+    Reads a text file off the GUI thread and delivers it in chunks.
+
+    chunk_loaded carries each decoded chunk, finished carries the path once the whole
+    file has been delivered and failed carries the error message. At most max_pending
+    chunks are in flight: the receiver calls chunk_consumed after handling each one, so
+    a fast disk cannot flood the GUI thread's event queue.
+    """
+    chunk_loaded = pyqtSignal(str)
+    finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, chunk_size=1024 * 1024, max_pending=1):
+        super().__init__()
+        self.path = path
+        self.chunk_size = chunk_size
+        self.pending = threading.Semaphore(max_pending)
+        self.cancelled = False
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self.run)
+        self.finished.connect(self.thread.quit)
+        self.failed.connect(self.thread.quit)
+
+    def start(self):
+        self.thread.start()
+
+    def is_running(self):
+        return self.thread.isRunning()
+
+    def chunk_consumed(self):
+        self.pending.release()
+
+    def cancel(self):
+        self.cancelled = True
+        self.pending.release()
+
+    def run(self):
+        try:
+            for chunk in read_text_chunks(self.path, self.chunk_size):
+                self.pending.acquire()
+                if self.cancelled:
+                    self.thread.quit()
+                    return
+                self.chunk_loaded.emit(chunk)
+        except OSError as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(self.path)
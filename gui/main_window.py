@@ -1,20 +1,43 @@
 from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QLineEdit, QPushButton
 from PyQt5.QtCore import Qt
-from agents.openai_agent import OpenAIAgent
+from PyQt5.QtGui import QTextCursor, QTextCharFormat
+from agents.tools import ToolSet
 from gui.browser import Browser
 from gui.terminal import Terminal
 from gui.task_list import TaskList
 from gui.code_editor import CodeEditor
+from gui.completion_worker import CompletionWorker, GuiInvoker
+from runtime.agent_runtime import AgentRuntime
+from utils.startup_timer import StartupTimer
+from utils.tracing import tracer
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, startup=None):
         super().__init__()
-        self.browser = Browser()
-        self.terminal = Terminal()
-        self.task_list = TaskList()
-        self.code_editor = CodeEditor()
+        startup = startup or StartupTimer()
+        with startup.phase("tool widgets"):
+            self.browser = Browser()
+            self.terminal = Terminal()
+            self.task_list = TaskList()
+            self.code_editor = CodeEditor()
         
-        self.agent = OpenAIAgent(self.browser, self.terminal, self.task_list, self.code_editor)
+        with startup.phase("agent"):
+            # The window is one client of the runtime; its session drives the widgets
+            self.runtime = AgentRuntime()
+            self.session = self.runtime.open_session("gui", ToolSet(self.browser, self.terminal, self.task_list, self.code_editor))
+            self.agent = self.session.agent
+            self.agent.fetch_runner = self.start_fetch
+        self.completion_worker = None
+        self.pending_input = None
+        self.pending_task = None
+        self.turn_span = None
+        self.awaiting_actions = False
+        self.invoker = GuiInvoker()
+        self.task_graph_thread = None
         self.setWindowTitle("AI-Assisted Development Environment")
         
         # Create the central widget and layout
@@ -22,24 +45,16 @@ class MainWindow(QMainWindow):
         main_layout = QHBoxLayout(central_widget)
         self.setCentralWidget(central_widget)
         
-        # Create the browser widget
-        self.browser = Browser()
+        # Add the browser widget
         main_layout.addWidget(self.browser)
         
         # Create the right-side layout
         right_layout = QVBoxLayout()
         main_layout.addLayout(right_layout)
         
-        # Create the code editor widget
-        self.code_editor = CodeEditor()
+        # Add the code editor, terminal and task list widgets
         right_layout.addWidget(self.code_editor)
-        
-        # Create the terminal widget
-        self.terminal = Terminal()
         right_layout.addWidget(self.terminal)
-        
-        # Create the task list widget
-        self.task_list = TaskList()
         right_layout.addWidget(self.task_list)
         
         # Create the input layout
@@ -61,19 +76,145 @@ class MainWindow(QMainWindow):
         self.assistant_output = QTextEdit()
         self.assistant_output.setReadOnly(True)
         right_layout.addWidget(self.assistant_output)
+
+    def warm_up(self):
+        """
+        Load the OpenAI client and tokenizer on a background thread once the window is up.
+        """
+        def run():
+            try:
+                self.agent.api.warm_up()
+            except Exception as e:
+                logger.warning("Warm-up failed, loading on first request instead: %s", e)
+        threading.Thread(target=run, daemon=True).start()
     
     def send_user_input(self):
+        if self.is_busy():
+            self.assistant_output.append("<i>Still working on the previous message...</i>")
+            return
+
         user_input = self.user_input.text()
         self.user_input.clear()
         
-        # Process the user input using the agent
-        self.agent.process_input(user_input)
-        
-        # Generate the agent's response
-        response = self.agent.generate_response()
-        
-        # Display the response in the assistant output widget
-        self.assistant_output.append(f"<b>Assistant:</b> {response}")
-        
-        # Execute the agent's action
-        self.agent.execute_action(response)
\ No newline at end of file
+        # Build the request on the GUI thread and stream the completion from a worker
+        self.pending_input = user_input
+        self.turn_span = tracer.start_span("turn")
+        with tracer.activate(self.turn_span):
+            request = self.agent.prepare_input(user_input)
+            self.start_completion(request, self.on_input_completed)
+
+    def finish_turn(self, error=None):
+        if self.turn_span is not None:
+            self.turn_span.end(error)
+            self.turn_span = None
+            tracer.write_prometheus()
+
+    def is_busy(self):
+        if self.awaiting_actions:
+            return True
+        if self.completion_worker is not None and self.completion_worker.is_running():
+            return True
+        return self.task_graph_thread is not None and self.task_graph_thread.is_alive()
+
+    def start_completion(self, request, on_completed):
+        if self.completion_worker is not None:
+            self.completion_worker.thread.wait()
+        self.assistant_output.append("<b>Assistant:</b> ")
+        self.completion_worker = CompletionWorker(self.agent.api, request)
+        self.completion_worker.token_received.connect(self.append_token)
+        self.completion_worker.completed.connect(on_completed)
+        self.completion_worker.failed.connect(self.on_completion_failed)
+        self.completion_worker.start()
+
+    def append_token(self, token):
+        cursor = self.assistant_output.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(token, QTextCharFormat())
+        self.assistant_output.ensureCursorVisible()
+
+    def on_input_completed(self, response):
+        with tracer.activate(self.turn_span):
+            task_ids = self.agent.complete_input(self.pending_input, response)
+            if task_ids:
+                self.start_task_graph(self.agent.task_graph, task_ids)
+                return
+            self.continue_turn()
+
+    def continue_turn(self):
+        # Another completion only when the last response asked for one; otherwise the turn is done.
+        # A follow-up waits for the commands and fetches the response started, so it sees their results.
+        if self.agent.follow_up is None:
+            self.start_next_step()
+            return
+        self.awaiting_actions = True
+        self.agent.after_actions(self.start_next_step)
+
+    def start_next_step(self):
+        self.awaiting_actions = False
+        if self.turn_span is None:
+            # The window closed while the actions were running
+            return
+        with tracer.activate(self.turn_span):
+            self.pending_task, request = self.agent.next_step()
+            if request is None:
+                self.finish_turn()
+                return
+            self.start_completion(request, self.on_step_completed)
+
+    def on_step_completed(self, response):
+        with tracer.activate(self.turn_span):
+            claimed, self.pending_task = self.pending_task, None
+            self.agent.complete_step(claimed, response)
+            self.continue_turn()
+
+    def start_fetch(self, urls, on_fetched):
+        # Fetches block on the network, so they get their own thread and report back through the invoker
+        parent = tracer.current()
+
+        def run():
+            try:
+                with tracer.activate(parent):
+                    pages = self.agent.download_pages(urls)
+            except Exception as e:
+                logger.warning("Fetching %s failed: %s", ", ".join(urls), e)
+                pages = []
+            self.invoker(lambda: on_fetched(pages))
+        threading.Thread(target=run, daemon=True).start()
+
+    def start_task_graph(self, graph, task_ids):
+        # The scheduler blocks until the graph finishes, so it gets its own thread; widget
+        # and database work is routed back here through the invoker
+        self.assistant_output.append(f"<i>Running {len(graph)} subtasks (critical path {graph.critical_path_length()})...</i>")
+        self.task_graph_thread = threading.Thread(target=self.run_task_graph, args=(graph, task_ids), daemon=True)
+        self.task_graph_thread.start()
+
+    def run_task_graph(self, graph, task_ids):
+        with tracer.activate(self.turn_span):
+            results = self.agent.run_task_graph(graph, task_ids, self.invoker, self.on_task_progress)
+        failed = sum(1 for result in results.values() if isinstance(result, Exception))
+        self.invoker(lambda: self.assistant_output.append(f"<i>Finished {len(results) - failed} of {len(graph)} subtasks.</i>"))
+        self.invoker(self.finish_turn)
+
+    def on_task_progress(self, task_id, content, status, result):
+        if status == "done":
+            self.assistant_output.append(f"<b>Assistant ({content}):</b> {result}")
+        elif status in ("failed", "skipped"):
+            self.assistant_output.append(f"<b>Subtask {status}:</b> {content}")
+
+    def on_completion_failed(self, error_message):
+        self.agent.abort_response(self.pending_task)
+        self.pending_task = None
+        self.assistant_output.append(f"<b>Error:</b> {error_message}")
+        self.finish_turn(error_message)
+
+    def closeEvent(self, event):
+        if self.agent.scheduler is not None:
+            self.agent.scheduler.cancel()
+        if self.completion_worker is not None:
+            self.completion_worker.thread.quit()
+            self.completion_worker.thread.wait()
+        self.terminal.cancel_all()
+        self.runtime.close()
+        self.finish_turn("closed")
+        tracer.close()
+        super().closeEvent(event)
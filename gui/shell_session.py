@@ -0,0 +1,177 @@
+from PyQt5.QtCore import QObject, QProcess, pyqtSignal
+from collections import OrderedDict, deque
+import uuid
+
+class ShellSession(QObject):
+    """
+    A long-lived /bin/sh process that runs queued commands one at a time.
+
+    Each command is followed by sentinel lines on stdout and stderr carrying a unique
+    marker and the exit status, which is how one command's output is told apart from
+    the next. Working directory, environment and activated virtualenvs persist between
+    commands. If the shell dies (exit, timeout, cancellation) the running command
+    finishes with no exit code and the shell is restarted for the next one.
+    """
+    line_received = pyqtSignal(object, str)
+    command_finished = pyqtSignal(object, object)
+
+    def __init__(self, name, shell="/bin/sh", parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.shell = shell
+        self.process = None
+        self.queue = deque()
+        self.current = None
+        self.marker = None
+        self.exit_code = None
+        self.buffers = {"stdout": "", "stderr": ""}
+        self.held_blank = {"stdout": False, "stderr": False}
+        self.sentinel_seen = {"stdout": False, "stderr": False}
+
+    def is_idle(self):
+        return self.current is None and not self.queue
+
+    def start(self):
+        if self.process is not None:
+            return
+        self.process = QProcess(self)
+        self.process.readyReadStandardOutput.connect(lambda: self._read("stdout"))
+        self.process.readyReadStandardError.connect(lambda: self._read("stderr"))
+        self.process.finished.connect(self._on_shell_finished)
+        self.process.start(self.shell, [])
+
+    def run(self, result):
+        result.session = self
+        self.queue.append(result)
+        self._next()
+
+    def cancel(self, result):
+        if result in self.queue:
+            self.queue.remove(result)
+            self.command_finished.emit(result, None)
+        elif result is self.current:
+            self.process.kill()
+
+    def close(self):
+        self.queue.clear()
+        if self.process is not None:
+            self.process.finished.disconnect(self._on_shell_finished)
+            self.process.kill()
+            self.process.waitForFinished(1000)
+            self.process = None
+        if self.current is not None:
+            current, self.current = self.current, None
+            self.command_finished.emit(current, None)
+
+    def _next(self):
+        if self.current is not None or not self.queue:
+            return
+        self.start()
+        self.current = self.queue.popleft()
+        self.current.process = self.process
+        self.marker = f"__DEVEASE_{uuid.uuid4().hex}__"
+        self.exit_code = None
+        self.buffers = {"stdout": "", "stderr": ""}
+        self.held_blank = {"stdout": False, "stderr": False}
+        self.sentinel_seen = {"stdout": False, "stderr": False}
+        # stdin is closed for the command so it cannot swallow the sentinel lines
+        script = (
+            f"{{ {self.current.command}\n}} </dev/null\n"
+            f"__devease_rc=$?\n"
+            f"printf '\\n{self.marker} %d\\n' \"$__devease_rc\"\n"
+            f"printf '\\n{self.marker}\\n' >&2\n"
+        )
+        self.process.write(script.encode())
+
+    def _read(self, channel):
+        data = self.process.readAllStandardOutput() if channel == "stdout" else self.process.readAllStandardError()
+        if self.current is None:
+            return
+        text = bytes(data).decode(errors="replace")
+        lines = (self.buffers[channel] + text).split("\n")
+        self.buffers[channel] = lines.pop()
+        for line in lines:
+            self._handle_line(channel, line)
+        if self.sentinel_seen["stdout"] and self.sentinel_seen["stderr"]:
+            current, self.current = self.current, None
+            self.command_finished.emit(current, self.exit_code)
+            self._next()
+
+    def _handle_line(self, channel, line):
+        if self.sentinel_seen[channel]:
+            return
+        if line.startswith(self.marker):
+            # The blank line held back before the sentinel was added by the printf, not the command
+            self.held_blank[channel] = False
+            self.sentinel_seen[channel] = True
+            if channel == "stdout":
+                self.exit_code = int(line[len(self.marker):].strip() or 0)
+            return
+        if self.held_blank[channel]:
+            self._emit_line(self.current, channel, "")
+            self.held_blank[channel] = False
+        if line == "":
+            self.held_blank[channel] = True
+            return
+        self._emit_line(self.current, channel, line)
+
+    def _emit_line(self, result, channel, line):
+        setattr(result, channel, getattr(result, channel) + line + "\n")
+        self.line_received.emit(result, line)
+
+    def _on_shell_finished(self, exit_code, exit_status):
+        self.process.deleteLater()
+        self.process = None
+        if self.current is not None:
+            current, self.current = self.current, None
+            for channel in ("stdout", "stderr"):
+                if self.buffers[channel] and not self.sentinel_seen[channel]:
+                    self._emit_line(current, channel, self.buffers[channel])
+            self.command_finished.emit(current, exit_code if exit_status == QProcess.NormalExit else None)
+        self._next()
+
+class ShellSessionPool(QObject):
+    """
+    Named ShellSessions that are started on first use and reused afterwards.
+
+    At most max_sessions shells are kept alive; when a new one is needed the least
+    recently used idle session is closed. Output and completion signals of every
+    session are forwarded through the pool.
+    """
+    line_received = pyqtSignal(object, str)
+    command_finished = pyqtSignal(object, object)
+
+    def __init__(self, max_sessions=4, shell="/bin/sh", parent=None):
+        super().__init__(parent)
+        self.max_sessions = max_sessions
+        self.shell = shell
+        self.sessions = OrderedDict()
+
+    def get(self, name):
+        session = self.sessions.get(name)
+        if session is not None:
+            self.sessions.move_to_end(name)
+            return session
+        if len(self.sessions) >= self.max_sessions:
+            for idle_name, idle_session in self.sessions.items():
+                if idle_session.is_idle():
+                    idle_session.close()
+                    del self.sessions[idle_name]
+                    break
+        session = ShellSession(name, self.shell, self)
+        self.sessions[name] = session
+        session.line_received.connect(self.line_received)
+        session.command_finished.connect(self.command_finished)
+        return session
+
+    def prewarm(self, names):
+        for name in names:
+            self.get(name).start()
+
+    def run(self, name, result):
+        self.get(name).run(result)
+
+    def close_all(self):
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
@@ -1,72 +1,195 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QListWidget, QListWidgetItem, QLineEdit, QPushButton
-from utils.data_handling import connect_to_database, create_cursor, create_tasks_table, add_task, get_tasks, mark_tasks_as_done
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QListView, QLineEdit, QPushButton, QAbstractItemView
+from utils.data_handling import connect_to_database, create_cursor, create_tasks_table, add_task, add_tasks, get_tasks, mark_tasks_as_done, dequeue_next, set_task_status, reset_running_tasks, add_dependencies
+import logging
 import sys
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from agents.tools import TaskListTool
+
+logger = logging.getLogger(__name__)
+
+class TaskListModel(QAbstractListModel):
+    """
+    List model over (task_id, content) rows that applies insert and delete deltas.
+
+    Rows are looked up by task id through an id-to-row map, so removing a task does not
+    scan or rebuild the list.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tasks = []
+        self.rows_by_id = {}
+        self.statuses = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tasks)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.tasks):
+            return None
+        task_id, content = self.tasks[index.row()]
+        if role == Qt.DisplayRole:
+            status = self.statuses.get(task_id)
+            return f"[{status}] {content}" if status else content
+        if role == Qt.UserRole:
+            return task_id
+        return None
+
+    def reset_tasks(self, tasks):
+        self.beginResetModel()
+        self.tasks = list(tasks)
+        self.rows_by_id = {task_id: row for row, (task_id, content) in enumerate(self.tasks)}
+        self.statuses = {}
+        self.endResetModel()
+
+    def append_tasks(self, tasks):
+        if not tasks:
+            return
+        first = len(self.tasks)
+        self.beginInsertRows(QModelIndex(), first, first + len(tasks) - 1)
+        for offset, (task_id, content) in enumerate(tasks):
+            self.tasks.append((task_id, content))
+            self.rows_by_id[task_id] = first + offset
+        self.endInsertRows()
+
+    def remove_task_id(self, task_id):
+        row = self.rows_by_id.pop(task_id, None)
+        if row is None:
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.tasks[row]
+        self.statuses.pop(task_id, None)
+        for shifted_row in range(row, len(self.tasks)):
+            self.rows_by_id[self.tasks[shifted_row][0]] = shifted_row
+        self.endRemoveRows()
+        return True
+
+    def set_status(self, task_id, status):
+        row = self.rows_by_id.get(task_id)
+        if row is None:
+            return
+        if status:
+            self.statuses[task_id] = status
+        else:
+            self.statuses.pop(task_id, None)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def find_task_id(self, content):
+        for task_id, task_content in self.tasks:
+            if task_content == content:
+                return task_id
+        return None
+
+    def contents(self):
+        return [content for task_id, content in self.tasks]
 
 class TaskList(QWidget):
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout(self)
-        self.task_list = QListWidget()
+        self.model = TaskListModel(self)
+        self.task_list = QListView()
+        self.task_list.setModel(self.model)
+        self.task_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.layout.addWidget(self.task_list)
         self.task_input = QLineEdit()
         self.task_input.setPlaceholderText("Enter a new task...")
         self.layout.addWidget(self.task_input)
         self.add_button = QPushButton("Add Task")
-        self.add_button.clicked.connect(self.add_task)
+        self.add_button.clicked.connect(lambda: self.add_task())
         self.layout.addWidget(self.add_button)
         self.remove_button = QPushButton("Remove Task")
-        self.remove_button.clicked.connect(self.remove_task)
+        self.remove_button.clicked.connect(self.remove_selected_tasks)
         self.layout.addWidget(self.remove_button)
 
         self.conn = connect_to_database()
         self.cursor = create_cursor(self.conn)
         create_tasks_table(self.cursor)
+        reset_running_tasks(self.conn)
         self.load_tasks_from_database()
 
-    def add_task(self):
-        task = self.task_input.text()
-        if task:
-            item = QListWidgetItem(task)
-            self.task_list.addItem(item)
+    def add_task(self, task=None):
+        if task is None:
+            task = self.task_input.text()
             self.task_input.clear()
-            add_task(self.conn, task)
-            self.load_tasks_from_database()
-            print(f"Added task: {task}")
+        if task:
+            task_id = add_task(self.conn, task)
+            self.model.append_tasks([(task_id, task)])
+            logger.info("Added task: %s", task)
         else:
-            print("No task entered.")
+            logger.info("No task entered.")
+
+    def add_tasks(self, tasks):
+        """
+        Add several tasks in one database transaction and one model update.
+
+        Args:
+            tasks (list): The task contents to add, in order.
+
+        Returns:
+            list: The new task ids, in order.
+        """
+        tasks = [task for task in tasks if task]
+        task_ids = add_tasks(self.conn, tasks)
+        self.model.append_tasks(list(zip(task_ids, tasks)))
+        logger.info("Added %d tasks.", len(tasks))
+        return task_ids
+
+    def add_dependencies(self, dependencies):
+        add_dependencies(self.conn, dependencies)
 
     def remove_task(self, task_text):
         if isinstance(task_text, str):
-            items = self.task_list.findItems(task_text, Qt.MatchExactly)
-            if items:
-                row = self.task_list.row(items[0])
-                task_id = self.task_list.item(row).data(Qt.UserRole)
-                self.task_list.takeItem(row)
-                mark_tasks_as_done(self.conn, self.cursor, task_id)
-                print(f"Removed task: {task_text}")
-                self.load_tasks_from_database()
+            task_id = self.model.find_task_id(task_text)
+            if task_id is not None:
+                self.remove_task_by_id(task_id)
+                logger.info("Removed task: %s", task_text)
             else:
-                print(f"Task '{task_text}' not found in the task list.")
+                logger.warning("Task '%s' not found in the task list.", task_text)
         else:
-            print(f"Invalid task_text type. Expected str, but got {type(task_text)}.")
+            logger.warning("Invalid task_text type. Expected str, but got %s.", type(task_text))
+
+    def remove_task_by_id(self, task_id):
+        if self.model.remove_task_id(task_id):
+            mark_tasks_as_done(self.conn, self.cursor, task_id)
+            return True
+        return False
+
+    def dequeue_next(self):
+        """
+        Claim the next runnable task from the queue.
+
+        Returns:
+            tuple: (task_id, content) of the claimed task, or None if nothing is runnable.
+        """
+        claimed = dequeue_next(self.conn)
+        if claimed is not None:
+            self.model.set_status(claimed[0], 'running')
+        return claimed
+
+    def start_task(self, task_id):
+        set_task_status(self.conn, task_id, 'running')
+        self.model.set_status(task_id, 'running')
+
+    def requeue_task(self, task_id):
+        set_task_status(self.conn, task_id, 'pending')
+        self.model.set_status(task_id, None)
+
+    def remove_selected_tasks(self):
+        task_ids = [index.data(Qt.UserRole) for index in self.task_list.selectionModel().selectedIndexes()]
+        for task_id in task_ids:
+            self.remove_task_by_id(task_id)
 
     def load_tasks_from_database(self):
-        self.task_list.clear()
-        tasks = get_tasks(self.cursor)
-        for task_id, content in tasks:
-            item = QListWidgetItem(content)
-            item.setData(Qt.UserRole, task_id)
-            self.task_list.addItem(item)
-        print(f"Loaded {self.task_list.count()} tasks from the database.")
+        self.model.reset_tasks(get_tasks(self.cursor))
+        logger.info("Loaded %d tasks from the database.", self.model.rowCount())
 
     def get_tasks(self):
-        tasks = []
-        for i in range(self.task_list.count()):
-            tasks.append(self.task_list.item(i).text())
-        print(f"Retrieved tasks from task list: {tasks}")
-        return tasks
+        return self.model.contents()
 
     def closeEvent(self, event):
         self.conn.close()
-        print("TaskList widget closed. Database connection closed.")
\ No newline at end of file
+        logger.info("TaskList widget closed. Database connection closed.")
+
+TaskListTool.register(TaskList)
@@ -1,42 +1,240 @@
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QTextEdit, QLineEdit
-import subprocess
+from PyQt5.QtCore import QObject, QProcess, QTimer, QEventLoop, pyqtSignal
+from PyQt5.QtGui import QTextCursor
+from collections import deque
+from gui.shell_session import ShellSessionPool
+import sys
+from agents.tools import TerminalTool
+
+class CommandResult(QObject):
+    """
+    Handle for a command started by Terminal.execute_command.
+
+    stdout, stderr and exit_code fill in as the command runs; finished is emitted once
+    it exits, times out or is cancelled. exit_code stays None unless the process exits
+    normally.
+    """
+    line_received = pyqtSignal(str)
+    finished = pyqtSignal(object)
+
+    def __init__(self, command, timeout=None):
+        super().__init__()
+        self.command = command
+        self.timeout = timeout
+        self.stdout = ""
+        self.stderr = ""
+        self.exit_code = None
+        self.timed_out = False
+        self.cancelled = False
+        self.error = None
+        self.done = False
+        self.process = None
+        self.session = None
+
+    @property
+    def output(self):
+        return self.stdout + self.stderr
+
+    @property
+    def succeeded(self):
+        return self.exit_code == 0
+
+    def wait(self, timeout=None):
+        """
+        Block until the command finishes while keeping the Qt event loop running.
+
+        Args:
+            timeout (int): Maximum time to wait in milliseconds, or None to wait indefinitely.
+
+        Returns:
+            bool: True if the command finished.
+        """
+        if self.done:
+            return True
+        loop = QEventLoop()
+        self.finished.connect(loop.quit)
+        if timeout is not None:
+            QTimer.singleShot(timeout, loop.quit)
+        loop.exec_()
+        self.finished.disconnect(loop.quit)
+        return self.done
 
 class Terminal(QWidget):
-    def __init__(self):
+    def __init__(self, default_timeout=300000, max_concurrent=4, max_sessions=4):
         super().__init__()
         self.layout = QVBoxLayout(self)
-        
+
         self.output_view = QTextEdit()
         self.output_view.setReadOnly(True)
         self.layout.addWidget(self.output_view)
-        
+
         self.input_field = QLineEdit()
         self.input_field.returnPressed.connect(self.execute_command)
         self.layout.addWidget(self.input_field)
-        
-    def execute_command(self):
-        command = self.input_field.text()
-        self.input_field.clear()
-        
-        try:
-            output = subprocess.check_output(command, shell=True, universal_newlines=True, stderr=subprocess.STDOUT)
-            self.output_view.append(f">>> {command}\n{output}")
-        except subprocess.CalledProcessError as e:
-            self.output_view.append(f">>> {command}\n{e.output}")
-        
+
+        self.default_timeout = default_timeout
+        self.max_concurrent = max_concurrent
+        self.running = []
+        self.pending = deque()
+
+        # Persistent shells need a POSIX sh; elsewhere every command gets its own process
+        self.sessions = ShellSessionPool(max_sessions, parent=self) if sys.platform != "win32" else None
+        if self.sessions is not None:
+            self.sessions.line_received.connect(self._append_line)
+            self.sessions.command_finished.connect(self._finish)
+
+    def execute_command(self, command=None, timeout=None, session="default"):
+        """
+        Start a shell command without blocking the GUI thread.
+
+        Output is streamed into the output view line by line. Commands given a session
+        name run one after another in that session's persistent shell, so cd and
+        environment changes carry over. With session=None the command gets its own
+        process; at most max_concurrent of those run at once and the rest are queued.
+
+        Args:
+            command (str): The command to run. Defaults to the contents of the input field.
+            timeout (int): Timeout in milliseconds. Defaults to default_timeout; 0 disables it.
+                A session whose command times out is restarted.
+            session (str): Name of the shell session to run in, or None for a one-off process.
+
+        Returns:
+            CommandResult: A handle the caller can wait on or read the exit code from.
+        """
+        if command is None:
+            command = self.input_field.text()
+            self.input_field.clear()
+
+        result = CommandResult(command, self.default_timeout if timeout is None else timeout)
+        if session is not None and self.sessions is not None:
+            self.output_view.append(f"[{session}] >>> {command}")
+            self._start_timeout(result)
+            self.sessions.run(session, result)
+        elif len(self.running) < self.max_concurrent:
+            self._start(result)
+        else:
+            self.pending.append(result)
+        return result
+
+    def _start_timeout(self, result):
+        if result.timeout:
+            QTimer.singleShot(result.timeout, lambda: self._on_timeout(result))
+
+    def _start(self, result):
+        self.running.append(result)
+        self.output_view.append(f">>> {result.command}")
+
+        process = QProcess(self)
+        result.process = process
+        buffers = {"stdout": "", "stderr": ""}
+
+        def read(channel):
+            data = process.readAllStandardOutput() if channel == "stdout" else process.readAllStandardError()
+            text = bytes(data).decode(errors="replace")
+            setattr(result, channel, getattr(result, channel) + text)
+            lines = (buffers[channel] + text).split("\n")
+            buffers[channel] = lines.pop()
+            for line in lines:
+                self._append_line(result, line)
+
+        def flush():
+            for channel in ("stdout", "stderr"):
+                read(channel)
+                if buffers[channel]:
+                    self._append_line(result, buffers[channel])
+                    buffers[channel] = ""
+
+        process.readyReadStandardOutput.connect(lambda: read("stdout"))
+        process.readyReadStandardError.connect(lambda: read("stderr"))
+        process.finished.connect(lambda exit_code, exit_status: (flush(), self._finish(result, exit_code if exit_status == QProcess.NormalExit else None)))
+        process.errorOccurred.connect(lambda error: self._on_error(result, error))
+
+        self._start_timeout(result)
+
+        if sys.platform == "win32":
+            process.start("cmd", ["/c", result.command])
+        else:
+            process.start("/bin/sh", ["-c", result.command])
+
+    def _append_line(self, result, line):
+        self.output_view.moveCursor(QTextCursor.End)
+        self.output_view.insertPlainText(f"\n{line}")
+        result.line_received.emit(line)
+
+    def _on_timeout(self, result):
+        if result.done:
+            return
+        if result.session is not None and result.process is None:
+            # Still queued behind another command in its session
+            self._start_timeout(result)
+            return
+        result.timed_out = True
+        self.output_view.append(f"[timed out after {result.timeout} ms] {result.command}")
+        result.process.kill()
+
+    def _on_error(self, result, error):
+        if error == QProcess.FailedToStart:
+            result.error = result.process.errorString()
+            self.output_view.append(f"[failed to start] {result.command}: {result.error}")
+            self._finish(result, None)
+
+    def _finish(self, result, exit_code):
+        if result.done:
+            return
+        result.done = True
+        result.exit_code = exit_code
+        if result in self.running:
+            self.running.remove(result)
+            result.process.deleteLater()
+        result.finished.emit(result)
+        while self.pending and len(self.running) < self.max_concurrent:
+            self._start(self.pending.popleft())
+
+    def cancel_command(self, result):
+        if result.done:
+            return
+        if result.session is not None:
+            result.cancelled = True
+            result.session.cancel(result)
+        elif result in self.pending:
+            self.pending.remove(result)
+            result.cancelled = True
+            result.done = True
+            result.finished.emit(result)
+        elif not result.done:
+            result.cancelled = True
+            result.process.kill()
+
+    def cancel_all(self, wait=1000):
+        # Waits up to wait milliseconds for each killed process, so none outlives its QProcess
+        running = list(self.running)
+        for result in list(self.pending) + running:
+            self.cancel_command(result)
+        for result in running:
+            if not result.done:
+                result.process.waitForFinished(wait)
+        if self.sessions is not None:
+            self.sessions.close_all()
+
     def clear_output(self):
         self.output_view.clear()
-        
+
     def set_font_size(self, size):
         font = self.output_view.font()
         font.setPointSize(size)
         self.output_view.setFont(font)
         self.input_field.setFont(font)
-        
+
     def set_background_color(self, color):
         self.output_view.setStyleSheet(f"background-color: {color};")
         self.input_field.setStyleSheet(f"background-color: {color};")
-        
+
     def set_text_color(self, color):
         self.output_view.setStyleSheet(f"color: {color};")
-        self.input_field.setStyleSheet(f"color: {color};")
\ No newline at end of file
+        self.input_field.setStyleSheet(f"color: {color};")
+
+    def closeEvent(self, event):
+        self.cancel_all()
+        super().closeEvent(event)
+
+TerminalTool.register(Terminal)
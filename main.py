@@ -1,24 +1,52 @@
+import logging
+import os
 import sys
+from PyQt5.QtCore import QCoreApplication, Qt, QTimer
 from PyQt5.QtWidgets import QApplication
 
-from gui.main_window import MainWindow
+from utils.startup_timer import StartupTimer
+from utils import request_scheduler, tracing
 
 
 def main():
-    # Create the Qt application
-    app = QApplication(sys.argv)
-
-
-
+    startup = StartupTimer()
+
+    # DEVEASE_LOG_LEVEL=DEBUG brings back the full prompts, responses and page details
+    logging.basicConfig(level=os.environ.get("DEVEASE_LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Spans go to DEVEASE_TRACE_FILE as JSON lines and metrics to DEVEASE_METRICS_FILE in the
+    # Prometheus text format; with neither set, tracing is off
+    trace_path = os.environ.get("DEVEASE_TRACE_FILE")
+    metrics_path = os.environ.get("DEVEASE_METRICS_FILE")
+    tracing.configure(trace_path, metrics_path, enabled=bool(trace_path or metrics_path))
+    # Every agent's requests share one scheduler; set the limits to the account's quota
+    request_scheduler.configure_default(
+        tokens_per_minute=int(os.environ.get("DEVEASE_TOKENS_PER_MINUTE", 0)) or None,
+        requests_per_minute=int(os.environ.get("DEVEASE_REQUESTS_PER_MINUTE", 0)) or None,
+        max_concurrency=int(os.environ.get("DEVEASE_MAX_CONCURRENT_REQUESTS", 4)),
+    )
+
+    with startup.phase("imports"):
+        from gui.main_window import MainWindow
+
+    with startup.phase("qt application"):
+        # The web engine is imported on first use; this attribute lets it start after the application exists
+        QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+        # Create the Qt application
+        app = QApplication(sys.argv)
 
     # Create the main window and pass the agent instance
-    main_window = MainWindow()
+    with startup.phase("main window"):
+        main_window = MainWindow(startup)
 
     # Show the main window
-    main_window.show()
+    with startup.phase("show"):
+        main_window.show()
+
+    # The first event loop turn paints the window; report then and load the heavy dependencies
+    QTimer.singleShot(0, lambda: (startup.report(), main_window.warm_up()))
 
     # Run the event loop
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
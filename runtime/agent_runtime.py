@@ -0,0 +1,213 @@
+from collections import namedtuple
+from concurrent.futures import Future, as_completed
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from agents.openai_agent import OpenAIAgent
+from runtime.tools import headless_tools
+from utils.http_fetcher import HttpFetcher
+from utils.openai_api import OpenAIAPI, gpt4
+from utils.page_cache import PageCache
+from utils.response_cache import ResponseCache
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# responses holds the turn's responses in order (see OpenAIAgent.process_input); error is
+# the message of the exception that ended the job, or None
+JobResult = namedtuple("JobResult", ["job_id", "session_id", "responses", "elapsed", "error"])
+
+class Session:
+    """
+    One agent with its own conversation, knowledge base, API history and tools.
+
+    Turns on a session run one at a time. Subtasks of a task graph apply their results
+    one at a time through invoke, as the GUI does by routing them to its thread.
+    """
+
+    def __init__(self, session_id, agent, tools, owns_tools=True):
+        self.session_id = session_id
+        self.agent = agent
+        self.tools = tools
+        self.owns_tools = owns_tools
+        self.turn_lock = threading.Lock()
+        self.apply_lock = threading.Lock()
+
+    def invoke(self, function):
+        with self.apply_lock:
+            return function()
+
+    def run(self, user_input):
+        """
+        Run one turn headlessly.
+
+        Returns:
+            list: The responses, as returned by OpenAIAgent.process_input.
+        """
+        with self.turn_lock:
+            return self.agent.process_input(user_input, self.invoke)
+
+    def reset(self):
+        """
+        Forget the conversation, the API history behind relevant-history lookups and any
+        open tasks, so the next job starts from nothing but the knowledge base.
+        """
+        with self.turn_lock:
+            self.agent.action_clear()
+            self.agent.api.clear_history()
+            self.agent.task_graph = None
+            if self.owns_tools:
+                self.tools.task_list.clear()
+
+    def close(self):
+        self.agent.memory.close()
+        if self.agent.journal is not None:
+            self.agent.journal.close()
+        if self.owns_tools:
+            self.tools.task_list.close()
+
+class AgentRuntime:
+    """
+    Runs OpenAIAgent sessions without Qt, many at once, from a job queue.
+
+    Each session has its own agent, API history and tools; headless sessions work in
+    directory/sessions/<session_id>, which holds their task database and is where their
+    commands run and files are saved. The response cache, page cache and fetcher are
+    shared, and so is the request scheduler (the process-wide one unless one is given),
+    so every session draws on the same rate limit.
+
+    Jobs are taken by max_sessions worker threads with a session each. Threads rather
+    than processes, since a turn spends its time waiting on the model, the network and
+    subprocesses, and the rate limiter is shared in memory. The GUI opens its session
+    here as well, with its widgets as the tools.
+    """
+
+    def __init__(self, directory=".", max_sessions=4, model=gpt4, api_key=None, base_url=None, scheduler=None, api_factory=None, reset_between_jobs=True):
+        """
+        Args:
+            directory (str): Where the shared caches and the session directories are kept.
+            max_sessions (int): Number of jobs run in parallel.
+            scheduler (RequestScheduler): Shared by every session; None means the process-wide default.
+            api_factory (callable): Called as api_factory(session_id) to build each session's OpenAIAPI instead of the default.
+            reset_between_jobs (bool): Reset a worker session before each job (see Session.reset), so jobs do not see each other's turns, API history or tasks.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.max_sessions = max_sessions
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url
+        self.scheduler = scheduler
+        self.api_factory = api_factory or self.create_api
+        self.reset_between_jobs = reset_between_jobs
+        self.response_cache = ResponseCache(os.path.join(directory, "response_cache.db"))
+        self.page_cache = PageCache(os.path.join(directory, "page_cache.db"))
+        self.fetcher = HttpFetcher()
+        self.sessions = {}
+        self.jobs = queue.Queue()
+        self.workers = []
+        self.job_ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def create_api(self, session_id):
+        return OpenAIAPI(model=self.model, api_key=self.api_key, base_url=self.base_url, scheduler=self.scheduler, cache=self.response_cache)
+
+    def open_session(self, session_id, tools=None):
+        """
+        Create a session.
+
+        Args:
+            session_id (str): A name unique within the runtime.
+            tools (ToolSet): The tools the agent drives. Defaults to headless tools in the session's directory.
+
+        Returns:
+            Session: The new session.
+        """
+        with self._lock:
+            if session_id in self.sessions:
+                raise ValueError(f"Session {session_id!r} already exists")
+            owns_tools = tools is None
+            if owns_tools:
+                tools = headless_tools(os.path.join(self.directory, "sessions", str(session_id)), self.fetcher)
+            agent = OpenAIAgent(*tools, api=self.api_factory(session_id), fetcher=self.fetcher, page_cache=self.page_cache)
+            session = self.sessions[session_id] = Session(session_id, agent, tools, owns_tools)
+            return session
+
+    def submit(self, user_input, job_id=None):
+        """
+        Queue a turn for the next free worker session.
+
+        Returns:
+            Future: Resolves to a JobResult. Failures are reported in it rather than raised.
+        """
+        self._start_workers()
+        future = Future()
+        self.jobs.put((next(self.job_ids) if job_id is None else job_id, user_input, future))
+        return future
+
+    def run_batch(self, jobs):
+        """
+        Run jobs and yield their JobResults as they finish.
+
+        Args:
+            jobs (iterable): (job_id, user_input) pairs.
+        """
+        futures = [self.submit(user_input, job_id) for job_id, user_input in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self.workers) < self.max_sessions:
+                session = self.open_session(f"worker-{len(self.workers) + 1}")
+                worker = threading.Thread(target=self._work, args=(session,), name=session.session_id, daemon=True)
+                self.workers.append(worker)
+                worker.start()
+
+    def _work(self, session):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            job_id, user_input, future = job
+            if future.set_running_or_notify_cancel():
+                future.set_result(self._run_job(session, job_id, user_input))
+
+    def _run_job(self, session, job_id, user_input):
+        span = tracer.start_span("job", job_id=job_id, session=session.session_id)
+        started = time.perf_counter()
+        responses, error = [], None
+        try:
+            with tracer.activate(span):
+                if self.reset_between_jobs:
+                    session.reset()
+                responses = session.run(user_input)
+        except SystemExit:
+            # An "exit" action ends the job, not the worker
+            logger.info("Job %s ended with an exit action.", job_id)
+        except Exception as e:
+            error = e
+            logger.warning("Job %s failed on %s: %s", job_id, session.session_id, e)
+        span.end(error)
+        tracer.increment("jobs", result="failed" if error else "done")
+        return JobResult(job_id, session.session_id, responses, time.perf_counter() - started, str(error) if error else None)
+
+    def close(self):
+        """
+        Finish the queued jobs, then close every session and the shared caches.
+        """
+        with self._lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            self.jobs.put(None)
+        for worker in workers:
+            worker.join()
+        for session in self.sessions.values():
+            session.close()
+        self.sessions = {}
+        self.fetcher.close()
+        self.page_cache.close()
+        self.response_cache.close()
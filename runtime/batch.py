@@ -0,0 +1,80 @@
+"""
+Run a batch of agent jobs headlessly, several sessions at a time.
+
+Each line of the jobs file is either a JSON object with "input" and optionally "id",
+or plain text used as the input. Results are appended to the output file as JSON
+lines as jobs finish, so a batch stopped part way keeps what it has done. Run from
+the repo root:
+
+    python -m runtime.batch jobs.jsonl --sessions 8 --output results.jsonl
+
+Rate limits, logging and tracing read the same DEVEASE_* environment variables as
+the GUI; the options below override the rate limits.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+from runtime.agent_runtime import AgentRuntime
+from utils import request_scheduler, tracing
+from utils.openai_api import gpt4
+
+logger = logging.getLogger(__name__)
+
+def read_jobs(path):
+    jobs = []
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                job = json.loads(line)
+                jobs.append((job.get("id", number), job["input"]))
+            else:
+                jobs.append((number, line))
+    return jobs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("jobs", help="Jobs file, one job per line")
+    parser.add_argument("--output", default="results.jsonl", help="JSON lines file the results are appended to")
+    parser.add_argument("--sessions", type=int, default=4, help="Jobs run in parallel, each in its own session")
+    parser.add_argument("--directory", default="runs", help="Directory for the session workspaces and shared caches")
+    parser.add_argument("--model", default=gpt4)
+    parser.add_argument("--tokens-per-minute", type=int, default=int(os.environ.get("DEVEASE_TOKENS_PER_MINUTE", 0)) or None)
+    parser.add_argument("--requests-per-minute", type=int, default=int(os.environ.get("DEVEASE_REQUESTS_PER_MINUTE", 0)) or None)
+    parser.add_argument("--max-concurrent-requests", type=int, default=int(os.environ.get("DEVEASE_MAX_CONCURRENT_REQUESTS", 4)))
+    parser.add_argument("--keep-context", action="store_true", help="Let a session's later jobs see its earlier conversation")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get("DEVEASE_LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(threadName)s %(name)s: %(message)s")
+    trace_path = os.environ.get("DEVEASE_TRACE_FILE")
+    metrics_path = os.environ.get("DEVEASE_METRICS_FILE")
+    tracing.configure(trace_path, metrics_path, enabled=bool(trace_path or metrics_path))
+    request_scheduler.configure_default(
+        tokens_per_minute=args.tokens_per_minute,
+        requests_per_minute=args.requests_per_minute,
+        max_concurrency=args.max_concurrent_requests,
+    )
+
+    jobs = read_jobs(args.jobs)
+    runtime = AgentRuntime(args.directory, max_sessions=args.sessions, model=args.model, reset_between_jobs=not args.keep_context)
+    start = time.perf_counter()
+    failed = 0
+    try:
+        with open(args.output, "a", encoding="utf-8", buffering=1) as output:
+            for done, result in enumerate(runtime.run_batch(jobs), 1):
+                failed += result.error is not None
+                output.write(json.dumps(result._asdict(), default=str) + "\n")
+                logger.info("Job %s finished on %s in %.1fs%s (%d of %d)", result.job_id, result.session_id, result.elapsed, f" with error: {result.error}" if result.error else "", done, len(jobs))
+    finally:
+        runtime.close()
+        tracing.tracer.close()
+    logger.info("Ran %d jobs in %.1fs, %d failed.", len(jobs), time.perf_counter() - start, failed)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,242 @@
+import logging
+import os
+import subprocess
+import threading
+from agents.tools import BrowserTool, CodeEditorTool, CompletionSignal, TaskListTool, TerminalTool, ToolSet
+from utils.data_handling import connect_to_database, create_cursor, create_tasks_table, add_task, add_tasks, get_tasks, mark_tasks_as_done, dequeue_next, set_task_status, reset_running_tasks, add_dependencies, cancel_open_tasks
+from utils.file_io import atomic_write
+from utils.html_extraction import extract_page
+
+logger = logging.getLogger(__name__)
+
+class HeadlessCommandResult:
+    """
+    Result of a command run by HeadlessTerminal, with the same fields as the GUI's CommandResult.
+    """
+
+    def __init__(self, command, timeout=None):
+        self.command = command
+        self.timeout = timeout
+        self.stdout = ""
+        self.stderr = ""
+        self.exit_code = None
+        self.timed_out = False
+        self.cancelled = False
+        self.error = None
+        self.done = False
+        self.finished = CompletionSignal()
+
+    @property
+    def output(self):
+        return self.stdout + self.stderr
+
+    @property
+    def succeeded(self):
+        return self.exit_code == 0
+
+    def wait(self, timeout=None):
+        return self.done
+
+class HeadlessTerminal(TerminalTool):
+    """
+    Runs commands with subprocess in a working directory, blocking until they finish.
+
+    Results come back already finished, so their output is in the conversation before
+    the agent's next step. Commands in the same named session run one at a time, but
+    unlike the GUI's persistent shells, cd and environment changes do not carry over
+    from one command to the next.
+    """
+
+    def __init__(self, cwd=None, default_timeout=300000):
+        self.cwd = cwd
+        self.default_timeout = default_timeout
+        self.session_locks = {}
+        self._lock = threading.Lock()
+
+    def _session_lock(self, session):
+        if session is None:
+            return None
+        with self._lock:
+            return self.session_locks.setdefault(session, threading.Lock())
+
+    def execute_command(self, command, timeout=None, session="default"):
+        result = HeadlessCommandResult(command, self.default_timeout if timeout is None else timeout)
+        lock = self._session_lock(session)
+        if lock is not None:
+            with lock:
+                self._run(result)
+        else:
+            self._run(result)
+        result.finished.emit(result)
+        return result
+
+    def _run(self, result):
+        try:
+            completed = subprocess.run(result.command, shell=True, cwd=self.cwd, capture_output=True, text=True, errors="replace", timeout=result.timeout / 1000.0 if result.timeout else None)
+            result.stdout, result.stderr, result.exit_code = completed.stdout, completed.stderr, completed.returncode
+        except subprocess.TimeoutExpired as e:
+            result.timed_out = True
+            result.stdout = _text(e.stdout)
+            result.stderr = _text(e.stderr)
+        except OSError as e:
+            result.error = str(e)
+            result.stderr = str(e)
+        result.done = True
+        logger.debug("Command '%s' finished with exit code %s", result.command, result.exit_code)
+
+def _text(output):
+    # TimeoutExpired carries bytes even when the run was in text mode
+    if isinstance(output, bytes):
+        return output.decode("utf-8", errors="replace")
+    return output or ""
+
+class HeadlessBrowser(BrowserTool):
+    """
+    Browser without a view: the page is fetched with an HttpFetcher the first time its
+    HTML is needed, so navigating to a page the agent has already fetched into the
+    page cache costs no request. Pages that need scripts to render come back as the
+    server sent them.
+    """
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+        self.page_cache = None
+        self.url = ""
+        self.page_source = ""
+
+    def navigate_to(self, url, wait=True):
+        # The page is loaded when first needed, so there is never anything to wait for
+        self.url = url
+        self.page_source = None
+
+    def get_current_url(self):
+        return self.url
+
+    def get_page_source(self):
+        if self.page_source is None:
+            result = self.fetcher.fetch(self.url)
+            if result.error or result.status >= 400:
+                logger.warning("Failed to load %s: %s", result.url, result.error or result.status)
+            self.url = result.url
+            self.page_source = result.text
+        return self.page_source
+
+    def scrape_text(self, count_tokens=None):
+        if self.page_cache is not None:
+            cached = self.page_cache.get(self.url)
+            if cached is not None and self.page_cache.is_fresh(cached):
+                return cached
+        page = extract_page(self.get_page_source(), self.url, count_tokens)
+        if self.page_cache is not None:
+            self.page_cache.put(self.url, page)
+        return page
+
+class HeadlessTaskList(TaskListTool):
+    """
+    Task list backed by its own tasks database, without a view.
+
+    The open tasks are mirrored in memory in queue order. The connection is shared
+    between threads (subtasks of a task graph are applied from scheduler threads), so
+    every call holds a lock.
+    """
+
+    def __init__(self, path="tasks.db"):
+        self.conn = connect_to_database(path, check_same_thread=False)
+        self.cursor = create_cursor(self.conn)
+        self._lock = threading.RLock()
+        create_tasks_table(self.cursor)
+        reset_running_tasks(self.conn)
+        self.tasks = dict(get_tasks(self.cursor))
+
+    def add_task(self, task):
+        if not task:
+            return None
+        with self._lock:
+            task_id = add_task(self.conn, task)
+            self.tasks[task_id] = task
+        return task_id
+
+    def add_tasks(self, tasks):
+        tasks = [task for task in tasks if task]
+        with self._lock:
+            task_ids = add_tasks(self.conn, tasks)
+            self.tasks.update(zip(task_ids, tasks))
+        return task_ids
+
+    def add_dependencies(self, dependencies):
+        with self._lock:
+            add_dependencies(self.conn, dependencies)
+
+    def remove_task(self, task_text):
+        with self._lock:
+            for task_id, content in self.tasks.items():
+                if content == task_text:
+                    return self.remove_task_by_id(task_id)
+        logger.warning("Task '%s' not found in the task list.", task_text)
+        return False
+
+    def remove_task_by_id(self, task_id):
+        with self._lock:
+            if self.tasks.pop(task_id, None) is None:
+                return False
+            mark_tasks_as_done(self.conn, self.cursor, task_id)
+        return True
+
+    def dequeue_next(self):
+        with self._lock:
+            return dequeue_next(self.conn)
+
+    def start_task(self, task_id):
+        with self._lock:
+            set_task_status(self.conn, task_id, 'running')
+
+    def requeue_task(self, task_id):
+        with self._lock:
+            set_task_status(self.conn, task_id, 'pending')
+
+    def get_tasks(self):
+        with self._lock:
+            return list(self.tasks.values())
+
+    def clear(self):
+        # Open tasks are marked cancelled rather than deleted, so the database keeps a record of them
+        with self._lock:
+            cancel_open_tasks(self.conn)
+            self.tasks = {}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+class HeadlessCodeEditor(CodeEditorTool):
+    """
+    Code buffer without an editor. Relative file paths resolve against directory.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.code = ""
+
+    def _path(self, file_path):
+        return os.path.join(self.directory, file_path) if self.directory else file_path
+
+    def get_code(self):
+        return self.code
+
+    def set_code(self, code):
+        self.code = code
+
+    def load_file(self, file_path):
+        with open(self._path(file_path), encoding="utf-8", errors="replace") as file:
+            self.code = file.read()
+
+    def save_file(self, file_path):
+        atomic_write(self._path(file_path), self.code)
+
+def headless_tools(directory, fetcher):
+    """
+    Build a ToolSet for an agent working in directory: commands run there, files resolve
+    there and the task database is kept there.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return ToolSet(HeadlessBrowser(fetcher), HeadlessTerminal(directory), HeadlessTaskList(os.path.join(directory, "tasks.db")), HeadlessCodeEditor(directory))
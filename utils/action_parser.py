@@ -0,0 +1,119 @@
+from collections import namedtuple
+import re
+
+Action = namedtuple("Action", ["kind", "argument", "position"])
+
+URL_PATTERN = re.compile(r'https?://[^\s<>"\'`)\]]+')
+URL_TRAILING_PUNCTUATION = ".,;:!?"
+
+# Patterns are compiled once and only tried on lines that pass a cheap substring check.
+# Argument-carrying verbs need a colon and may appear anywhere in a line; bare verbs such as
+# "exit" must be the whole line, so prose like "exit code" or "to be clear" is not an action.
+VERB_PATTERN = re.compile(r'\b(run command|add task|write code|search)\s*:[ \t]*(.*)', re.IGNORECASE)
+NAVIGATE_PATTERN = re.compile(r'\b(?:open website|navigate(?: to)?|visit)\b.*?(https?://[^\s<>"\'`)\]]+)', re.IGNORECASE)
+BARE_LINE_PATTERN = re.compile(r'^(?:[-*]|\d+[.)])?\s*(.+?)\s*[.!:]?$')
+VERB_KINDS = {
+    "run command": "run_command",
+    "add task": "add_task",
+    "write code": "write_code",
+    "search": "search",
+}
+BARE_KINDS = {
+    "clear": "clear",
+    "exit": "exit",
+    "scrape": "scrape",
+    "check browser": "check_browser",
+    "continue": "continue",
+    "next task": "next_task",
+}
+# Follow-up requests only count as the last non-empty line of a response, where the model is told to put them
+FINAL_KINDS = {"continue", "next_task"}
+FENCE = "```"
+
+def _clean_url(url):
+    return url.rstrip(URL_TRAILING_PUNCTUATION)
+
+def parse_actions(text):
+    """
+    Parse every action in a model response in one pass over its lines.
+
+    A "write code:" directive followed by a fenced block takes the whole block as its
+    argument. Lines inside other fenced blocks are not parsed, so shell snippets in a
+    response are never mistaken for actions. "continue" and "next task" are only
+    actions on the response's last non-empty line.
+
+    Args:
+        text (str): The model response.
+
+    Returns:
+        list: Action tuples (kind, argument, position) in the order they appear.
+    """
+    actions = []
+    position = 0
+    code_start = None
+    code_lines = None
+    in_fence = False
+    awaiting_code = None
+    last_line_start = None
+
+    for line in text.split("\n"):
+        line_start = position
+        position += len(line) + 1
+        stripped = line.strip()
+        if stripped:
+            last_line_start = line_start
+
+        if code_lines is not None:
+            if stripped.startswith(FENCE):
+                actions.append(Action("write_code", "\n".join(code_lines) + "\n", code_start))
+                code_lines = None
+            else:
+                code_lines.append(line)
+            continue
+        if stripped.startswith(FENCE):
+            if awaiting_code is not None:
+                code_start, code_lines, awaiting_code = awaiting_code, [], None
+            else:
+                in_fence = not in_fence
+            continue
+        if in_fence or not stripped:
+            continue
+        awaiting_code = None
+
+        lowered = stripped.lower()
+        if ":" in stripped:
+            match = VERB_PATTERN.search(line)
+            if match:
+                kind = VERB_KINDS[match.group(1).lower()]
+                argument = match.group(2).strip()
+                if kind == "write_code" and (not argument or argument.startswith(FENCE)):
+                    if argument.startswith(FENCE):
+                        code_start, code_lines = line_start + match.start(), []
+                    else:
+                        awaiting_code = line_start + match.start()
+                elif argument:
+                    actions.append(Action(kind, argument, line_start + match.start()))
+                continue
+        if "http" in lowered:
+            match = NAVIGATE_PATTERN.search(line)
+            if match:
+                actions.append(Action("navigate", _clean_url(match.group(1)), line_start + match.start()))
+                continue
+        if len(lowered) <= 20:
+            bare = BARE_LINE_PATTERN.match(lowered)
+            if bare and bare.group(1) in BARE_KINDS:
+                actions.append(Action(BARE_KINDS[bare.group(1)], None, line_start))
+
+    if code_lines is not None:
+        actions.append(Action("write_code", "\n".join(code_lines) + "\n", code_start))
+    return [action for action in actions if action.kind not in FINAL_KINDS or action.position == last_line_start]
+
+def find_url(text):
+    match = URL_PATTERN.search(text)
+    return _clean_url(match.group(0)) if match else None
+
+def find_argument(text, kind):
+    for action in parse_actions(text):
+        if action.kind == kind:
+            return action.argument
+    return None
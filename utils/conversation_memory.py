@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class ConversationMemory:
+    """
+    Rolling summary of the conversation turns that have left the recent-history window.
+
+    Turns evicted from the agent's history are queued and folded into the summary in
+    batches on a background thread, so the prompt carries a bounded summary block
+    instead of an ever-growing history and evicting never waits on the model.
+    """
+
+    def __init__(self, summarize, count_tokens=None, recent_turns=50, batch_turns=20, summary_tokens=500, turn_chars=1000):
+        """
+        Args:
+            summarize (callable): Called as summarize(previous_summary, turns, max_tokens) and returns the new summary.
+            count_tokens (callable): Counts tokens in a string. Defaults to a 4-characters-per-token estimate.
+            recent_turns (int): Number of history entries kept verbatim.
+            batch_turns (int): Number of evicted turns that triggers a summary refresh.
+            summary_tokens (int): Token budget for the summary block.
+            turn_chars (int): Evicted turns are clipped to this many characters before summarizing.
+        """
+        self.summarize = summarize
+        self.count_tokens = count_tokens or (lambda text: len(text) // 4 + 1)
+        self.recent_turns = recent_turns
+        self.batch_turns = batch_turns
+        self.summary_tokens = summary_tokens
+        self.turn_chars = turn_chars
+        self.summary = ""
+        self.pending = []
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+        self.refreshing = False
+        self.generation = 0
+
+    def overflow(self, history):
+        return max(0, len(history) - self.recent_turns)
+
+    def evict(self, turns):
+        """
+        Queue turns that have left the recent window for summarization.
+        """
+        with self.lock:
+            self.pending.extend(turn[-self.turn_chars:] for turn in turns)
+            self._schedule()
+
+    def _schedule(self):
+        if not self.refreshing and len(self.pending) >= self.batch_turns:
+            self.refreshing = True
+            self.executor.submit(self._refresh)
+
+    def _refresh(self):
+        with self.lock:
+            turns = list(self.pending)
+            previous = self.summary
+            generation = self.generation
+            if not turns:
+                self.refreshing = False
+                return
+        try:
+            summary = self._clip(self.summarize(previous, turns, self.summary_tokens).strip())
+        except Exception as e:
+            logger.warning("Error refreshing the conversation summary: %s", e)
+            with self.lock:
+                self.refreshing = False
+            return
+        with self.lock:
+            self.refreshing = False
+            if generation != self.generation:
+                return
+            self.summary = summary
+            del self.pending[:len(turns)]
+            self._schedule()
+
+    def _clip(self, text):
+        tokens = self.count_tokens(text)
+        while tokens > self.summary_tokens and text:
+            text = text[:len(text) * self.summary_tokens // tokens]
+            tokens = self.count_tokens(text)
+        return text
+
+    def context(self):
+        """
+        Returns:
+            str: The current summary, or an empty string if nothing has been summarized yet.
+        """
+        with self.lock:
+            return self.summary
+
+    def snapshot(self):
+        with self.lock:
+            return self.summary, list(self.pending)
+
+    def restore(self, summary, pending=()):
+        with self.lock:
+            self.summary = summary or ""
+            self.pending = list(pending)
+            self._schedule()
+
+    def clear(self):
+        with self.lock:
+            self.summary = ""
+            self.pending = []
+            # A refresh already running will finish against the old turns and be discarded
+            self.generation += 1
+
+    def flush(self, timeout=None):
+        """
+        Summarize any queued turns now and wait for the result.
+        """
+        with self.lock:
+            if not self.pending:
+                return
+            self.refreshing = True
+        self.executor.submit(self._refresh).result(timeout)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -1,8 +1,44 @@
 import sqlite3
+import time
+from utils.tracing import tracer
 
-def connect_to_database():
-    # Create a new database or connect to an existing one
-    conn = sqlite3.connect('tasks.db')
+# Statements are kept as module constants so sqlite3's per-connection statement cache
+# reuses the prepared statement on every call
+INSERT_TASK = 'INSERT INTO tasks (content, status, priority, created_at, parent_id) VALUES (?, ?, ?, ?, ?)'
+INSERT_DEPENDENCY = 'INSERT OR IGNORE INTO task_dependencies (task_id, depends_on) VALUES (?, ?)'
+SELECT_OPEN_TASKS = "SELECT id, content FROM tasks WHERE status IN ('pending', 'running') ORDER BY id"
+MARK_TASK_DONE = "UPDATE tasks SET status = 'done', completed_at = ? WHERE id = ?"
+SET_TASK_STATUS = 'UPDATE tasks SET status = ? WHERE id = ?'
+READY_TASK = '''
+    SELECT t.id FROM tasks t
+    WHERE t.status = 'pending'
+      AND NOT EXISTS (
+          SELECT 1 FROM task_dependencies d JOIN tasks p ON p.id = d.depends_on
+          WHERE d.task_id = t.id AND p.status != 'done'
+      )
+    ORDER BY t.priority DESC, t.id
+    LIMIT 1
+'''
+DEQUEUE_NEXT = f"UPDATE tasks SET status = 'running', started_at = ? WHERE id = ({READY_TASK}) RETURNING id, content"
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+TASK_COLUMNS = {
+    "status": "TEXT NOT NULL DEFAULT 'pending'",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "created_at": "REAL",
+    "started_at": "REAL",
+    "completed_at": "REAL",
+    "parent_id": "INTEGER REFERENCES tasks(id)",
+}
+
+def connect_to_database(path='tasks.db', check_same_thread=True):
+    # Create a new database or connect to an existing one; callers sharing the connection
+    # between threads pass check_same_thread=False and serialize access themselves
+    conn = sqlite3.connect(path, cached_statements=256, check_same_thread=check_same_thread)
+    # WAL lets readers proceed while a write is in progress and avoids a full journal
+    # rewrite per commit
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
     return conn
 
 def create_cursor(conn):
@@ -11,26 +47,102 @@ def create_cursor(conn):
     return cursor
 
 def create_tasks_table(cursor):
-    # Create a table to store tasks
+    # Create a table to store tasks, migrating databases created before the queue columns existed
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS tasks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             content TEXT
         )
     ''')
+    existing = {row[1] for row in cursor.execute('PRAGMA table_info(tasks)')}
+    for column, definition in TASK_COLUMNS.items():
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE tasks ADD COLUMN {column} {definition}')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_dependencies (
+            task_id INTEGER NOT NULL REFERENCES tasks(id),
+            depends_on INTEGER NOT NULL REFERENCES tasks(id),
+            PRIMARY KEY (task_id, depends_on)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks (status, priority DESC, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_parent ON tasks (parent_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_dependencies_depends_on ON task_dependencies (depends_on)')
+    cursor.connection.commit()
 
-def add_task(conn, content):
+@tracer.traced("db.add_task")
+def add_task(conn, content, priority=0, parent_id=None, depends_on=()):
     # Function to add a new task to the database
     cursor = conn.cursor()
-    cursor.execute('INSERT INTO tasks (content) VALUES (?)', (content,))
-    conn.commit()
+    with conn:
+        cursor.execute(INSERT_TASK, (content, 'pending', priority, time.time(), parent_id))
+        task_id = cursor.lastrowid
+        cursor.executemany(INSERT_DEPENDENCY, [(task_id, dependency) for dependency in depends_on])
+    return task_id
 
+@tracer.traced("db.add_tasks")
+def add_tasks(conn, contents, priority=0, parent_id=None):
+    # Function to add several tasks in a single transaction, returning their ids in order
+    if not contents:
+        return []
+    cursor = conn.cursor()
+    now = time.time()
+    with conn:
+        # BEGIN IMMEDIATE takes the write lock up front, so the AUTOINCREMENT ids handed
+        # out by executemany are consecutive after the current sequence value
+        if not conn.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+        first_id = (row[0] if row else 0) + 1
+        cursor.executemany(INSERT_TASK, [(content, 'pending', priority, now, parent_id) for content in contents])
+    return list(range(first_id, first_id + len(contents)))
+
+@tracer.traced("db.add_dependencies")
+def add_dependencies(conn, dependencies):
+    # Function to record (task_id, depends_on) pairs in a single transaction
+    with conn:
+        conn.executemany(INSERT_DEPENDENCY, dependencies)
+
+@tracer.traced("db.get_tasks")
 def get_tasks(cursor):
-    # Function to retrieve all tasks from the database
-    cursor.execute('SELECT * FROM tasks')
+    # Function to retrieve all open tasks from the database
+    cursor.execute(SELECT_OPEN_TASKS)
     return cursor.fetchall()
 
+@tracer.traced("db.dequeue_next")
+def dequeue_next(conn):
+    # Function to claim the highest-priority pending task whose dependencies are done
+    now = time.time()
+    with conn:
+        if SUPPORTS_RETURNING:
+            rows = conn.execute(DEQUEUE_NEXT, (now,)).fetchall()
+            row = rows[0] if rows else None
+        else:
+            row = conn.execute(READY_TASK).fetchone()
+            if row is not None:
+                conn.execute("UPDATE tasks SET status = 'running', started_at = ? WHERE id = ?", (now, row[0]))
+                row = conn.execute('SELECT id, content FROM tasks WHERE id = ?', (row[0],)).fetchone()
+    return row
+
+@tracer.traced("db.set_task_status")
+def set_task_status(conn, task_id, status):
+    with conn:
+        conn.execute(SET_TASK_STATUS, (status, task_id))
+
+@tracer.traced("db.reset_running_tasks")
+def reset_running_tasks(conn):
+    # Tasks left running by a previous process are put back in the queue
+    with conn:
+        conn.execute("UPDATE tasks SET status = 'pending', started_at = NULL WHERE status = 'running'")
+
+@tracer.traced("db.cancel_open_tasks")
+def cancel_open_tasks(conn):
+    # Close out every pending or running task, so a fresh run does not inherit them
+    with conn:
+        conn.execute("UPDATE tasks SET status = 'cancelled', completed_at = ? WHERE status IN ('pending', 'running')", (time.time(),))
+
+@tracer.traced("db.mark_tasks_as_done")
 def mark_tasks_as_done(conn, cursor, task_id):
-    cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+    cursor.execute(MARK_TASK_DONE, (time.time(), task_id))
     conn.commit()
-    return True
\ No newline at end of file
+    return True
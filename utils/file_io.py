@@ -0,0 +1,92 @@
+import codecs
+import io
+import mmap
+import os
+import tempfile
+
+def _read_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# os.umask can only be read by setting it, which briefly changes it for every thread, so it
+# is read once here, while the module is imported, rather than on each write
+UMASK = _read_umask()
+
+def read_text_chunks(path, chunk_size=1024 * 1024, mmap_threshold=8 * 1024 * 1024, encoding="utf-8"):
+    """
+    Read a text file as a sequence of decoded chunks.
+
+    Files of mmap_threshold bytes or more are memory-mapped and sliced, so the OS pages
+    them in as they are read instead of copying the whole file up front. Multi-byte
+    characters split across chunk boundaries are decoded correctly and newlines are
+    translated as in text mode.
+
+    Args:
+        path (str): The file to read.
+        chunk_size (int): Bytes per chunk.
+        mmap_threshold (int): Size in bytes from which the file is memory-mapped.
+        encoding (str): The text encoding. Undecodable bytes are replaced.
+
+    Yields:
+        str: Decoded text, chunk by chunk.
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(errors="replace"), translate=True)
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size >= mmap_threshold:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, size, chunk_size):
+                    text = decoder.decode(mapped[start:start + chunk_size])
+                    if text:
+                        yield text
+        else:
+            while True:
+                data = file.read(chunk_size)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+def atomic_write(path, text, encoding="utf-8"):
+    """
+    Replace a file's contents so that a crash leaves either the old or the new version.
+
+    The text goes to a temporary file in the same directory, which is flushed to disk
+    and then renamed over the target. An existing file's permissions are kept.
+
+    Args:
+        path (str): The file to write.
+        text (str): The new contents.
+        encoding (str): The text encoding.
+    """
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w", encoding=encoding) as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o666 & ~UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # Persist the rename itself; not available (or needed) on Windows
+        directory_descriptor = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory_descriptor)
+        finally:
+            os.close(directory_descriptor)
@@ -0,0 +1,103 @@
+import heapq
+import math
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    counts = {}
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        counts[token] = counts.get(token, 0) + 1
+    return counts
+
+
+class HistoryIndex:
+    """
+    Incremental inverted index over history messages for similarity lookups.
+
+    Documents are log-tf term vectors with precomputed norms. A query only visits the
+    postings of its own terms, rarest first, and once the terms left could not lift a
+    new document above min_score on their own, their postings are only probed for the
+    documents already found. Common words therefore cost a lookup per candidate rather
+    than a pass over nearly the whole history. Scores are cosine similarities with
+    query terms weighted by a normalized IDF, so they stay within [0, 1].
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.doc_terms = {}
+        self.doc_norms = {}
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def _weights(self, text):
+        return {term: 1.0 + math.log(count) for term, count in tokenize(text).items()}
+
+    def add(self, doc_id, text):
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        weights = self._weights(text)
+        for term, weight in weights.items():
+            self.postings.setdefault(term, {})[doc_id] = weight
+        self.doc_terms[doc_id] = list(weights)
+        self.doc_norms[doc_id] = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+
+    def remove(self, doc_id):
+        for term in self.doc_terms.pop(doc_id, []):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.doc_norms.pop(doc_id, None)
+
+    def search(self, text, k=10, min_score=0.0):
+        """
+        Find the indexed documents most similar to the given text.
+
+        Args:
+            text (str): The query text.
+            k (int): The maximum number of results.
+            min_score (float): Results scoring at or below this are dropped.
+
+        Returns:
+            list: (doc_id, score) pairs, best match first.
+        """
+        query = self._weights(text)
+        if not query or not self.doc_terms:
+            return []
+
+        total_docs = len(self.doc_terms)
+        max_idf = math.log(1.0 + total_docs)
+        query_norm = math.sqrt(sum(weight * weight for weight in query.values()))
+        terms = []
+        for term, query_weight in query.items():
+            posting = self.postings.get(term)
+            if posting:
+                idf = math.log(1.0 + total_docs / len(posting)) / max_idf
+                terms.append((idf * query_weight, posting))
+        terms.sort(key=lambda term: term[0], reverse=True)
+
+        # A document matching none of the terms seen so far scores at most the norm of the
+        # remaining term weights over the query norm (Cauchy-Schwarz with a unit document)
+        remaining = sum(weight * weight for weight, posting in terms)
+        scores = {}
+        for weight, posting in terms:
+            if math.sqrt(max(remaining, 0.0)) / query_norm > min_score:
+                for doc_id, doc_weight in posting.items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight * doc_weight
+            else:
+                for doc_id in scores:
+                    doc_weight = posting.get(doc_id)
+                    if doc_weight:
+                        scores[doc_id] += weight * doc_weight
+            remaining -= weight * weight
+
+        results = []
+        for doc_id, dot in scores.items():
+            score = dot / (query_norm * self.doc_norms[doc_id])
+            if score > min_score:
+                results.append((doc_id, score))
+        return heapq.nlargest(k, results, key=lambda result: result[1])
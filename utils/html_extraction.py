@@ -0,0 +1,139 @@
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import re
+
+ExtractedPage = namedtuple("ExtractedPage", ["url", "title", "text", "html_length", "token_count"])
+
+SKIPPED_TAGS = {"script", "style", "svg", "noscript", "template", "iframe", "canvas", "object"}
+# </head> is optional, so the head also ends at the first tag that cannot appear in it
+HEAD_TAGS = {"title", "meta", "link", "base", "style", "script", "noscript", "template"}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "footer", "nav", "aside", "ul", "ol",
+    "table", "tr", "blockquote", "pre", "form", "figure", "figcaption", "dl", "dt", "dd", "br", "hr"
+}
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "area", "base", "col", "embed", "source", "track", "wbr"}
+WHITESPACE = re.compile(r'[ \t\r\f\v]+')
+BLANK_LINES = re.compile(r'\n{3,}')
+
+class HtmlTextExtractor(HTMLParser):
+    """
+    Incremental HTML-to-markdown extractor.
+
+    Markup that carries no readable content (scripts, styles, inline SVG and the like)
+    is dropped, headings become "#" lines, list items become "-" lines and links keep
+    their target as [text](url). HTML can be fed in pieces as it arrives; call close()
+    and then text() for the result.
+    """
+
+    def __init__(self, base_url=""):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.parts = []
+        self.skip_depth = 0
+        self.title = ""
+        self.in_title = False
+        self.in_head = False
+        self.link_href = None
+        self.link_text = []
+        self.in_pre = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "head":
+            self.in_head = True
+            return
+        if self.in_head and tag not in HEAD_TAGS:
+            self.in_head = False
+        if tag == "title":
+            self.in_title = True
+            return
+        if tag in SKIPPED_TAGS and tag not in VOID_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        if tag in HEADING_TAGS:
+            self.parts.append("\n\n" + "#" * HEADING_TAGS[tag] + " ")
+        elif tag == "li":
+            self.parts.append("\n- ")
+        elif tag == "pre":
+            self.in_pre = True
+            self.parts.append("\n```\n")
+        elif tag in ("td", "th"):
+            self.parts.append(" | ")
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href and not href.startswith(("#", "javascript:")):
+                self.link_href = urljoin(self.base_url, href)
+                self.link_text = []
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self.in_head = False
+            return
+        if tag == "title":
+            self.in_title = False
+            return
+        if tag in SKIPPED_TAGS and tag not in VOID_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth:
+            return
+        if tag == "a" and self.link_href is not None:
+            text = " ".join("".join(self.link_text).split())
+            if text:
+                self.parts.append(f"[{text}]({self.link_href})")
+            self.link_href = None
+        elif tag == "pre":
+            self.in_pre = False
+            self.parts.append("\n```\n")
+        elif tag in HEADING_TAGS or tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+            return
+        if self.skip_depth or self.in_head:
+            return
+        if self.link_href is not None:
+            self.link_text.append(data)
+        elif self.in_pre:
+            self.parts.append(data)
+        else:
+            data = WHITESPACE.sub(" ", data.replace("\n", " "))
+            if not self.parts or self.parts[-1].endswith((" ", "\n")):
+                data = data.lstrip()
+            if data:
+                self.parts.append(data)
+
+    def text(self):
+        lines = [line.rstrip() for line in "".join(self.parts).split("\n")]
+        return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+def extract_page(html, url="", count_tokens=None, chunk_size=65536):
+    """
+    Reduce a page's HTML to compact markdown-like text.
+
+    Args:
+        html (str): The page source.
+        url (str): The page URL, used to resolve relative links.
+        count_tokens (callable): Counts tokens in a string. Defaults to a 4-characters-per-token estimate.
+        chunk_size (int): Size of the pieces the HTML is fed to the parser in.
+
+    Returns:
+        ExtractedPage: The URL, title, extracted text, original HTML length and text token count.
+    """
+    extractor = HtmlTextExtractor(url)
+    for start in range(0, len(html), chunk_size):
+        extractor.feed(html[start:start + chunk_size])
+    extractor.close()
+    text = extractor.text()
+    title = " ".join(extractor.title.split())
+    if title and not text.startswith("# "):
+        text = f"# {title}\n\n{text}"
+    count_tokens = count_tokens or (lambda value: len(value) // 4 + 1)
+    return ExtractedPage(url, title, text, len(html), count_tokens(text))
@@ -0,0 +1,175 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+import http.client
+import re
+import threading
+import time
+import zlib
+
+FetchResult = namedtuple("FetchResult", ["url", "status", "headers", "text", "elapsed", "error"])
+
+CHARSET_PATTERN = re.compile(r'charset=["\']?([\w-]+)', re.IGNORECASE)
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) DevEase/1.0",
+    "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Connection": "keep-alive",
+}
+
+def decode_body(body, headers):
+    """
+    Decompress and decode a response body using its Content-Encoding and charset.
+    """
+    encoding = headers.get("content-encoding", "").lower()
+    if encoding in ("gzip", "x-gzip"):
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            body = zlib.decompress(body, -zlib.MAX_WBITS)
+    match = CHARSET_PATTERN.search(headers.get("content-type", "")) or META_CHARSET_PATTERN.search(body[:2048])
+    charset = match.group(1) if match else "utf-8"
+    if isinstance(charset, bytes):
+        charset = charset.decode("ascii")
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+class HttpFetcher:
+    """
+    Headless page fetcher with per-host keep-alive connection pools.
+
+    Connections are reused across requests to the same scheme, host and port, so
+    repeated fetches skip the TCP and TLS handshakes. Every request has a real
+    timeout, gzip and deflate responses are decoded, redirects are followed and
+    fetch_many runs requests concurrently. Errors are returned in the result
+    rather than raised, so one bad URL does not fail a batch.
+    """
+
+    def __init__(self, timeout=10.0, max_workers=8, connections_per_host=4, max_redirects=5, max_bytes=5 * 1024 * 1024):
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.connections_per_host = connections_per_host
+        self.max_redirects = max_redirects
+        self.max_bytes = max_bytes
+        self.pools = {}
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def _acquire(self, scheme, netloc, timeout):
+        with self.lock:
+            pool = self.pools.get((scheme, netloc))
+            if pool:
+                connection = pool.pop()
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                return connection
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=timeout)
+        return http.client.HTTPConnection(netloc, timeout=timeout)
+
+    def _release(self, scheme, netloc, connection):
+        with self.lock:
+            pool = self.pools.setdefault((scheme, netloc), [])
+            if len(pool) < self.connections_per_host:
+                pool.append(connection)
+                return
+        connection.close()
+
+    def _request(self, url, headers, timeout):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {url}")
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        # A pooled connection the server has since closed fails on first use; retry once on a fresh one
+        for attempt in range(2):
+            connection = self._acquire(parts.scheme, parts.netloc, timeout)
+            reused = connection.sock is not None
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                body = response.read(self.max_bytes + 1)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, http.client.BadStatusLine):
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            if len(body) > self.max_bytes or response.will_close or not response.isclosed():
+                connection.close()
+            else:
+                self._release(parts.scheme, parts.netloc, connection)
+            return response.status, {key.lower(): value for key, value in response.getheaders()}, body[:self.max_bytes]
+
+    def fetch(self, url, timeout=None, headers=None):
+        """
+        Fetch a URL, following redirects.
+
+        Args:
+            url (str): The URL to fetch. A missing scheme defaults to http.
+            timeout (float): Connect and read timeout in seconds. Defaults to the fetcher's timeout.
+            headers (dict): Extra request headers.
+
+        Returns:
+            FetchResult: The final URL, status, lowercased headers, decoded text, elapsed seconds
+            and an error message (None on success).
+        """
+        if "://" not in url:
+            url = "http://" + url
+        timeout = self.timeout if timeout is None else timeout
+        request_headers = dict(DEFAULT_HEADERS, **(headers or {}))
+        start = time.perf_counter()
+        try:
+            for _ in range(self.max_redirects + 1):
+                status, response_headers, body = self._request(url, request_headers, timeout)
+                if status in REDIRECT_STATUSES and "location" in response_headers:
+                    url = urljoin(url, response_headers["location"])
+                    continue
+                text = decode_body(body, response_headers)
+                return FetchResult(url, status, response_headers, text, time.perf_counter() - start, None)
+            return FetchResult(url, status, response_headers, "", time.perf_counter() - start, "Too many redirects")
+        except Exception as e:
+            return FetchResult(url, None, {}, "", time.perf_counter() - start, str(e) or type(e).__name__)
+
+    def fetch_many(self, urls, timeout=None, headers=None):
+        """
+        Fetch several URLs concurrently.
+
+        Args:
+            urls (list): The URLs to fetch.
+            timeout (float): Connect and read timeout in seconds for each request.
+            headers (dict or list): Extra request headers for every URL, or a list with one dict per URL.
+
+        Returns:
+            list: FetchResult tuples in the order of urls.
+        """
+        urls = list(urls)
+        if not isinstance(headers, list):
+            headers = [headers] * len(urls)
+        if len(urls) <= 1:
+            return [self.fetch(url, timeout, url_headers) for url, url_headers in zip(urls, headers)]
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fetch")
+        return list(self.executor.map(lambda url, url_headers: self.fetch(url, timeout, url_headers), urls, headers))
+
+    def close(self):
+        with self.lock:
+            connections = [connection for pool in self.pools.values() for connection in pool]
+            self.pools.clear()
+            executor, self.executor = self.executor, None
+        for connection in connections:
+            connection.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
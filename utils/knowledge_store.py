@@ -0,0 +1,184 @@
+import hashlib
+import heapq
+import math
+import re
+from utils.history_index import tokenize
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+def chunk_text(text, chunk_words=150):
+    """
+    Split text into chunks of roughly chunk_words words along paragraph boundaries.
+
+    Paragraphs are packed together until the next one would overflow the chunk; a
+    paragraph longer than a whole chunk is split on word boundaries.
+    """
+    chunks = []
+    current = []
+    current_words = 0
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if len(words) > chunk_words:
+            if current:
+                chunks.append("\n\n".join(current))
+                current, current_words = [], 0
+            for start in range(0, len(words), chunk_words):
+                chunks.append(" ".join(words[start:start + chunk_words]))
+            continue
+        if current_words + len(words) > chunk_words and current:
+            chunks.append("\n\n".join(current))
+            current, current_words = [], 0
+        current.append(" ".join(words))
+        current_words += len(words)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def content_hash(text):
+    return hashlib.sha256(" ".join(text.split()).lower().encode("utf-8")).hexdigest()
+
+class KnowledgeStore:
+    """
+    Chunked, deduplicated document store with BM25 retrieval.
+
+    Documents are keyed by source (a URL or knowledge base key). Re-adding a source
+    replaces its chunks, and identical chunks shared between sources are stored once.
+    """
+
+    def __init__(self, chunk_words=150, k1=1.5, b=0.75):
+        self.chunk_words = chunk_words
+        self.k1 = k1
+        self.b = b
+        self.chunks = {}
+        self.chunk_sources = {}
+        self.chunk_lengths = {}
+        self.chunk_ids_by_hash = {}
+        self.sources = {}
+        self.postings = {}
+        self.total_length = 0
+        self.next_chunk_id = 0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add_document(self, source, text):
+        """
+        Chunk and index a document, replacing any earlier version from the same source.
+
+        Returns:
+            int: The number of new (previously unseen) chunks indexed.
+        """
+        self.remove_document(source)
+        chunk_ids = []
+        added = 0
+        for chunk in chunk_text(text, self.chunk_words):
+            digest = content_hash(chunk)
+            chunk_id = self.chunk_ids_by_hash.get(digest)
+            if chunk_id is None:
+                chunk_id = self._index_chunk(chunk, digest)
+                added += 1
+            if chunk_id not in chunk_ids:
+                chunk_ids.append(chunk_id)
+                self.chunk_sources[chunk_id].add(source)
+        self.sources[source] = chunk_ids
+        return added
+
+    def remove_document(self, source):
+        for chunk_id in self.sources.pop(source, []):
+            sources = self.chunk_sources[chunk_id]
+            sources.discard(source)
+            if not sources:
+                self._unindex_chunk(chunk_id)
+
+    def clear(self):
+        self.__init__(self.chunk_words, self.k1, self.b)
+
+    def _index_chunk(self, chunk, digest):
+        chunk_id = self.next_chunk_id
+        self.next_chunk_id += 1
+        counts = tokenize(chunk)
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[chunk_id] = count
+        length = sum(counts.values())
+        self.chunks[chunk_id] = (digest, chunk)
+        self.chunk_sources[chunk_id] = set()
+        self.chunk_lengths[chunk_id] = length
+        self.chunk_ids_by_hash[digest] = chunk_id
+        self.total_length += length
+        return chunk_id
+
+    def _unindex_chunk(self, chunk_id):
+        digest, chunk = self.chunks.pop(chunk_id)
+        for term in tokenize(chunk):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(chunk_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.chunk_lengths.pop(chunk_id)
+        del self.chunk_sources[chunk_id]
+        del self.chunk_ids_by_hash[digest]
+
+    def search(self, query, k=5):
+        """
+        Rank chunks against a query with BM25.
+
+        Returns:
+            list: (score, source, chunk) tuples, best match first.
+        """
+        return [(score, min(self.chunk_sources[chunk_id]), self.chunks[chunk_id][1]) for chunk_id, score in self._rank(query, k)]
+
+    def _rank(self, query, k):
+        # (chunk_id, score) pairs, best match first
+        if not self.chunks:
+            return []
+        total_chunks = len(self.chunks)
+        average_length = self.total_length / total_chunks or 1.0
+        scores = {}
+        for term in tokenize(query):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1.0 + (total_chunks - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, count in posting.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self.chunk_lengths[chunk_id] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * count * (self.k1 + 1.0) / (count + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def select(self, query, max_tokens, count_tokens=None, k=20):
+        """
+        Pick the best-matching chunks that fit within max_tokens.
+
+        Args:
+            query (str): The text to retrieve knowledge for.
+            max_tokens (int): Token budget for the selected chunks together.
+            count_tokens (callable): Counts tokens in a string. Defaults to a 4-characters-per-token estimate.
+            k (int): Maximum number of chunks considered.
+
+        Returns:
+            list: The selected chunks, each prefixed with its source, in the order they
+            were indexed rather than by score, so queries that select the same chunks
+            produce the same text.
+        """
+        count_tokens = count_tokens or (lambda text: len(text) // 4 + 1)
+        selected = []
+        remaining = max_tokens
+        for chunk_id, score in self._rank(query, k):
+            block = f"[{min(self.chunk_sources[chunk_id])}]\n{self.chunks[chunk_id][1]}"
+            cost = count_tokens(block)
+            if cost > remaining:
+                continue
+            selected.append((chunk_id, block))
+            remaining -= cost
+        return [block for chunk_id, block in sorted(selected)]
+
+    def context(self, query, max_tokens, count_tokens=None, k=20):
+        """
+        Build a prompt block from the chunks select() picks.
+
+        Returns:
+            str: The selected chunks separated by blank lines, or an empty string.
+        """
+        return "\n\n".join(self.select(query, max_tokens, count_tokens, k))
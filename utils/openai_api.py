@@ -1,8 +1,13 @@
-from openai import OpenAI
 import json
 import time
-import difflib
-import tiktoken
+import threading
+from collections import deque
+from utils.token_budget import TokenBudget, get_encoding
+from utils.response_cache import ResponseCache
+from utils.history_index import HistoryIndex
+from utils.prompt_builder import ContextBlock, build_messages, render_context
+from utils.tracing import tracer
+from utils.request_scheduler import default_scheduler
 
 gpt3 = "gpt-3.5-turbo-16k"
 gpt4 = "gpt-4-0125-preview"
@@ -11,80 +16,276 @@ token_context_windows = {
     gpt4: 128000,
 }
 
+_clients = {}
+_clients_lock = threading.Lock()
+
+def shared_client(api_key=None, base_url=None):
+    """
+    The OpenAI client for an API key and endpoint, created once per process so every
+    OpenAIAPI reuses the same HTTP connection pool.
+
+    The client's own retries are turned off; RequestScheduler retries instead, under
+    the shared rate limit.
+    """
+    key = (api_key, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # The openai package takes most of a second to import, so it is loaded on first use
+            from openai import OpenAI
+            client = _clients[key] = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        return client
+
 class OpenAIAPI:
-    def __init__(self, model=gpt4, api_key=None, history_limit=10):
-        self.openai = OpenAI()
+    def __init__(self, model=gpt4, api_key=None, history_limit=2000, cache_path="response_cache.db", relevance_threshold=0.5, base_url=None, scheduler=None, cache=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._openai = None
+        # None means the process-wide scheduler, looked up per request so configure_default applies
+        self.scheduler = scheduler
         self.model = model
-        self.history = []
+        self.history = deque()
         self.history_limit = history_limit
+        self.history_index = HistoryIndex()
+        self.next_history_id = 0
+        self.relevance_threshold = relevance_threshold
+        # Completions may run concurrently on scheduler workers
+        self.history_lock = threading.Lock()
+        self.token_budget = TokenBudget(model, token_context_windows.get(model, 16000))
+        # A ResponseCache passed in may be shared with other instances; it is thread-safe
+        self.cache = cache if cache is not None else (ResponseCache(cache_path) if cache_path else None)
+
+    @property
+    def openai(self):
+        if self._openai is None:
+            self._openai = shared_client(self.api_key, self.base_url)
+        return self._openai
+
+    def _scheduler(self):
+        return self.scheduler or default_scheduler()
+
+    def warm_up(self):
+        """
+        Load the OpenAI client and the tokenizer ahead of the first request.
+        """
+        self.openai
+        get_encoding(self.model)
 
     def _add_to_history(self, user_message, sys_message, response):
-        if len(self.history) >= self.history_limit:
-            self.history.pop(0)
-        self.history.append({
+        entry = {
             "timestamp": time.time(),
             "user_message": user_message,
             "sys_message": sys_message,
             "response": response
-        })
+        }
+        with self.history_lock:
+            if len(self.history) >= self.history_limit:
+                # Entry ids increase with insertion order, so the oldest live id is at the deque head
+                self.history_index.remove(self.next_history_id - len(self.history))
+                self.history.popleft()
+            self.history.append(entry)
+            self.history_index.add(self.next_history_id, user_message)
+            self.next_history_id += 1
+
+    def clear_history(self):
+        """
+        Forget every recorded exchange, so later prompts get no relevant history from them.
+        """
+        with self.history_lock:
+            self.history.clear()
+            self.history_index = HistoryIndex()
+            self.next_history_id = 0
 
     def _search_history(self, keyword):
         return [entry for entry in self.history if keyword.lower() in entry['user_message'].lower() or keyword.lower() in entry['response'].lower()]
 
-    def _get_relevant_history(self, user_message):
-        similarity_scores = [
-            (entry, difflib.SequenceMatcher(None, user_message, entry['user_message']).ratio())
-            for entry in self.history
-        ]
-        relevant_entries = [entry for entry, score in similarity_scores if score > 0.5]
-        return relevant_entries[-10:]
+    def _get_relevant_history(self, user_message, k=10):
+        with tracer.span("prompt.relevant_history") as span, self.history_lock:
+            matches = self.history_index.search(user_message, k=k, min_score=self.relevance_threshold)
+            span.set(history=len(self.history), matches=len(matches))
+            if not matches:
+                return []
+            first_id = self.next_history_id - len(self.history)
+            return [self.history[doc_id - first_id] for doc_id, score in sorted(matches)]
 
     def _ensure_token_limit(self, messages, model):
-        max_tokens = token_context_windows.get(model, 16000)
-        total_tokens = num_tokens_from_messages(messages, model)
-        while total_tokens > max_tokens:
-            messages.pop(0)
-            total_tokens = num_tokens_from_messages(messages, model)
-        return messages
-
-    def api_calls(self, system_message, assistant_message, user_message, code_context=None):
+        if model != self.token_budget.model:
+            self.token_budget = TokenBudget(model, token_context_windows.get(model, 16000))
+        budget = self.token_budget
+        with tracer.span("tokens.trim", messages_in=len(messages)) as span:
+            hits, misses = budget.hits, budget.misses
+            trimmed = budget.trim(messages)
+            span.set(messages_out=len(trimmed))
+        tracer.increment("token_count_cache_lookups", budget.hits - hits, result="hit")
+        tracer.increment("token_count_cache_lookups", budget.misses - misses, result="miss")
+        return trimmed
+
+    def _request(self, system_message, assistant_message, user_message, code_context=None, context=None):
         if not isinstance(user_message, str) or not isinstance(system_message, str) or not isinstance(assistant_message, str):
             raise ValueError("user_message, system_message, and assistant_message must be strings")
-        
-        relevant_history = self._get_relevant_history(user_message)
-        
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "assistant", "content": assistant_message},
-            {"role": "user", "content": user_message}
-        ]
-        
-        messages.extend([{"role": role, "content": entry[role + '_message']} for entry in relevant_history for role in ["system", "user"] if role + '_message' in entry])
-        
+        blocks = list(context or ())
         if code_context:
-            messages.append({"role": "system", "content": f"Code context:\n{code_context}"})
+            blocks.append(ContextBlock("Code context", [code_context]))
+        return [system_message, assistant_message, user_message, blocks]
+
+    def _build_messages(self, request, record=True):
+        system_message, assistant_message, user_message, blocks = request
+        relevant_history = self._get_relevant_history(user_message) if record else []
+        if relevant_history:
+            # Most likely to change between calls, so it goes after the caller's context
+            blocks = blocks + [ContextBlock("Related Earlier Requests", [f"User: {entry['user_message']}" for entry in relevant_history])]
         
-        messages = self._ensure_token_limit(messages, self.model)
+        messages, dropped = build_messages(system_message, assistant_message, user_message, blocks)
+        if dropped:
+            tracer.increment("prompt_duplicate_entries", dropped)
         
+        return self._ensure_token_limit(messages, self.model)
+
+    def api_calls(self, system_message, assistant_message, user_message, code_context=None, on_token=None, context=None, record=True):
+        """
+        Make a completion and return its content.
+
+        Args:
+            system_message (str): The system prompt; keep it identical between calls so it can be served from the provider's prompt cache.
+            assistant_message (str): The tool description, likewise static.
+            user_message (str): The message the model answers.
+            code_context (str): Extra context, sent as a "Code context" block after context.
+            on_token (callable): Called with each content fragment as it streams in.
+            context (list): ContextBlocks, most stable first; see prompt_builder.build_messages.
+            record (bool): Whether the exchange goes through the response cache and into the history. Internal
+                calls such as summaries pass False, so their prompts never come back as related requests.
+
+        Returns:
+            str: The response content.
+        """
+        if on_token is not None:
+            chunks = []
+            for chunk in self.stream_api_calls(system_message, assistant_message, user_message, code_context, context, record):
+                on_token(chunk)
+                chunks.append(chunk)
+            return "".join(chunks)
+
+        request = self._request(system_message, assistant_message, user_message, code_context, context)
+        with tracer.span("llm.completion", model=self.model, streamed=False) as span:
+            cached = self._get_cached(request) if record else None
+            span.set(cached=cached is not None)
+            if cached is not None:
+                self._add_to_history(user_message, system_message, cached)
+                return cached
+            
+            messages = self._build_messages(request, record)
+            
+            try:
+                tracer.increment("llm_requests", model=self.model)
+                scheduler = self._scheduler()
+                estimate = self.token_budget.count_messages(messages)
+                with tracer.span("llm.request", model=self.model, messages=len(messages), estimated_tokens=estimate) as request_span:
+                    response = scheduler.execute(lambda: self.openai.chat.completions.create(model=self.model, messages=messages, temperature=0), estimate)
+                    self._record_usage(request_span, getattr(response, "usage", None), scheduler, estimate)
+                response_content = response.choices[0].message.content
+                if record:
+                    self._add_to_history(user_message, system_message, response_content)
+                    self._put_cached(request, response_content)
+                return response_content
+            except Exception as e:
+                raise RuntimeError(f"Failed to make API call: {e}")
+
+    def stream_api_calls(self, system_message, assistant_message, user_message, code_context=None, context=None, record=True):
+        """
+        Stream a completion, yielding content fragments as they arrive.
+
+        The full response is added to the history once the stream is exhausted, unless record is False.
+        """
+        request = self._request(system_message, assistant_message, user_message, code_context, context)
+        # Ended by hand rather than activated: the consumer runs between yields on this
+        # thread, and its spans are not part of the completion
+        span = tracer.start_span("llm.completion", model=self.model, streamed=True)
+        cached = self._get_cached(request) if record else None
+        span.set(cached=cached is not None)
+        if cached is not None:
+            self._add_to_history(user_message, system_message, cached)
+            span.end()
+            yield cached
+            return
+        
+        with tracer.activate(span):
+            messages = self._build_messages(request, record)
+        tracer.increment("llm_requests", model=self.model)
+        scheduler = self._scheduler()
+        estimate = self.token_budget.count_messages(messages)
+        request_span = tracer.start_span("llm.request", parent=span, model=self.model, messages=len(messages), estimated_tokens=estimate)
+        started = time.perf_counter()
+        chunks = []
         try:
-            response = self.openai.chat.completions.create(model=self.model, messages=messages, temperature=0)
-            response_content = response.choices[0].message.content
-            self._add_to_history(user_message, system_message, response_content)
-            return response_content
+            stream = scheduler.stream(lambda: self.openai.chat.completions.create(model=self.model, messages=messages, temperature=0, stream=True, stream_options={"include_usage": True}), estimate)
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self._record_usage(request_span, chunk.usage, scheduler, estimate)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not chunks:
+                        request_span.set(first_token_s=time.perf_counter() - started)
+                    chunks.append(delta)
+                    yield delta
         except Exception as e:
+            request_span.end(error=e)
+            span.end(error=e)
             raise RuntimeError(f"Failed to make API call: {e}")
+        finally:
+            # Also reached when the consumer abandons the stream
+            request_span.end()
+            span.end()
+        response_content = "".join(chunks)
+        if record:
+            self._add_to_history(user_message, system_message, response_content)
+            self._put_cached(request, response_content)
+
+    def _record_usage(self, span, usage, scheduler, estimate):
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        # The limiter only knew the prompt estimate; charge the rest of what was used
+        scheduler.debit(prompt_tokens + completion_tokens - estimate)
+        tracer.increment("llm_prompt_tokens", prompt_tokens, model=self.model)
+        tracer.increment("llm_completion_tokens", completion_tokens, model=self.model)
+
+    def _cache_messages(self, request):
+        # Keyed on the caller's request rather than the assembled prompt, since the
+        # relevant-history entries appended to the prompt change after every call
+        system_message, assistant_message, user_message, blocks = request
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "assistant", "content": assistant_message},
+            {"role": "user", "content": user_message},
+            {"role": "system", "content": render_context(blocks)}
+        ]
+
+    def _get_cached(self, request):
+        if self.cache is None:
+            return None
+        cached = self.cache.get(self.model, self._cache_messages(request))
+        tracer.increment("response_cache_lookups", result="miss" if cached is None else "hit")
+        return cached
+
+    def _put_cached(self, request, response_content):
+        if self.cache is not None and response_content:
+            self.cache.put(self.model, self._cache_messages(request), response_content)
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else {}
 
     def get_history(self):
-        return json.dumps(self.history, indent=4)
+        return json.dumps(list(self.history), indent=4)
 
     def search_history(self, keyword):
         return json.dumps(self._search_history(keyword), indent=4)
 
 def num_tokens_from_messages(messages, model="gpt-4-0125-preview"):
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
+    encoding = get_encoding(model)
     num_tokens = 0
     for message in messages:
         num_tokens += 4
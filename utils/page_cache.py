@@ -0,0 +1,211 @@
+from collections import OrderedDict, namedtuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import sqlite3
+import threading
+import time
+
+CachedPage = namedtuple("CachedPage", ["url", "title", "text", "html_length", "token_count", "etag", "last_modified", "fetched_at"])
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url):
+    """
+    Canonical form of a URL for cache keys.
+
+    The scheme and host are lowercased, default ports and fragments are dropped,
+    query parameters are sorted and an empty path becomes "/".
+    """
+    if "://" not in url:
+        url = "http://" + url
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+class PageCache:
+    """
+    Two-tier cache of extracted pages keyed by normalized URL.
+
+    Each entry keeps the extracted text together with the response's ETag and
+    Last-Modified values. Entries younger than ttl seconds are served without touching
+    the network; older ones are kept for up to max_age seconds so they can be
+    revalidated with a conditional request, which costs a 304 instead of a download
+    when the page has not changed. Lookups go to an in-memory LRU first and fall back
+    to a SQLite table on disk; both tiers are bounded by entry count.
+    """
+
+    def __init__(self, path="page_cache.db", memory_entries=128, disk_entries=2000, ttl=3600, max_age=7 * 24 * 3600):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl = ttl
+        self.max_age = max_age
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                title TEXT,
+                text TEXT,
+                html_length INTEGER,
+                token_count INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                accessed_at REAL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_pages_accessed_at ON pages (accessed_at)')
+        self.conn.commit()
+
+    def is_fresh(self, page, now=None):
+        return (now or time.time()) - page.fetched_at <= self.ttl
+
+    def get(self, url):
+        """
+        Look up a page, fresh or stale.
+
+        Returns:
+            CachedPage: The cached page, or None if it is missing or older than max_age.
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            page = self._memory.get(key)
+            if page is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self.conn.execute(
+                    'SELECT url, title, text, html_length, token_count, etag, last_modified, fetched_at FROM pages WHERE key = ?',
+                    (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                page = CachedPage(*row)
+                self.conn.execute('UPDATE pages SET accessed_at = ? WHERE key = ?', (now, key))
+                self.conn.commit()
+                self._remember(key, page)
+            if now - page.fetched_at > self.max_age:
+                self._forget(key)
+                self.misses += 1
+                return None
+            if self.is_fresh(page, now):
+                self.hits += 1
+            return page
+
+    def validators(self, page):
+        """
+        Returns:
+            dict: Conditional request headers for revalidating a cached page.
+        """
+        headers = {}
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def put(self, url, page, etag=None, last_modified=None):
+        """
+        Store an extracted page under the URL it was requested as.
+
+        Args:
+            url (str): The requested URL.
+            page (ExtractedPage): The extracted page (its url may differ after redirects).
+            etag (str): The response's ETag header.
+            last_modified (str): The response's Last-Modified header.
+
+        Returns:
+            CachedPage: The stored entry.
+        """
+        key = normalize_url(url)
+        now = time.time()
+        cached = CachedPage(page.url, page.title, page.text, page.html_length, page.token_count, etag, last_modified, now)
+        with self._lock:
+            self._remember(key, cached)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pages (key, url, title, text, html_length, token_count, etag, last_modified, fetched_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, *cached, now)
+            )
+            self._evict_disk(now)
+            self.conn.commit()
+        return cached
+
+    def touch(self, url):
+        """
+        Mark a cached page as fresh again after a 304 Not Modified.
+
+        Returns:
+            CachedPage: The refreshed entry, or None if it is no longer cached.
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            page = self._memory.get(key)
+            if page is None:
+                row = self.conn.execute(
+                    'SELECT url, title, text, html_length, token_count, etag, last_modified, fetched_at FROM pages WHERE key = ?',
+                    (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                page = CachedPage(*row)
+            page = page._replace(fetched_at=now)
+            self._remember(key, page)
+            self.conn.execute('UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE key = ?', (now, now, key))
+            self.conn.commit()
+            self.revalidated += 1
+        return page
+
+    def invalidate(self, url):
+        with self._lock:
+            self._forget(normalize_url(url))
+
+    def _remember(self, key, page):
+        self._memory[key] = page
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _forget(self, key):
+        self._memory.pop(key, None)
+        self.conn.execute('DELETE FROM pages WHERE key = ?', (key,))
+        self.conn.commit()
+
+    def _evict_disk(self, now):
+        self.conn.execute('DELETE FROM pages WHERE fetched_at < ?', (now - self.max_age,))
+        count = self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        if count > self.disk_entries:
+            self.conn.execute(
+                'DELETE FROM pages WHERE key IN (SELECT key FROM pages ORDER BY accessed_at LIMIT ?)',
+                (count - self.disk_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self.conn.execute('DELETE FROM pages')
+            self.conn.commit()
+
+    def stats(self):
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.revalidated) / total if total else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+    def close(self):
+        self.conn.close()
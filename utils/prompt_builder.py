@@ -0,0 +1,65 @@
+from collections import namedtuple
+import hashlib
+
+# A titled group of context entries, such as recent conversation lines or knowledge
+# chunks; entries are joined with separator when rendered
+ContextBlock = namedtuple("ContextBlock", ["title", "entries", "separator"], defaults=("\n",))
+
+def entry_key(text):
+    # Whitespace differences do not make an entry new
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).digest()
+
+def render_block(block):
+    return f"{block.title}:\n{block.separator.join(block.entries)}"
+
+def render_context(blocks):
+    """
+    Render context blocks as one string, in order, skipping empty ones.
+    """
+    return "\n\n".join(render_block(block) for block in blocks if block.entries)
+
+def build_messages(system_message, assistant_message, user_message, blocks=()):
+    """
+    Lay out a request so that consecutive requests share the longest possible prefix.
+
+    The system message and the assistant's tool description come first, byte for byte
+    as given, so a provider's prompt cache can reuse them from turn to turn. Each
+    context block follows as its own system message, in the order given, which callers
+    arrange from most to least stable. The user message comes last. Entries whose text
+    already appeared earlier in the prompt are dropped, as are entries repeating the
+    user message with or without a "User: " label. Blocks left empty are left out, and
+    so are empty system and assistant messages.
+
+    Args:
+        system_message (str): The static system prompt.
+        assistant_message (str): The static tool description.
+        user_message (str): The message the model answers.
+        blocks (list): ContextBlocks, most stable first.
+
+    Returns:
+        tuple: The chat messages and the number of duplicate entries dropped.
+    """
+    messages = []
+    if system_message:
+        messages.append({"role": "system", "content": system_message})
+    if assistant_message:
+        messages.append({"role": "assistant", "content": assistant_message})
+
+    seen = {entry_key(user_message), entry_key(f"User: {user_message}")}
+    dropped = 0
+    for block in blocks:
+        entries = []
+        for entry in block.entries:
+            if not entry.strip():
+                continue
+            key = entry_key(entry)
+            if key in seen:
+                dropped += 1
+                continue
+            seen.add(key)
+            entries.append(entry)
+        if entries:
+            messages.append({"role": "system", "content": render_block(block._replace(entries=entries))})
+
+    messages.append({"role": "user", "content": user_message})
+    return messages, dropped
@@ -0,0 +1,251 @@
+from email.utils import parsedate_to_datetime
+import logging
+import random
+import threading
+import time
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Token-bucket limiter refilled continuously at rate_per_minute.
+
+    The bucket starts full and holds at most capacity tokens (a minute's worth by
+    default), so short bursts go through while the average stays under the rate.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.condition = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """
+        Block until tokens are available and take them.
+
+        Requests larger than the capacity take the whole bucket rather than waiting forever.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        tokens = min(tokens, self.capacity)
+        started = time.monotonic()
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return now - started
+                else:
+                    self.condition.wait((tokens - self.tokens) / self.rate)
+
+    def debit(self, tokens):
+        """
+        Charge tokens after the fact, such as a completion longer than estimated. The balance may go negative.
+        """
+        with self.condition:
+            self._refill(time.monotonic())
+            self.tokens -= tokens
+
+def retry_after(error):
+    """
+    Seconds the server asked the client to wait, from Retry-After or retry-after-ms, or None.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def error_status(error):
+    # OpenAI status errors carry status_code; connection errors and timeouts have none
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def is_retryable(error):
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+
+class RequestScheduler:
+    """
+    Admits API requests under a shared rate limit and retries transient failures.
+
+    Each attempt takes its estimated tokens from the tokens-per-minute bucket and one
+    from the requests-per-minute bucket, then a slot from the concurrency semaphore.
+    429s, 5xx responses, timeouts and connection errors are retried with full-jitter
+    exponential backoff. A Retry-After from the server replaces the computed delay and
+    pauses admission for every caller sharing the scheduler, not just the one that got
+    it. Other errors are raised at once.
+    Both buckets allow bursts of up to burst_seconds worth of their rate.
+    """
+
+    def __init__(self, tokens_per_minute=None, requests_per_minute=None, max_concurrency=4, max_retries=5, base_delay=1.0, max_delay=60.0, burst_seconds=60.0):
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute * burst_seconds / 60.0) if tokens_per_minute else None
+        self.requests = TokenBucket(requests_per_minute, max(1.0, requests_per_minute * burst_seconds / 60.0)) if requests_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.random = random.Random()
+        self.paused_until = 0.0
+
+    def backoff(self, error, attempt):
+        """
+        Seconds to wait before retrying after error on attempt (counted from 0), or None to give up.
+        """
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        requested = retry_after(error)
+        if requested is not None:
+            # A little jitter on top, so callers released together do not return together
+            return min(requested, self.max_delay) + self.random.uniform(0, self.base_delay / 4)
+        return self.random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _admit(self, tokens):
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            waited += self.tokens.acquire(tokens)
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+            waited += pause
+        if waited:
+            tracer.increment("rate_limit_wait_seconds", waited)
+        self.semaphore.acquire()
+
+    def _failed(self, error, attempt):
+        delay = self.backoff(error, attempt)
+        if delay is None:
+            return None
+        status = error_status(error)
+        tracer.increment("llm_retries", reason=status or type(error).__name__)
+        logger.warning("Request failed (%s); retry %d of %d in %.1fs", status or error, attempt + 1, self.max_retries, delay)
+        if retry_after(error) is not None:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    def execute(self, call, tokens=0):
+        """
+        Run call() within the limits, retrying transient failures.
+
+        Args:
+            call (callable): Makes one request attempt.
+            tokens (int): Estimated tokens the request uses, charged on every attempt.
+
+        Returns:
+            The result of the successful attempt.
+        """
+        attempt = 0
+        while True:
+            self._admit(tokens)
+            try:
+                return call()
+            except Exception as e:
+                delay = self._failed(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.semaphore.release()
+            attempt += 1
+            time.sleep(delay)
+
+    def stream(self, call, tokens=0):
+        """
+        Like execute, for a call that returns an iterator of chunks.
+
+        The concurrency slot is held until the iterator is exhausted or closed. Only
+        failures before the first chunk are retried, since later ones would repeat
+        output the caller has already seen.
+        """
+        attempt = 0
+        while True:
+            self._admit(tokens)
+            try:
+                iterator = iter(call())
+                first = next(iterator)
+            except StopIteration:
+                self.semaphore.release()
+                return
+            except Exception as e:
+                self.semaphore.release()
+                delay = self._failed(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            try:
+                yield first
+                yield from iterator
+            finally:
+                self.semaphore.release()
+            return
+
+    def debit(self, tokens):
+        """
+        Charge tokens used beyond the estimate, once the actual usage is known.
+        """
+        if self.tokens is not None and tokens > 0:
+            self.tokens.debit(tokens)
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+def default_scheduler():
+    """
+    The scheduler shared by every OpenAIAPI that is not given one, so all agents in the
+    process draw on the same quota.
+    """
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
+
+def configure_default(**settings):
+    """
+    Replace the shared scheduler's settings (see RequestScheduler) before requests start.
+    """
+    global _default_scheduler
+    with _default_lock:
+        _default_scheduler = RequestScheduler(**settings)
+        return _default_scheduler
@@ -0,0 +1,125 @@
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def normalize_messages(messages):
+    # Only surrounding whitespace is ignored; indentation inside code changes its meaning
+    normalized = []
+    for message in messages:
+        normalized.append({key: value.strip() if key == "content" else value for key, value in message.items()})
+    return normalized
+
+
+def make_cache_key(model, messages):
+    payload = json.dumps({"model": model, "messages": normalize_messages(messages)}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for deterministic (temperature=0) completions.
+
+    Entries are content-addressed by model and normalized messages. Lookups go to an
+    in-memory LRU first and fall back to a SQLite table on disk. Both tiers are bounded
+    by entry count and entries older than ttl seconds are treated as misses.
+    """
+
+    def __init__(self, path="response_cache.db", memory_entries=256, disk_entries=10000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                accessed_at REAL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)')
+        self.conn.commit()
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, model, messages):
+        key = make_cache_key(model, messages)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            row = self.conn.execute('SELECT response, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    self.conn.commit()
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+
+            self.conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[0]
+
+    def put(self, model, messages, response):
+        key = make_cache_key(model, messages)
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, model, response, now, now)
+            )
+            self._evict_disk(now)
+            self.conn.commit()
+
+    def _remember(self, key, response, created_at):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        if self.ttl is not None:
+            self.conn.execute('DELETE FROM responses WHERE created_at < ?', (now - self.ttl,))
+        count = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        if count > self.disk_entries:
+            self.conn.execute(
+                'DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)',
+                (count - self.disk_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self.conn.execute('DELETE FROM responses')
+            self.conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class StartupTimer:
+    """
+    Records how long each startup phase takes and logs a report once the window is up.
+
+    Phases are timed with the phase() context manager; report() logs them in order
+    together with the total time since the timer was created.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def report(self, milestone="first frame"):
+        """
+        Log the phase timings and the time from start to milestone at info level.
+
+        Returns:
+            dict: Phase durations in seconds, plus the milestone's total.
+        """
+        total = self.elapsed()
+        width = max([len(name) for name, _ in self.phases] + [len(milestone)])
+        logger.info("Startup timing:")
+        for name, duration in self.phases:
+            logger.info("  %-*s  %8.1f ms", width, name, duration * 1000)
+        logger.info("  %-*s  %8.1f ms total", width, milestone, total * 1000)
+        timings = dict(self.phases)
+        timings[milestone] = total
+        return timings
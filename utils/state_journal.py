@@ -0,0 +1,117 @@
+import json
+import sqlite3
+import time
+import zlib
+
+class StateJournal:
+    """
+    Append-only SQLite journal for agent state.
+
+    Conversation history is stored as one zlib-compressed row per entry, so a save only
+    appends the entries added since the previous one, and history can be read back a
+    page at a time. Knowledge base documents are stored compressed per source and
+    only rewritten when they change. Nothing is unpickled, so loading a journal never
+    executes code from the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        try:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS history (
+                    seq INTEGER PRIMARY KEY,
+                    entry BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS knowledge (
+                    source TEXT PRIMARY KEY,
+                    content BLOB NOT NULL,
+                    updated_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            ''')
+        except sqlite3.DatabaseError as e:
+            self.conn.close()
+            raise ValueError(f"{path} is not an agent state journal: {e}")
+
+    def close(self):
+        self.conn.close()
+
+    def history_count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM history').fetchone()[0]
+
+    def append_history(self, entries):
+        self.conn.executemany(
+            'INSERT INTO history (entry) VALUES (?)',
+            [(zlib.compress(entry.encode("utf-8")),) for entry in entries]
+        )
+
+    def replace_history(self, entries):
+        self.conn.execute('DELETE FROM history')
+        self.append_history(entries)
+
+    def truncate_history(self, keep):
+        """
+        Delete all but the newest keep history entries.
+
+        Returns:
+            int: The number of entries deleted.
+        """
+        total = self.history_count()
+        dropped = max(0, total - keep)
+        if dropped:
+            self.conn.execute('DELETE FROM history WHERE seq IN (SELECT seq FROM history ORDER BY seq LIMIT ?)', (dropped,))
+            self.conn.commit()
+        return dropped
+
+    def load_history(self, offset, limit):
+        """
+        Read a page of history entries in chronological order.
+
+        Args:
+            offset (int): Number of entries to skip from the oldest.
+            limit (int): Maximum number of entries to return.
+
+        Returns:
+            list: The history entries.
+        """
+        rows = self.conn.execute('SELECT entry FROM history ORDER BY seq LIMIT ? OFFSET ?', (limit, offset))
+        return [zlib.decompress(row[0]).decode("utf-8") for row in rows]
+
+    def put_knowledge(self, documents):
+        now = time.time()
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO knowledge (source, content, updated_at) VALUES (?, ?, ?)',
+            [(source, zlib.compress(str(content).encode("utf-8")), now) for source, content in documents.items()]
+        )
+
+    def delete_knowledge(self, sources):
+        self.conn.executemany('DELETE FROM knowledge WHERE source = ?', [(source,) for source in sources])
+
+    def clear_knowledge(self):
+        self.conn.execute('DELETE FROM knowledge')
+
+    def knowledge_sources(self):
+        return [row[0] for row in self.conn.execute('SELECT source FROM knowledge ORDER BY updated_at')]
+
+    def load_knowledge(self):
+        rows = self.conn.execute('SELECT source, content FROM knowledge ORDER BY updated_at')
+        return {source: zlib.decompress(content).decode("utf-8") for source, content in rows}
+
+    def set_meta(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def commit(self):
+        self.conn.commit()
+
+    def compact(self):
+        # Reclaims the space left behind by rewritten history and replaced documents
+        self.conn.commit()
+        self.conn.execute('VACUUM')
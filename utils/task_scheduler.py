@@ -0,0 +1,205 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import logging
+import re
+import threading
+
+TOOL_KEYWORDS = {
+    "browser": ("search", "browse", "navigate", "website", "web page", "scrape", "research", "look up", "url"),
+    "terminal": ("run ", "command", "install", "execute", "terminal", "shell", "pip "),
+    "editor": ("write code", "code", "file", "edit", "implement", "script", "function"),
+}
+DEFAULT_TOOL_LIMITS = {"browser": 1, "terminal": 2, "editor": 1}
+
+SUBTASK_PATTERN = re.compile(r'^\s*(?:(\d+)\s*[.):-]|[-*•])?\s*(.+?)\s*$')
+DEPENDENCY_PATTERN = re.compile(r'\((?:depends on|after|requires)\s*:?\s*([^)]*)\)\s*$', re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+def classify_tool(text):
+    # Best-effort guess of which tool a subtask will need, used only for concurrency limits
+    lowered = text.lower()
+    for tool, keywords in TOOL_KEYWORDS.items():
+        if any(keyword in lowered for keyword in keywords):
+            return tool
+    return None
+
+class TaskGraph:
+    """
+    Subtasks keyed by their list number, with the numbers each one depends on.
+    """
+
+    def __init__(self):
+        self.contents = {}
+        self.dependencies = {}
+
+    def __len__(self):
+        return len(self.contents)
+
+    def add(self, key, content, depends_on=()):
+        self.contents[key] = content
+        self.dependencies[key] = set(depends_on)
+
+    @classmethod
+    def from_lines(cls, lines):
+        """
+        Build a graph from subtask lines such as "3. Write tests (depends on: 1, 2)".
+
+        Unnumbered lines, and lines repeating a number already taken, are numbered after
+        the highest explicit number in list order. References to unknown subtasks and
+        to the subtask itself are ignored. If the dependencies form a cycle, those on
+        subtasks listed later are dropped, so the subtasks fall back to list order.
+
+        Args:
+            lines (list): The subtask lines generated by the model.
+
+        Returns:
+            TaskGraph: The parsed graph.
+        """
+        graph = cls()
+        matches = [match for match in map(SUBTASK_PATTERN.match, lines) if match and match.group(2)]
+        next_key = max((int(match.group(1)) for match in matches if match.group(1)), default=0) + 1
+        parsed = []
+        taken = set()
+        for match in matches:
+            key = int(match.group(1)) if match.group(1) else None
+            if key is None or key in taken:
+                key, next_key = next_key, next_key + 1
+            taken.add(key)
+            content = match.group(2)
+            depends_on = set()
+            dependency_match = DEPENDENCY_PATTERN.search(content)
+            if dependency_match:
+                depends_on = {int(number) for number in re.findall(r'\d+', dependency_match.group(1))}
+                content = content[:dependency_match.start()].rstrip()
+            parsed.append((key, content, depends_on))
+        keys = {key for key, content, depends_on in parsed}
+        for key, content, depends_on in parsed:
+            graph.add(key, content, {dependency for dependency in depends_on if dependency in keys and dependency != key})
+        if not graph.is_acyclic():
+            logger.warning("Subtask dependencies contain a cycle; running the subtasks in list order.")
+            graph.drop_back_edges()
+        return graph
+
+    def drop_back_edges(self):
+        # Keep only dependencies on subtasks listed earlier, which can never form a cycle
+        order = {key: position for position, key in enumerate(self.contents)}
+        for key, dependencies in self.dependencies.items():
+            self.dependencies[key] = {dependency for dependency in dependencies if order[dependency] < order[key]}
+
+    def validate(self):
+        if not self.is_acyclic():
+            raise ValueError("Subtask dependencies contain a cycle.")
+
+    def is_acyclic(self):
+        # Kahn's algorithm; any node left over sits on a cycle
+        indegree = {key: len(dependencies) for key, dependencies in self.dependencies.items()}
+        dependents = self.dependents()
+        ready = [key for key, count in indegree.items() if count == 0]
+        visited = 0
+        while ready:
+            key = ready.pop()
+            visited += 1
+            for dependent in dependents[key]:
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    ready.append(dependent)
+        return visited == len(self.contents)
+
+    def dependents(self):
+        dependents = {key: [] for key in self.contents}
+        for key, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                dependents[dependency].append(key)
+        return dependents
+
+    def critical_path_length(self):
+        lengths = {}
+
+        def length(key):
+            if key not in lengths:
+                lengths[key] = 1 + max((length(dependency) for dependency in self.dependencies[key]), default=0)
+            return lengths[key]
+
+        return max((length(key) for key in self.contents), default=0)
+
+class DagScheduler:
+    """
+    Runs a TaskGraph on a bounded thread pool, starting each subtask once its dependencies finish.
+
+    Every subtask goes through two phases. plan(key, content) runs unrestricted on a
+    worker (typically the LLM call); act(key, content, planned) then runs while holding
+    a slot for the tool the subtask needs, so at most tool_limits[tool] subtasks use the
+    same tool at once. act should return only once the subtask's tool work is over (for
+    a terminal, once its commands have finished), since the slot is released when it
+    returns. A subtask whose dependency failed is skipped.
+    """
+
+    def __init__(self, max_workers=4, tool_limits=None):
+        self.max_workers = max_workers
+        self.tool_limits = dict(DEFAULT_TOOL_LIMITS if tool_limits is None else tool_limits)
+        self.tool_slots = {tool: threading.Semaphore(limit) for tool, limit in self.tool_limits.items()}
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        # Running subtasks finish; nothing new is started
+        self.cancelled.set()
+
+    def _run_node(self, key, content, plan, act):
+        planned = plan(key, content)
+        slot = self.tool_slots.get(classify_tool(content))
+        if slot is None:
+            return act(key, content, planned)
+        with slot:
+            return act(key, content, planned)
+
+    def run(self, graph, plan, act, on_progress=None):
+        """
+        Execute the graph and block until every subtask has finished, failed or been skipped.
+
+        Args:
+            graph (TaskGraph): The subtasks to run.
+            plan (callable): plan(key, content) -> planned result.
+            act (callable): act(key, content, planned) -> final result.
+            on_progress (callable): Called as on_progress(key, status) with "running", "done", "failed" or "skipped".
+
+        Returns:
+            dict: Results keyed by subtask; failed subtasks map to their exception, skipped ones are absent.
+        """
+        self.cancelled.clear()
+        report = on_progress or (lambda key, status: None)
+        remaining = {key: set(dependencies) for key, dependencies in graph.dependencies.items()}
+        dependents = graph.dependents()
+        results = {}
+        running = {}
+
+        def skip(key):
+            for dependent in dependents[key]:
+                if dependent in remaining:
+                    del remaining[dependent]
+                    report(dependent, "skipped")
+                    skip(dependent)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                if not self.cancelled.is_set():
+                    for key in [key for key, dependencies in remaining.items() if not dependencies]:
+                        del remaining[key]
+                        report(key, "running")
+                        running[executor.submit(self._run_node, key, graph.contents[key], plan, act)] = key
+                if not running:
+                    break
+                finished, pending = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        results[key] = error
+                        report(key, "failed")
+                        skip(key)
+                        continue
+                    results[key] = future.result()
+                    report(key, "done")
+                    for dependent in dependents[key]:
+                        if dependent in remaining:
+                            remaining[dependent].discard(key)
+        return results
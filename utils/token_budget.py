@@ -0,0 +1,95 @@
+from collections import OrderedDict
+import functools
+import threading
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    # tiktoken builds the BPE tables on every lookup, so keep one encoder per model; the
+    # import is deferred too, since nothing needs it before the first token count
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class TokenBudget:
+    """
+    Counts message tokens with memoization and trims message lists to fit a context window.
+
+    Token counts are cached per text, so a message that has been seen before (system
+    prompts, history entries, repeated context) is never re-encoded.
+    """
+
+    MESSAGE_OVERHEAD = 6
+
+    def __init__(self, model, max_tokens, cache_size=4096):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.cache_size = cache_size
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count_text(self, text):
+        with self._lock:
+            count = self._counts.get(text)
+            if count is not None:
+                self._counts.move_to_end(text)
+                self.hits += 1
+                return count
+            self.misses += 1
+        count = len(get_encoding(self.model).encode(text))
+        with self._lock:
+            self._counts[text] = count
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return count
+
+    def count_message(self, message):
+        num_tokens = self.MESSAGE_OVERHEAD
+        for key, value in message.items():
+            num_tokens += self.count_text(value)
+            if key == "name":
+                num_tokens -= 1
+        return num_tokens
+
+    def count_messages(self, messages):
+        return sum(self.count_message(message) for message in messages)
+
+    def _priority_order(self, messages):
+        # System prompt first, then the newest user turn, then the remaining context newest-first
+        order = []
+        if messages and messages[0].get("role") == "system":
+            order.append(0)
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i].get("role") == "user" and i not in order:
+                order.append(i)
+                break
+        pinned = set(order)
+        order.extend(i for i in range(len(messages) - 1, -1, -1) if i not in pinned)
+        return order
+
+    def trim(self, messages):
+        """
+        Drop the lowest-priority messages until the list fits the budget.
+
+        Args:
+            messages (list): Chat messages in request order.
+
+        Returns:
+            list: The messages that fit, in their original order.
+        """
+        counts = [self.count_message(message) for message in messages]
+        if sum(counts) <= self.max_tokens:
+            return messages
+
+        remaining = self.max_tokens
+        keep = [False] * len(messages)
+        for i in self._priority_order(messages):
+            if counts[i] <= remaining:
+                keep[i] = True
+                remaining -= counts[i]
+        return [message for message, kept in zip(messages, keep) if kept]
@@ -0,0 +1,263 @@
+from collections import namedtuple
+from contextlib import contextmanager
+import functools
+import itertools
+import json
+import logging
+import threading
+import time
+from utils.file_io import atomic_write
+
+logger = logging.getLogger(__name__)
+
+SpanRecord = namedtuple("SpanRecord", ["name", "trace_id", "span_id", "parent_id", "start", "duration", "attributes", "error"])
+
+class Span:
+    """
+    A timed operation. Attributes can be added while it is open; end() records it.
+    """
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "start", "started", "attributes", "ended")
+
+    def __init__(self, tracer, name, trace_id, span_id, parent_id, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.attributes = attributes
+        self.ended = False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error=None):
+        if self.ended:
+            return
+        self.ended = True
+        duration = time.perf_counter() - self.started
+        self.tracer._finish(SpanRecord(self.name, self.trace_id, self.span_id, self.parent_id, self.start, duration, self.attributes, str(error) if error else None))
+
+class _NullSpan:
+    # Handed out while tracing is disabled, so call sites need no checks of their own
+    trace_id = span_id = parent_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def end(self, error=None):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class JsonLinesExporter:
+    """
+    Appends every finished span to a file as one JSON object per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, record):
+        line = json.dumps(record._asdict(), default=str)
+        with self._lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self.file.close()
+
+class Tracer:
+    """
+    Spans and counters for the agent pipeline.
+
+    Spans nest through a per-thread stack; work handed to another thread carries its
+    parent across with activate(). Every finished span feeds a per-name duration
+    summary and is passed to the exporters. Counters are labelled and cumulative.
+    Summaries and counters can be written as a Prometheus text file with
+    write_prometheus. A disabled tracer hands out a no-op span and records nothing.
+    """
+
+    def __init__(self, enabled=True, exporters=(), metrics_path=None, namespace="devease"):
+        self.enabled = enabled
+        self.exporters = list(exporters)
+        self.metrics_path = metrics_path
+        self.namespace = namespace
+        self.counters = {}
+        self.durations = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def start_span(self, name, parent=None, **attributes):
+        """
+        Open a span that is ended explicitly, for work that spans callbacks.
+
+        The parent defaults to the span active on the calling thread; a span without
+        one starts a new trace.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        parent = parent or self.current()
+        span_id = next(self._ids)
+        if parent is None or parent is NULL_SPAN:
+            return Span(self, name, span_id, span_id, None, attributes)
+        return Span(self, name, parent.trace_id, span_id, parent.span_id, attributes)
+
+    @contextmanager
+    def activate(self, span):
+        """
+        Make span the parent of spans opened on this thread inside the block.
+        """
+        if span is None or span is NULL_SPAN:
+            yield span
+            return
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time the block as a child of the current span. Exceptions are recorded and re-raised.
+        """
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+        span = self.start_span(name, **attributes)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            stack.pop()
+            span.end()
+
+    def traced(self, name):
+        """
+        Decorator that runs every call of the function inside a span.
+        """
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def increment(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def _finish(self, record):
+        with self._lock:
+            summary = self.durations.get(record.name)
+            if summary is None:
+                summary = self.durations[record.name] = [0, 0.0, 0.0, 0]
+            summary[0] += 1
+            summary[1] += record.duration
+            summary[2] = max(summary[2], record.duration)
+            if record.error:
+                summary[3] += 1
+        for exporter in self.exporters:
+            try:
+                exporter.export(record)
+            except Exception as e:
+                logger.warning("Span exporter %r failed: %s", exporter, e)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: "counters" maps (name, labels) to values; "spans" maps span names to
+            count, total_s, max_s and errors.
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            spans = {name: {"count": count, "total_s": total, "max_s": longest, "errors": errors} for name, (count, total, longest, errors) in self.durations.items()}
+        return {"counters": counters, "spans": spans}
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+        for (name, labels), value in sorted(snapshot["counters"].items()):
+            metric = f"{self.namespace}_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {value}")
+        if snapshot["spans"]:
+            metric = f"{self.namespace}_span_duration_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for name, summary in sorted(snapshot["spans"].items()):
+                label = _labels((("span", name),))
+                lines.append(f"{metric}_count{label} {summary['count']}")
+                lines.append(f"{metric}_sum{label} {summary['total_s']:.6f}")
+            lines.append(f"# TYPE {self.namespace}_span_duration_max_seconds gauge")
+            for name, summary in sorted(snapshot["spans"].items()):
+                lines.append(f"{self.namespace}_span_duration_max_seconds{_labels((('span', name),))} {summary['max_s']:.6f}")
+            lines.append(f"# TYPE {self.namespace}_span_errors_total counter")
+            for name, summary in sorted(snapshot["spans"].items()):
+                lines.append(f"{self.namespace}_span_errors_total{_labels((('span', name),))} {summary['errors']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        """
+        Write the metrics in the Prometheus text format, replacing the file atomically
+        so a collector never reads a partial file.
+        """
+        path = path or self.metrics_path
+        if path and self.enabled:
+            atomic_write(path, self.prometheus_text())
+
+    def close(self):
+        self.write_prometheus()
+        for exporter in self.exporters:
+            exporter.close()
+        self.exporters = []
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"' for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+# Off until an entry point turns it on with configure, so library use and benchmarks pay nothing for it
+tracer = Tracer(enabled=False)
+
+def configure(trace_path=None, metrics_path=None, enabled=True):
+    """
+    Set up the shared tracer: spans go to trace_path as JSON lines and metrics to
+    metrics_path in the Prometheus text format.
+    """
+    tracer.close()
+    tracer.enabled = enabled
+    tracer.metrics_path = metrics_path
+    if trace_path:
+        tracer.exporters.append(JsonLinesExporter(trace_path))
+    return tracer